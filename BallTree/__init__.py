@@ -0,0 +1,55 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+
+"""
+"I hereby certify that this program is solely the result of my own work and is in compliance with the Academic Integrity
+policy of the course syllabus and the academic integrity policy of the CS department.”
+"""
+
+# Importing the package only defines the trees (no tests run, and pytest isn't needed); the tests are in tests/
+# and the brute-force reference tree is in BallTree.reference
+
+import importlib
+from .kernels import (distance, EuclideanKernel, ManhattanKernel, ChebyshevKernel, MinkowskiKernel, HaversineKernel,
+                      CosineKernel, METRICS, getKernel)
+from .search import buildHashIndex, searchLimits, QueryStats, treeShapeStats
+from .tree import SCAPEGOAT_BALANCE, TOMBSTONE_RATIO, Node, BallTree
+from .arrayTree import (COORD_STORAGE, TREE_FILE_MAGIC, TREE_FILE_VERSION, TREE_FILE_PREFIX, TREE_FILE_ALIGNMENT,
+                        alignTo, ArrayBallTree, memoryReport)
+from .cache import CACHE_MISS, QueryCache
+from .bruteForce import BRUTE_FORCE_CHUNK, BruteForceEngine
+from .planner import PLANS, PLANNER_SMOOTHING, CALIBRATION_K, intrinsicDimension, QueryPlanner
+from .reference import FakeBallTree
+
+
+# Names imported from their submodules when first used, since those submodules import multiprocessing and
+# tempfile (and asyncio), which would otherwise be most of the package's own import time
+LAZY_NAMES = {'StreamingTreeBuilder': 'streaming',
+              'ParallelQueryExecutor': 'parallel',
+              'attachSharedTree': 'parallel',
+              'querySharedTree': 'parallel',
+              'AsyncBallTreeService': 'service',
+              'Histogram': 'service'}
+
+# Names from BallTree import * gives: the ones imported above, and the lazily imported ones (which import their
+# submodules then)
+__all__ = ['distance', 'EuclideanKernel', 'ManhattanKernel', 'ChebyshevKernel', 'MinkowskiKernel', 'HaversineKernel',
+           'CosineKernel', 'METRICS', 'getKernel',
+           'buildHashIndex', 'searchLimits', 'QueryStats', 'treeShapeStats',
+           'SCAPEGOAT_BALANCE', 'TOMBSTONE_RATIO', 'Node', 'BallTree',
+           'COORD_STORAGE', 'TREE_FILE_MAGIC', 'TREE_FILE_VERSION', 'TREE_FILE_PREFIX', 'TREE_FILE_ALIGNMENT',
+           'alignTo', 'ArrayBallTree', 'memoryReport',
+           'CACHE_MISS', 'QueryCache',
+           'BRUTE_FORCE_CHUNK', 'BruteForceEngine',
+           'PLANS', 'PLANNER_SMOOTHING', 'CALIBRATION_K', 'intrinsicDimension', 'QueryPlanner',
+           'FakeBallTree'] + list(LAZY_NAMES)
+
+
+def __getattr__(name):
+
+    if name not in LAZY_NAMES:
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+
+    module = importlib.import_module("." + LAZY_NAMES[name], __name__)
+
+    return getattr(module, name)
@@ -0,0 +1,1360 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Ball tree stored in flat NumPy arrays
+
+import json
+import math
+import os
+import random
+import struct
+import time
+from heapq import *
+import numpy as np
+from .cache import CACHE_MISS
+from .kernels import getKernel, MinkowskiKernel
+from .search import buildHashIndex, searchLimits, QueryStats, treeShapeStats
+from .tree import BallTree
+
+
+# ArrayBallTree.knn_graph compares pairs of ranges of at most this many rows all-pairs, rather than splitting them
+KNN_GRAPH_BLOCK = 256
+
+
+# Ways ArrayBallTree can store its coordinate matrix (see ArrayBallTree.__init__)
+COORD_STORAGE = ('float64', 'float32', 'uint8')
+
+
+# ArrayBallTree file format:
+#   prefix  - magic bytes, format version, and header length (TREE_FILE_PREFIX)
+#   header  - UTF-8 JSON: leaf size, metric (and p, for Minkowski), re-rank factor (with compact coords), and
+#             each array's dtype, shape and offset from the start of the data section
+#   data    - each array's raw bytes, starting at the next multiple of TREE_FILE_ALIGNMENT after the header
+#             (every array starts on such a boundary, so it can be memory-mapped in place)
+# Versions:
+#   1 - Euclidean trees with float64 coords
+#   2 - trees with any metric, and compact coords (float32, or uint8 codes with scale and offset arrays) - a
+#       version 1 reader would search them as Euclidean, and take uint8 codes for coordinates
+# save writes the lowest version that describes the tree, so files older readers can read stay readable to
+# them; load reads every version up to TREE_FILE_VERSION
+TREE_FILE_MAGIC = b'BALLTREE'
+TREE_FILE_VERSION = 2
+TREE_FILE_PREFIX = struct.Struct('<8sII')
+TREE_FILE_ALIGNMENT = 64
+
+
+# Returns n rounded up to a multiple of alignment
+def alignTo(n, alignment):
+    return -(-n // alignment) * alignment
+
+
+# Array Ball Tree class
+# Same operations as BallTree, but the tree is stored in flat NumPy arrays rather than in linked Node objects:
+#   - one (n, d) float64 matrix holding every point's coordinates, ordered so that each node's points are contiguous
+#   - per node: the block of rows [start, end) it holds, its radius, and the offsets of its children (-1 = no child)
+# An internal node holds just its pivot (a block of one row); a leaf holds up to leaf_size points,
+# with the first row of the block as its pivot. Leaf blocks are scanned in one batched distance computation.
+class ArrayBallTree(object):
+
+    # pivot chooses how each internal node's pivot is picked:
+    #   'medianOfFive' - median of five random points at the dimension of greatest spread (as in BallTree.build)
+    #   'exact'        - exact median at the dimension of greatest spread, so the tree is balanced (log depth)
+    # hash_index=True also builds a hash index of coordinates --> id, so findExact takes constant time
+    # n_jobs > 1 builds the subtrees below the top few levels in that many worker processes (-1 = one per core)
+    # metric is the distance the tree is built and searched with (as in BallTree)
+    # storage is how the coordinate matrix is stored:
+    #   'float64' - full precision (default)
+    #   'float32' - half the memory
+    #   'uint8'   - an eighth of the memory: each coordinate is one of 256 evenly spaced levels between the lowest
+    #               and highest value at its dimension (a per-dimension offset and scale)
+    # The tree is built and searched on the stored coords. knn searches then re-rank the closest
+    # k * rerank_factor points they find by their full-precision coords (read from the point list, or from
+    # full_coords - see fromArrays), and return the k closest.
+    # The tree holds only each point's id (its position in points). Each point's data is the data in points,
+    # or is looked up in payloads (as in BallTree) if given.
+    def __init__(self, points, dimensions, leaf_size=1, pivot='medianOfFive', hash_index=False, n_jobs=1,
+                 metric='euclidean', storage='float64', rerank_factor=2, payloads=None):
+
+        if leaf_size < 1:
+            raise ValueError("leaf_size must be at least 1")
+
+        if storage not in COORD_STORAGE:
+            raise ValueError("unknown storage: " + str(storage))
+
+        if rerank_factor < 1:
+            raise ValueError("rerank_factor must be at least 1")
+
+        if pivot not in ('medianOfFive', 'exact'):
+            raise ValueError("unknown pivot: " + str(pivot))
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        if n_jobs < 1:
+            raise ValueError("n_jobs must be at least 1, or -1")
+
+        self.__points = points
+        self.__payloads = payloads
+        self.__dimensions = dimensions
+        self.__leafSize = leaf_size
+        self.__exactMedian = pivot == 'exact'
+        self.__kernel = getKernel(metric, dimensions)
+        self.__hashIndex = buildHashIndex(points) if hash_index else None
+        self.__statsHook = None  # called with the QueryStats of each sampled search (None = stats off)
+        self.__cache = None      # QueryCache of search results (None = no cache)
+        self.__statsSampleRate = 1.0
+        self.__storage = storage
+        self.__rerankFactor = rerank_factor
+        self.__scale = None      # per-dimension scale and offset of 'uint8' coords
+        self.__offset = None
+        self.__fullCoords = None
+
+        # coordinate matrix - row i holds the coords of points[i]
+        self.__buildFromCoords(np.array([p[0] for p in points], dtype=np.float64).reshape(len(points), dimensions),
+                               n_jobs)
+
+
+    # Returns tree built over the rows of an (n, d) coordinate matrix, with no point list
+    # (the data of each point is its row number in coords; see fromStream)
+    @classmethod
+    def _fromCoords(cls, coords, leaf_size=1, pivot='medianOfFive', metric='euclidean'):
+
+        coords = np.asarray(coords, dtype=np.float64)
+
+        tree = cls([], coords.shape[1], leaf_size, pivot, metric=metric)
+        tree.__points = None
+        tree.__buildFromCoords(coords, 1)
+
+        return tree
+
+
+    # Builds the tree over the rows of the given coordinate matrix (reordered into tree order once built)
+    def __buildFromCoords(self, coords, numJobs):
+
+        numPoints = len(coords)
+
+        if self.__storage == 'uint8':
+            self.__fitScale(coords)
+
+        # tree is built on the coords as they'll be once stored, so its balls hold the stored points
+        stored = self.__encode(coords)
+        self.__coords = self.__decode(stored)
+
+        # one shared array of point indices, partitioned in place as the tree is built; once built it maps
+        # each row back to its point in points (every subtree is a contiguous range of rows)
+        self.__indices = np.arange(numPoints, dtype=np.intp)
+
+        # node arrays - there are at most n nodes (each holds at least one point)
+        self.__allocateNodes(numPoints)
+
+        if numJobs > 1:
+            self.__root = self.__parallelBuild(numJobs)
+        else:
+            self.__root = self.__build(0, numPoints)[0]
+
+        # lay out the coordinate matrix in tree order
+        self.__coords = stored[self.__indices]
+
+        # trim node arrays down to the number of nodes actually used (copies, so the n-long arrays are freed -
+        # a slice would keep them alive)
+        self.__nodeStarts = self.__nodeStarts[:self.__numNodes].copy()
+        self.__nodeEnds = self.__nodeEnds[:self.__numNodes].copy()
+        self.__radii = self.__radii[:self.__numNodes].copy()
+        self.__leftChildren = self.__leftChildren[:self.__numNodes].copy()
+        self.__rightChildren = self.__rightChildren[:self.__numNodes].copy()
+
+
+    # Sets the per-dimension offset and scale of 'uint8' coords, so the lowest value at each dimension is stored
+    # as 0 and the highest as 255
+    def __fitScale(self, coords):
+
+        if len(coords) == 0:
+            self.__offset = np.zeros(self.__dimensions)
+            self.__scale = np.ones(self.__dimensions)
+            return
+
+        self.__offset = coords.min(axis=0)
+        spread = coords.max(axis=0) - self.__offset
+        self.__scale = np.where(spread > 0, spread / 255, 1.0)
+
+
+    # Returns (n, d) matrix of float64 coords in the storage's dtype
+    def __encode(self, coords):
+
+        if self.__storage == 'float32':
+            return coords.astype(np.float32)
+
+        if self.__storage == 'uint8':
+            return np.clip(np.rint((coords - self.__offset) / self.__scale), 0, 255).astype(np.uint8)
+
+        return coords
+
+
+    # Returns stored coords as float64 (always computed the same way, so distances to them are the same
+    # while building and searching)
+    def __decode(self, stored):
+
+        if self.__scale is not None:
+            return stored * self.__scale + self.__offset
+
+        return np.asarray(stored, dtype=np.float64)
+
+
+    # Returns stored rows [start, end) as float64 coords
+    def __block(self, start, end):
+        return self.__decode(self.__coords[start:end])
+
+
+    # Returns full-precision coords of the given rows (from full_coords or the point list), or their stored
+    # coords if there's neither
+    def __exactCoords(self, rows):
+
+        indices = self.__indices[rows]
+
+        if self.__fullCoords is not None:
+            return np.asarray(self.__fullCoords[indices], dtype=np.float64).reshape(len(indices), self.__dimensions)
+
+        if self.__points is not None:
+            return np.array([self.__points[i][0] for i in indices], dtype=np.float64).reshape(len(indices),
+                                                                                               self.__dimensions)
+
+        return self.__decode(self.__coords[rows])
+
+
+    # Allocates empty node arrays with room for the given number of nodes
+    def __allocateNodes(self, maxNodes):
+
+        self.__nodeStarts = np.empty(maxNodes, dtype=np.intp)    # first row of node's block (its pivot)
+        self.__nodeEnds = np.empty(maxNodes, dtype=np.intp)      # one past the last row of node's block
+        self.__radii = np.zeros(maxNodes, dtype=np.float64)      # distance between pivot and farthest point in node
+        self.__leftChildren = np.full(maxNodes, -1, dtype=np.intp)
+        self.__rightChildren = np.full(maxNodes, -1, dtype=np.intp)
+
+        self.__numNodes = 0  # num of node slots filled so far during build
+
+
+    def getPoints(self):
+        return self.__points
+
+
+    # Returns data of the point with the given id: from payloads if the tree has them, or the point list,
+    # or the id itself if there's neither
+    def getPayload(self, pointId):
+
+        if self.__payloads is not None:
+            return self.__payloads(pointId) if callable(self.__payloads) else self.__payloads[pointId]
+
+        if self.__points is not None:
+            return self.__points[pointId][1]
+
+        return pointId
+
+
+    # Returns the kernel of the metric the tree was built with
+    def getMetric(self):
+        return self.__kernel
+
+
+    # Returns number of nodes in the tree
+    def numNodes(self):
+        return self.__numNodes
+
+
+    # Returns number of levels in the tree (0 if empty)
+    def depth(self):
+
+        maxDepth = 0
+        stack = [(self.__root, 1)] if self.__root != -1 else []
+
+        while stack:
+            n, d = stack.pop()
+            maxDepth = max(maxDepth, d)
+
+            for child in (self.__leftChildren[n], self.__rightChildren[n]):
+                if child != -1:
+                    stack.append((child, d + 1))
+
+        return maxDepth
+
+
+    # Returns dict of the tree's shape stats (see treeShapeStats)
+    def shapeStats(self):
+
+        depths = np.zeros(self.__numNodes, dtype=np.intp)
+        stack = [(self.__root, 1)] if self.__root != -1 else []
+
+        while stack:
+            n, d = stack.pop()
+            depths[n] = d
+
+            for child in (self.__leftChildren[n], self.__rightChildren[n]):
+                if child != -1:
+                    stack.append((child, d + 1))
+
+        leaves = (self.__leftChildren == -1) & (self.__rightChildren == -1)
+
+        return treeShapeStats(depths, self.__radii, (self.__nodeEnds - self.__nodeStarts)[leaves])
+
+
+    # Sets the function called with the QueryStats of each findExact and kNearestNeighborsSearch
+    # (as in BallTree.setStatsHook)
+    def setStatsHook(self, hook, sample_rate=1.0):
+
+        self.__statsHook = hook
+        self.__statsSampleRate = sample_rate
+
+
+    # Sets the QueryCache that findExact and exact knn searches look their results up in, or turns caching off
+    # if cache is None (as in BallTree.setQueryCache; the tree never changes, so the cache is never invalidated)
+    def setQueryCache(self, cache):
+
+        if cache is not None:
+            cache.invalidate()  # (it may hold another tree's results)
+
+        self.__cache = cache
+
+
+    # Returns a QueryStats to fill in for a search if stats are on and it's sampled, or None
+    def __newStats(self, operation):
+
+        if self.__statsHook is None or (self.__statsSampleRate < 1 and random.random() >= self.__statsSampleRate):
+            return None
+
+        return QueryStats(operation)
+
+
+    # Returns dict of the arrays that make up the tree, by name (see fromArrays)
+    def exportArrays(self):
+
+        arrays = {'coords': self.__coords,
+                  'indices': self.__indices,
+                  'nodeStarts': self.__nodeStarts,
+                  'nodeEnds': self.__nodeEnds,
+                  'radii': self.__radii,
+                  'leftChildren': self.__leftChildren,
+                  'rightChildren': self.__rightChildren}
+
+        if self.__scale is not None:
+            arrays['scale'] = self.__scale
+            arrays['offset'] = self.__offset
+
+        return arrays
+
+
+    # Returns a tree made from arrays returned by exportArrays, without rebuilding it
+    # The arrays are used as they are (not copied), so they can be views of shared or memory-mapped data
+    # points is the point list the tree was built from; without it (or payloads, as in __init__), each point's
+    # data is its index
+    # metric must be the one the tree was built with
+    # Storage is taken from the coords' dtype. Full-precision coords for re-ranking knn results come from
+    # points, or from full_coords: an (n, d) array of every point's coords by index (e.g. memory-mapped, so
+    # only the rows being re-ranked are read)
+    @classmethod
+    def fromArrays(cls, arrays, points=None, leaf_size=1, metric='euclidean', full_coords=None, rerank_factor=2,
+                   payloads=None):
+
+        tree = cls.__new__(cls)
+
+        tree.__points = points
+        tree.__payloads = payloads
+        tree.__coords = arrays['coords']
+        tree.__dimensions = tree.__coords.shape[1]
+        tree.__indices = arrays['indices']
+        tree.__nodeStarts = arrays['nodeStarts']
+        tree.__nodeEnds = arrays['nodeEnds']
+        tree.__radii = arrays['radii']
+        tree.__leftChildren = arrays['leftChildren']
+        tree.__rightChildren = arrays['rightChildren']
+
+        tree.__leafSize = leaf_size
+        tree.__exactMedian = False
+        tree.__kernel = getKernel(metric, tree.__dimensions)
+        tree.__hashIndex = None
+        tree.__statsHook = None
+        tree.__cache = None
+        tree.__statsSampleRate = 1.0
+        tree.__storage = np.dtype(tree.__coords.dtype).name
+        tree.__rerankFactor = rerank_factor
+        tree.__scale = arrays.get('scale')
+        tree.__offset = arrays.get('offset')
+        tree.__fullCoords = full_coords
+        tree.__numNodes = len(tree.__nodeStarts)
+        tree.__root = 0 if tree.__numNodes else -1
+
+        return tree
+
+
+    # Saves the tree's arrays to a file (in the format described at TREE_FILE_MAGIC)
+    # The point list isn't saved; pass it (or payloads) to load to get data back from findExact
+    def save(self, path):
+
+        arrays = self.exportArrays()
+
+        # header describes each array's dtype, shape, and offset from the start of the data section
+        header = {'leafSize': self.__leafSize, 'metric': self.__kernel.name, 'arrays': {}}
+
+        if isinstance(self.__kernel, MinkowskiKernel):
+            header['p'] = self.__kernel.p
+
+        if self.__storage != 'float64':
+            header['rerankFactor'] = self.__rerankFactor
+
+        offset = 0
+
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = alignTo(offset + array.nbytes, TREE_FILE_ALIGNMENT)
+
+        headerBytes = json.dumps(header).encode('utf-8')
+        dataStart = alignTo(TREE_FILE_PREFIX.size + len(headerBytes), TREE_FILE_ALIGNMENT)
+
+        with open(path, 'wb') as f:
+
+            f.write(TREE_FILE_PREFIX.pack(TREE_FILE_MAGIC, self.__fileVersion(), len(headerBytes)))
+            f.write(headerBytes)
+
+            for name, array in arrays.items():
+                f.seek(dataStart + header['arrays'][name]['offset'])
+                np.ascontiguousarray(array).tofile(f)
+
+            f.truncate(dataStart + offset)
+
+
+    # Returns the file format version save writes the tree as (see TREE_FILE_VERSION)
+    def __fileVersion(self):
+
+        if self.__kernel.name != 'euclidean' or self.__storage != 'float64':
+            return 2
+
+        return 1
+
+
+    # Returns tree loaded from a file written by save
+    # With mmap=True the arrays are memory-mapped read-only rather than read in, so processes loading the same
+    # file share one page-cached copy of it
+    # (full_coords and payloads as in fromArrays)
+    @classmethod
+    def load(cls, path, points=None, mmap=True, full_coords=None, payloads=None):
+
+        with open(path, 'rb') as f:
+
+            prefix = f.read(TREE_FILE_PREFIX.size)
+
+            if len(prefix) < TREE_FILE_PREFIX.size:
+                raise ValueError("not a BallTree file: " + str(path))
+
+            magic, version, headerLength = TREE_FILE_PREFIX.unpack(prefix)
+
+            if magic != TREE_FILE_MAGIC:
+                raise ValueError("not a BallTree file: " + str(path))
+
+            if not 1 <= version <= TREE_FILE_VERSION:
+                raise ValueError("unsupported BallTree file version: " + str(version))
+
+            header = json.loads(f.read(headerLength).decode('utf-8'))
+
+        dataStart = alignTo(TREE_FILE_PREFIX.size + headerLength, TREE_FILE_ALIGNMENT)
+        arrays = {}
+
+        for name, info in header['arrays'].items():
+
+            dtype, shape = np.dtype(info['dtype']), tuple(info['shape'])
+            offset = dataStart + info['offset']
+
+            if math.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                arrays[name] = np.fromfile(path, dtype=dtype, count=math.prod(shape), offset=offset).reshape(shape)
+
+        # (files from before metrics were added are Euclidean)
+        metric = header.get('metric', 'euclidean')
+
+        if metric == MinkowskiKernel.name:
+            metric = MinkowskiKernel(header['p'])
+
+        # (files from before the re-rank factor was saved used the default)
+        return cls.fromArrays(arrays, points, header['leafSize'], metric, full_coords,
+                              rerank_factor=header.get('rerankFactor', 2), payloads=payloads)
+
+
+    # Builds a tree over more points than fit in memory, writes it to a file (as save does), and returns it
+    # loaded from there (memory-mapped)
+    # source is an (n, d) array - typically memory-mapped, e.g. np.load(path, mmap_mode='r') - or an iterable of
+    # rows of coordinates; there's no point list, so each point's data is its position in source
+    # At most chunk_size rows, sample_size sampled rows, and one partition of partition_size points are held in
+    # memory at a time (see StreamingTreeBuilder); intermediate files go in a temporary directory in temp_dir
+    @classmethod
+    def fromStream(cls, source, dimensions, path, leaf_size=1, pivot='medianOfFive', metric='euclidean',
+                   chunk_size=65536, sample_size=100000, partition_size=1000000, temp_dir=None):
+
+        from .streaming import StreamingTreeBuilder  # (imported here: it imports this module)
+
+        builder = StreamingTreeBuilder(dimensions, leaf_size, pivot, getKernel(metric, dimensions),
+                                       chunk_size, sample_size, partition_size)
+
+        builder.build(source, path, temp_dir)
+
+        return cls.load(path)
+
+
+    # Returns number of bytes used by the node arrays and coordinate matrix
+    # (their data, counted with nbytes - sys.getsizeof counts only the header of an array that's a view)
+    def memoryUsage(self):
+
+        return sum(a.nbytes for a in self.exportArrays().values())
+
+
+    # Build Ball Tree over the points in self.__indices[lo:hi] (same steps as BallTree.build), with an explicit
+    # stack rather than recursion
+    # Each node's range is partitioned in place into [pivot | left subtree | right subtree]
+    # If deferDepth is given, subtrees that far below the root aren't built; they're returned instead
+    # Returns the offset of the root node (-1 if there are no points), and list of deferred
+    # (lo, hi, parent node, whether it's parent's left child) subtrees
+    def __build(self, lo, hi, deferDepth=None):
+
+        root = -1
+        deferred = []
+
+        # stack of (lo, hi, parent node, whether node is parent's left child, depth) still to be built;
+        # left is pushed last so nodes are numbered in preorder
+        stack = [(lo, hi, -1, False, 0)]
+
+        while stack:
+
+            lo, hi, parent, isLeft, depth = stack.pop()
+
+            # zero points --> no node
+            if hi == lo:
+                continue
+
+            if depth == deferDepth:
+                deferred.append((lo, hi, parent, isLeft))
+                continue
+
+            # claim the next free node slot and hook it up to its parent
+            node = self.__numNodes
+            self.__numNodes += 1
+
+            if parent == -1:
+                root = node
+            else:
+                self.__attach(parent, isLeft, node)
+
+            split = self.__buildNode(node, lo, hi)
+
+            if split != -1:
+                stack.append((split, hi, node, False, depth + 1))
+                stack.append((lo + 1, split, node, True, depth + 1))
+
+        return root, deferred
+
+
+    # Makes node the left or right child of parent
+    def __attach(self, parent, isLeft, node):
+
+        if isLeft:
+            self.__leftChildren[parent] = node
+        else:
+            self.__rightChildren[parent] = node
+
+
+    # Builds the top levels of the tree here, and the subtrees below them in a pool of worker processes
+    # The coordinate matrix and index array are put in shared memory, so workers partition the index array
+    # in place rather than being sent copies; each worker sends back just its subtree's node arrays
+    # Returns the offset of the root node
+    def __parallelBuild(self, numJobs):
+
+        # imported here, so importing the package doesn't pay for multiprocessing unless it's used
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        numPoints = len(self.__indices)
+
+        coordsMemory = shared_memory.SharedMemory(create=True, size=max(self.__coords.nbytes, 1))
+        indicesMemory = shared_memory.SharedMemory(create=True, size=max(self.__indices.nbytes, 1))
+
+        try:
+            coords = np.ndarray(self.__coords.shape, dtype=np.float64, buffer=coordsMemory.buf)
+            coords[:] = self.__coords
+            self.__coords = coords
+
+            indices = np.ndarray(self.__indices.shape, dtype=np.intp, buffer=indicesMemory.buf)
+            indices[:] = self.__indices
+            self.__indices = indices
+
+            # build the top levels, deferring about two subtrees per worker
+            root, deferred = self.__build(0, numPoints, deferDepth=int(math.ceil(math.log2(numJobs))) + 1)
+
+            tasks = [(coordsMemory.name, indicesMemory.name, numPoints, self.__dimensions,
+                      lo, hi, self.__leafSize, self.__exactMedian, self.__kernel) for lo, hi, parent, isLeft in deferred]
+
+            with ProcessPoolExecutor(max_workers=numJobs) as pool:
+                subtrees = list(pool.map(ArrayBallTree._buildSubtree, tasks))
+
+            # stitch each subtree in after the nodes built so far, renumbering its nodes
+            for (lo, hi, parent, isLeft), subtree in zip(deferred, subtrees):
+
+                starts, ends, radii, leftChildren, rightChildren = subtree
+                offset = self.__numNodes
+                nodes = slice(offset, offset + len(starts))
+
+                self.__nodeStarts[nodes] = starts
+                self.__nodeEnds[nodes] = ends
+                self.__radii[nodes] = radii
+                self.__leftChildren[nodes] = np.where(leftChildren == -1, -1, leftChildren + offset)
+                self.__rightChildren[nodes] = np.where(rightChildren == -1, -1, rightChildren + offset)
+
+                self.__numNodes += len(starts)
+                self.__attach(parent, isLeft, offset)
+
+            # copy out of shared memory before releasing it
+            self.__coords = np.array(self.__coords)
+            self.__indices = np.array(self.__indices)
+
+            return root
+
+        finally:
+            coords = indices = None
+            coordsMemory.close()
+            coordsMemory.unlink()
+            indicesMemory.close()
+            indicesMemory.unlink()
+
+
+    # Worker process entry point for __parallelBuild
+    # Attaches to the shared coordinate matrix and index array, builds the subtree over rows [lo, hi)
+    # Returns the subtree's node arrays, with nodes numbered from 0 (its root)
+    @staticmethod
+    def _buildSubtree(task):
+
+        from multiprocessing import shared_memory
+
+        coordsName, indicesName, numPoints, dimensions, lo, hi, leafSize, exactMedian, kernel = task
+
+        coordsMemory = shared_memory.SharedMemory(name=coordsName)
+        indicesMemory = shared_memory.SharedMemory(name=indicesName)
+
+        try:
+            tree = ArrayBallTree.__new__(ArrayBallTree)
+
+            tree.__coords = np.ndarray((numPoints, dimensions), dtype=np.float64, buffer=coordsMemory.buf)
+            tree.__indices = np.ndarray((numPoints,), dtype=np.intp, buffer=indicesMemory.buf)
+            tree.__leafSize = leafSize
+            tree.__exactMedian = exactMedian
+            tree.__kernel = kernel
+
+            tree.__allocateNodes(hi - lo)
+            tree.__build(lo, hi)
+
+            nodes = slice(0, tree.__numNodes)
+
+            return (tree.__nodeStarts[nodes], tree.__nodeEnds[nodes], tree.__radii[nodes],
+                    tree.__leftChildren[nodes], tree.__rightChildren[nodes])
+
+        finally:
+            tree = None
+            coordsMemory.close()
+            indicesMemory.close()
+
+
+    # Fills in the given node for the points in self.__indices[lo:hi]
+    # Returns the row where its right subtree starts (its left subtree starts at lo + 1), or -1 if it's a leaf
+    def __buildNode(self, node, lo, hi):
+
+        self.__nodeStarts[node] = lo
+
+        indices = self.__indices[lo:hi]  # view into the shared index array
+        coords = self.__coords[indices]  # coords of the points at this level
+
+        # few enough points --> leaf node holding all of them, first point as pivot
+        if hi - lo <= self.__leafSize:
+            self.__nodeEnds[node] = hi
+            self.__radii[node] = self.__farthest(coords, coords[0])
+            return -1
+
+        ## 1.Find dimension of greatest spread:
+        dimensionOfGS = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+        vals = coords[:, dimensionOfGS]
+
+        ## 2.Find the pivot at the dimension of greatest spread, and
+        ## 3.Split remaining points in two according to it (written back into the shared index array):
+        if self.__exactMedian:
+
+            # exact median via introselect: everything before position mid is <= median, everything after is >=
+            mid = (hi - lo) // 2
+            order = np.argpartition(vals, mid)
+            partitioned = np.concatenate(([order[mid]], order[:mid], order[mid + 1:]))
+            split = lo + 1 + mid
+
+        else:
+
+            # median of five random points
+            randomPointList = []
+
+            for i in range(5):  # choose 5 random points
+                p = random.randrange(hi - lo)
+                randomPointList.append((vals[p], p))
+
+            randomPointList.sort()
+            median = randomPointList[2][1]
+
+            # points tied with median alternate sides, so duplicate-heavy data still splits evenly
+            others = np.arange(hi - lo) != median
+            ties = np.flatnonzero(others & (vals == vals[median]))
+
+            goesLeft = vals < vals[median]
+            goesLeft[ties[::2]] = True
+
+            left = np.flatnonzero(others & goesLeft)
+            partitioned = np.concatenate(([median], left, np.flatnonzero(others & ~goesLeft)))
+            split = lo + 1 + len(left)
+
+        median = partitioned[0]
+        indices[:] = indices[partitioned]
+
+        ## 4.Radius is the distance between median and farthest point at this level:
+        ## 5.Fill in this node (a block of just its pivot); its children are built from the two halves
+        self.__nodeEnds[node] = lo + 1
+        self.__radii[node] = self.__farthest(coords, coords[median])
+
+        return split
+
+
+    # Returns distance between the given center and the farthest of the given coords
+    def __farthest(self, coords, center):
+        return float(self.__kernel.toDistance(np.max(self.__kernel.reducedDistances(center, coords))))
+
+
+    # Returns reduced distances between query coords and each row in [start, end), in one batched computation
+    def __reducedDistances(self, queryCoords, start, end):
+        return self.__kernel.reducedDistances(queryCoords, self.__block(start, end))
+
+
+    # Wrapper method
+    # Returns data associated with query coordinates, or None if no such point in tree
+    def findExact(self, queryCoords):
+
+        pointId = self.findExactId(queryCoords)
+
+        return None if pointId is None else self.getPayload(pointId)
+
+
+    # Returns id of the point with the query coordinates, or None if no such point in tree
+    def findExactId(self, queryCoords):
+
+        # constant-time lookup if there's a hash index
+        if self.__hashIndex is not None:
+            return self.__hashIndex.get(tuple(queryCoords))
+
+        if self.__cache is not None:
+
+            cacheKey = self.__cache.key('findExact', queryCoords)
+            cached = self.__cache.get(cacheKey)
+
+            if cached is not CACHE_MISS:
+                return cached
+
+        queryCoords = np.asarray(queryCoords, dtype=np.float64)
+
+        if self.__storage != 'float64':
+            found = self.__findExactStored(queryCoords)
+        else:
+            stats = self.__newStats('findExact')
+
+            found = self.__findExact(queryCoords, stats)
+
+            if stats is not None:
+                self.__statsHook(stats)
+
+        pointId = None if found == -1 else int(self.__indices[found])
+
+        if self.__cache is not None:
+            self.__cache.put(cacheKey, pointId)
+
+        return pointId
+
+
+    # Returns list of the data associated with each of the query coordinates (None for any not in tree)
+    def find_exact_many(self, queries):
+        return [self.findExact(q) for q in queries]
+
+
+    # Returns row of the point with the query coords in a tree with compact storage, or -1 if not in tree
+    # The points stored with the same coords as the query (once rounded the same way) are found with a radius
+    # search of radius 0, and the first whose full-precision coords are the query's is returned
+    def __findExactStored(self, queryCoords):
+
+        rounded = self.__decode(self.__encode(queryCoords.reshape(1, self.__dimensions)))
+        subtrees, matches = self.__radiusSearch(rounded, np.zeros(1))
+
+        rows = [np.arange(start, hi) for queryIds, start, hi in subtrees] + [rows for queryIds, rows in matches]
+        rows = np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.intp)
+
+        same = np.flatnonzero((self.__exactCoords(rows) == queryCoords).all(axis=1))
+
+        return rows[same[0]] if len(same) else -1
+
+
+    # Returns the point stored at the given row, as a (coords, data) tuple
+    # Without a point list (or with payloads), it's the row's coords and the data of its id
+    def __point(self, row):
+
+        if self.__points is None or self.__payloads is not None:
+            return (self.__exactCoords(np.array([row]))[0].tolist(), self.getPayload(int(self.__indices[row])))
+
+        return self.__points[self.__indices[row]]
+
+
+    # Returns row of the point with the query coords, or -1 if not in tree
+    # Fills in stats, unless it's None
+    def __findExact(self, queryCoords, stats=None):
+
+        # stack of nodes still to be searched (left child pushed last, so it's searched first)
+        stack = [self.__root] if self.__root != -1 else []
+        depths = [1]  # depth of each node on the stack (only kept up while filling in stats)
+
+        while stack:
+
+            n = stack.pop()
+            start, end = self.__nodeStarts[n], self.__nodeEnds[n]
+
+            if stats is not None:
+                depth = depths.pop()
+                stats.nodesVisited += 1
+                stats.maxDepth = max(stats.maxDepth, depth)
+
+            # is the search point in this node's block??
+            matches = np.flatnonzero((self.__block(start, end) == queryCoords).all(axis=1))
+            if len(matches):
+                return start + matches[0]
+
+            if stats is not None:
+                stats.distanceEvaluations += 1
+
+            # if search point is farther from pivot than node's radius, it's not in this node
+            if self.__kernel.toDistance(self.__reducedDistances(queryCoords, start, start + 1)[0]) > self.__radii[n]:
+                if stats is not None:
+                    stats.prunes += 1
+                continue
+
+            # if possibly within this ball, search children
+            for child in (self.__rightChildren[n], self.__leftChildren[n]):
+                if child != -1:
+                    stack.append(child)
+
+                    if stats is not None:
+                        depths.append(depth + 1)
+
+        return -1
+
+
+    # Wrapper method
+    # Returns k nearest neighbors of query point as (distance, id) tuples, closest first - or as (distance, point)
+    # tuples with return_points=True
+    # eps, max_nodes and time_budget make the search approximate, and exact searches are answered from the query
+    # cache when they can be, as in BallTree.kNearestNeighborsSearch
+    # scan_rows > 0 scans subtrees of at most that many rows whole, in one distance computation, rather than
+    # visiting their nodes one by one (which costs more, once a subtree is small enough; see QueryPlanner)
+    # stats is a QueryStats for this search to fill in, whether or not the stats hook samples it (a search
+    # answered from the cache leaves it as it is)
+    def kNearestNeighborsSearch(self, queryCoords, k, eps=0, max_nodes=None, time_budget=None, return_points=False,
+                                scan_rows=0, stats=None):
+
+        shrink, maxNodes, deadline = searchLimits(eps, max_nodes, time_budget)
+
+        if scan_rows < 0:
+            raise ValueError("scan_rows must be at least 0")
+
+        # cached result of an exact search (its first k, if it was for more neighbors)
+        cacheKey = None
+
+        if self.__cache is not None and eps == 0 and max_nodes is None and time_budget is None:
+
+            cacheKey = self.__cache.key('knn', queryCoords, return_points)
+            cached = self.__cache.get(cacheKey, k)
+
+            if cached is not CACHE_MISS:
+                return cached
+
+        queryCoords = np.asarray(queryCoords, dtype=np.float64)
+
+        # heapq of tuples (-reduced distance, row), filled with placeholders
+        # (with compact storage, it holds the candidates to re-rank)
+        heap = [(-float('inf'), -1)] * self.__numCandidates(k)
+
+        sampled = self.__newStats('knn')
+        stats = sampled if stats is None else stats
+
+        if k > 0:
+            self.__kNearestNeighborsSearch(queryCoords, heap, shrink, maxNodes, deadline, scan_rows, stats)
+
+        if sampled is not None:
+            self.__statsHook(stats)
+
+        # pop farthest first; keep only actual points
+        ansList = []
+
+        while heap:
+            negReduced, row = heappop(heap)
+            if row != -1:
+                ansList.append((-negReduced, row))
+
+        ansList.reverse()  # closer points first
+
+        # re-rank candidates by their full-precision coords
+        if self.__storage != 'float64':
+            rows = np.array([row for reduced, row in ansList], dtype=np.intp)
+            reduced = self.__kernel.reducedDistances(queryCoords, self.__exactCoords(rows))
+
+            ansList = [(reduced[i], rows[i]) for i in np.argsort(reduced, kind='stable')[:k]]
+
+        if return_points:
+            ansList = [(float(self.__kernel.toDistance(reduced)), self.__point(row)) for reduced, row in ansList]
+        else:
+            ansList = [(float(self.__kernel.toDistance(reduced)), int(self.__indices[row])) for reduced, row in ansList]
+
+        if cacheKey is not None:
+            self.__cache.put(cacheKey, ansList, k)
+
+        return ansList
+
+
+    # Returns num of candidates a knn search for k neighbors collects (more than k to re-rank, with compact storage)
+    def __numCandidates(self, k):
+
+        if self.__storage == 'float64':
+            return k
+
+        return int(math.ceil(k * self.__rerankFactor))
+
+
+    # Depth-first search with an explicit stack of nodes
+    # Nodes are pruned against the query radius times shrink, and the search stops once it has visited
+    # maxNodes nodes or it's past the deadline (None = no deadline); subtrees of at most scanRows rows are
+    # scanned whole
+    # Fills in stats, unless it's None
+    def __kNearestNeighborsSearch(self, queryCoords, closestSoFar, shrink, maxNodes, deadline, scanRows, stats):
+
+        # stack of (node, row where node's subtree ends)
+        stack = [(self.__root, len(self.__indices))] if self.__root != -1 else []
+        depths = [1]  # depth of each node on the stack (only kept up while filling in stats)
+        nodesVisited = 0
+
+        while stack:
+
+            # out of budget --> keep the closest points found so far
+            if nodesVisited >= maxNodes or (deadline is not None and time.perf_counter() > deadline):
+                break
+
+            n, hi = stack.pop()
+            nodesVisited += 1
+
+            start, end = self.__nodeStarts[n], self.__nodeEnds[n]
+            reduced = self.__reducedDistances(queryCoords, start, end)
+
+            if stats is not None:
+                depth = depths.pop()
+                stats.nodesVisited += 1
+                stats.distanceEvaluations += end - start
+                stats.maxDepth = max(stats.maxDepth, depth)
+
+            # query radius is the distance to the farthest of the closest neighbors so far
+            queryRadius = self.__kernel.toDistance(-closestSoFar[0][0])
+
+            # node can't contain any points closer than those in the heapq
+            if self.__kernel.toDistance(reduced[0]) - self.__radii[n] > queryRadius * shrink:
+                if stats is not None:
+                    stats.prunes += 1
+                continue
+
+            # small subtree --> every point in it at once, instead of its nodes one by one
+            scan = hi - end > 0 and hi - start <= scanRows
+
+            if scan:
+                reduced = self.__reducedDistances(queryCoords, start, hi)
+
+                if stats is not None:
+                    stats.distanceEvaluations += hi - end
+
+            # swap in each point of the block that's closer than farthest of nearest neighbors
+            # (compared as reduced distances); only the closest few of them can all stay in the heapq
+            closer = np.flatnonzero(reduced < -closestSoFar[0][0])
+
+            if len(closer) > len(closestSoFar):
+                closer = closer[np.argpartition(reduced[closer], len(closestSoFar) - 1)[:len(closestSoFar)]]
+
+            for i in closer:
+                if reduced[i] < -closestSoFar[0][0]:
+                    heapreplace(closestSoFar, (-reduced[i], start + i))
+
+            if scan:
+                continue
+
+            # left subtree is rows [end, start of right subtree), right subtree is [its start, hi)
+            left, right = self.__leftChildren[n], self.__rightChildren[n]
+
+            if right != -1:
+                stack.append((right, hi))
+
+                if stats is not None:
+                    depths.append(depth + 1)
+
+            if left != -1:
+                stack.append((left, self.__nodeStarts[right] if right != -1 else hi))
+
+                if stats is not None:
+                    depths.append(depth + 1)
+
+
+    # Returns k nearest neighbors of each row of an (m, d) matrix of query points, as two (m, k) arrays:
+    # distances (closest first) and indices into the point list. Rows with fewer than k neighbors are padded
+    # with distance inf and index -1.
+    # Queries are traversed as a block: each node's ball bound is tested against every query still active
+    # in that subtree at once, and queries it prunes are dropped for the whole subtree.
+    # eps > 0 makes the search approximate, as in BallTree.kNearestNeighborsSearch
+    def query_batch(self, queries, k, eps=0):
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.__dimensions)
+        numQueries = len(queries)
+
+        # best reduced distances so far (sorted ascending) and their rows, per query
+        bestReduced = np.full((numQueries, self.__numCandidates(k)), np.inf)
+        bestRows = np.full((numQueries, self.__numCandidates(k)), -1, dtype=np.intp)
+
+        shrink = searchLimits(eps, None, None)[0]
+
+        if k > 0:
+            self.__queryBatch(queries, bestReduced, bestRows, shrink)
+
+        # re-rank each query's candidates by their full-precision coords
+        if self.__storage != 'float64':
+
+            for i in range(numQueries):
+                found = bestRows[i] != -1
+                bestReduced[i, found] = self.__kernel.reducedDistances(queries[i], self.__exactCoords(bestRows[i, found]))
+
+            order = np.argsort(bestReduced, axis=1, kind='stable')[:, :k]
+            bestReduced = np.take_along_axis(bestReduced, order, axis=1)
+            bestRows = np.take_along_axis(bestRows, order, axis=1)
+
+        # map rows back to indices into the point list (leaving -1 padding alone)
+        indices = np.full_like(bestRows, -1)
+        found = bestRows != -1
+        indices[found] = self.__indices[bestRows[found]]
+
+        return self.__kernel.toDistance(bestReduced), indices
+
+
+    # Blocked depth-first search with an explicit stack of (node, active), where active holds the indices of
+    # the queries that may still have neighbors in that node's subtree (pruned against query radii times shrink)
+    def __queryBatch(self, queries, bestReduced, bestRows, shrink):
+
+        k = bestReduced.shape[1]
+        stack = [(self.__root, np.arange(len(queries)))] if self.__root != -1 else []
+
+        while stack:
+
+            n, active = stack.pop()
+            start, end = self.__nodeStarts[n], self.__nodeEnds[n]
+
+            # reduced distances between every active query and every row of this node's block
+            reduced = self.__kernel.pairwiseReducedDistances(queries[active], self.__block(start, end))
+            bounds = bestReduced[active, k - 1]  # reduced distance to each query's farthest neighbor so far
+
+            # drop queries whose query ball doesn't overlap this node's ball
+            keep = self.__kernel.toDistance(reduced[:, 0]) - self.__radii[n] <= self.__kernel.toDistance(bounds) * shrink
+            active, reduced, bounds = active[keep], reduced[keep], bounds[keep]
+
+            if len(active) == 0:
+                continue
+
+            # merge the block into the neighbors of each query that it improves on
+            improves = (reduced < bounds[:, np.newaxis]).any(axis=1)
+
+            if improves.any():
+                improved = active[improves]
+
+                allReduced = np.concatenate([bestReduced[improved], reduced[improves]], axis=1)
+                allRows = np.concatenate([bestRows[improved],
+                                          np.broadcast_to(np.arange(start, end), (len(improved), end - start))],
+                                         axis=1)
+
+                order = np.argsort(allReduced, axis=1, kind='stable')[:, :k]
+
+                bestReduced[improved] = np.take_along_axis(allReduced, order, axis=1)
+                bestRows[improved] = np.take_along_axis(allRows, order, axis=1)
+
+            for child in (self.__rightChildren[n], self.__leftChildren[n]):
+                if child != -1:
+                    stack.append((child, active))
+
+
+    # Returns array of indices (into the point list) of all points within distance r of the query point
+    def query_radius(self, queryCoords, r):
+
+        offsets, indices = self.query_radius_batch([queryCoords], r)
+        return indices
+
+
+    # Returns number of points within distance r of the query point
+    # Subtrees whose balls lie entirely inside the query sphere are counted without looking at their points
+    def count_radius(self, queryCoords, r):
+
+        queries = np.asarray(queryCoords, dtype=np.float64).reshape(1, self.__dimensions)
+        subtrees, matches = self.__radiusSearch(queries, np.array([float(r)]))
+
+        return int(sum(hi - start for queryIds, start, hi in subtrees) + sum(len(rows) for queryIds, rows in matches))
+
+
+    # Returns points within distance r of each row of an (m, d) matrix of query points, in CSR layout:
+    # (offsets, indices), where indices[offsets[i]:offsets[i + 1]] are the indices (into the point list)
+    # of the points within r of query i. r is one radius for all queries, or an array of one per query.
+    # (with compact storage, distances are to the stored coords)
+    def query_radius_batch(self, queries, r):
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.__dimensions)
+        radii = np.broadcast_to(np.asarray(r, dtype=np.float64), (len(queries),))
+
+        subtrees, matches = self.__radiusSearch(queries, radii)
+
+        # (query, row) pairs - every row of each whole subtree, plus the matching points of blocks
+        queryIds = [np.repeat(ids, hi - start) for ids, start, hi in subtrees] + [ids for ids, rows in matches]
+        rows = [np.tile(np.arange(start, hi), len(ids)) for ids, start, hi in subtrees] + [rows for ids, rows in matches]
+
+        queryIds = np.concatenate(queryIds) if queryIds else np.empty(0, dtype=np.intp)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+
+        # group by query
+        order = np.argsort(queryIds, kind='stable')
+
+        offsets = np.zeros(len(queries) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(queryIds, minlength=len(queries)), out=offsets[1:])
+
+        return offsets, self.__indices[rows[order]]
+
+
+    # Blocked depth-first radius search of all queries at once, with an explicit stack of
+    # (node, row where node's subtree ends, indices of queries still active in it)
+    # Returns two lists:
+    #   subtrees - (queryIds, start, hi) for queries whose spheres contain the whole subtree of rows [start, hi)
+    #   matches  - (queryIds, rows) pairs of queries and the points of a node's own block within their spheres
+    def __radiusSearch(self, queries, radii):
+
+        subtrees = []
+        matches = []
+
+        stack = [(self.__root, len(self.__indices), np.arange(len(queries)))] if self.__root != -1 else []
+
+        while stack:
+
+            n, hi, active = stack.pop()
+            start, end = self.__nodeStarts[n], self.__nodeEnds[n]
+
+            # distance from each active query to this node's pivot
+            pivotDists = self.__kernel.toDistance(
+                self.__kernel.pairwiseReducedDistances(queries[active], self.__block(start, start + 1))[:, 0])
+
+            # drop queries whose sphere doesn't overlap this node's ball
+            overlaps = pivotDists - self.__radii[n] <= radii[active]
+            active, pivotDists = active[overlaps], pivotDists[overlaps]
+
+            # queries whose sphere contains the whole ball take the whole subtree, without checking its points
+            inside = pivotDists + self.__radii[n] <= radii[active]
+
+            if inside.any():
+                subtrees.append((active[inside], start, hi))
+                active = active[~inside]
+
+            if len(active) == 0:
+                continue
+
+            # check this node's own block point by point
+            reduced = self.__kernel.pairwiseReducedDistances(queries[active], self.__block(start, end))
+            queryIds, blockRows = np.nonzero(reduced <= self.__kernel.toReduced(radii[active])[:, np.newaxis])
+
+            if len(queryIds):
+                matches.append((active[queryIds], start + blockRows))
+
+            # left subtree is rows [end, start of right subtree), right subtree is [its start, hi)
+            left, right = self.__leftChildren[n], self.__rightChildren[n]
+
+            if right != -1:
+                stack.append((right, hi, active))
+            if left != -1:
+                stack.append((left, self.__nodeStarts[right] if right != -1 else hi, active))
+
+        return subtrees, matches
+
+
+    # Returns the k nearest neighbors of every point in the tree (not counting the point itself) as a sparse
+    # graph in CSR layout: (offsets, indices, distances), where indices[offsets[i]:offsets[i + 1]] are the
+    # indices (into the point list) of point i's neighbors, closest first, and distances their distances
+    # (scipy.sparse.csr_matrix((distances, indices, offsets)) makes it a sparse matrix)
+    # Every point has min(k, num of points - 1) neighbors.
+    # Dual-tree traversal of the tree against itself: pairs of (query, reference) ranges of rows are pruned once
+    # the reference ball can't hold a point closer than the current k-th neighbor of any point in the query ball,
+    # i.e. dist(centers) - both radii > the largest k-th neighbor distance in the query range. Pairs of ranges of
+    # at most KNN_GRAPH_BLOCK rows are compared all-pairs in one batched distance computation.
+    # (with compact storage, distances are to the stored coords)
+    def knn_graph(self, k):
+
+        numPoints = len(self.__indices)
+        k = max(min(k, numPoints - 1), 0)
+
+        if k == 0:
+            return (np.zeros(numPoints + 1, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+
+        coords = self.__block(0, numPoints)
+        pivots = coords[self.__nodeStarts].tolist()  # each node's pivot coords, for distances between balls
+
+        # each row's k nearest so far (rows of the tree, not point indices), and the farthest of them
+        bestDists = np.full((numPoints, k), np.inf)
+        bestRows = np.full((numPoints, k), -1, dtype=np.intp)
+        kthDists = np.full(numPoints, np.inf)
+
+        # stack of (query, reference) pairs of ranges (see __graphParts)
+        root = (0, numPoints, self.__root, self.__radii[self.__root], self.__root)
+        stack = [(root, root)]
+
+        while stack:
+
+            query, reference = stack.pop()
+            qlo, qhi, qCenter, qRadius, qNode = query
+            rlo, rhi, rCenter, rRadius, rNode = reference
+
+            # prune if the reference ball can't improve any point in the query ball: every query point's k-th
+            # neighbor is within the largest k-th distance so far, and also within the smallest plus the query
+            # ball's diameter (the k nearest of the point with the smallest are that close to every other point)
+            queryKths = kthDists[qlo:qhi]
+            bound = min(queryKths.max(), queryKths.min() + 2 * qRadius)
+
+            if self.__kernel.distance(pivots[qCenter], pivots[rCenter]) - qRadius - rRadius > bound:
+                continue
+
+            qSplits = qNode != -1 and qhi - qlo > KNN_GRAPH_BLOCK
+            rSplits = rNode != -1 and rhi - rlo > KNN_GRAPH_BLOCK
+
+            # both small --> compare all pairs
+            if not qSplits and not rSplits:
+                self.__graphBlock(coords, pivots, query, reference, bound, bestDists, bestRows, kthDists)
+
+            # split the bigger range (its parts partition it, so every pair of points is compared at most once)
+            elif qSplits and (not rSplits or qhi - qlo >= rhi - rlo):
+                for part in self.__graphParts(query, coords, pivots):
+                    stack.append((part, reference))
+
+            else:
+                # closer reference part is visited first (pushed last), so the k-th distances shrink sooner
+                parts = self.__graphParts(reference, coords, pivots)
+
+                if len(parts) == 2 and self.__kernel.distance(pivots[qCenter], pivots[parts[0][2]]) - parts[0][3] < \
+                        self.__kernel.distance(pivots[qCenter], pivots[parts[1][2]]) - parts[1][3]:
+                    parts.reverse()
+
+                for part in parts:
+                    stack.append((query, part))
+
+        # closest first, and rows back in point list order
+        order = np.argsort(bestDists, axis=1, kind='stable')
+        bestDists = np.take_along_axis(bestDists, order, axis=1)
+        bestRows = np.take_along_axis(bestRows, order, axis=1)
+
+        rowOfPoint = np.empty(numPoints, dtype=np.intp)
+        rowOfPoint[self.__indices] = np.arange(numPoints)
+
+        indices = np.asarray(self.__indices)[bestRows[rowOfPoint]]
+
+        return (np.arange(numPoints + 1, dtype=np.intp) * k, indices.ravel(), bestDists[rowOfPoint].ravel())
+
+
+    # Returns the parts a knn_graph range splits into
+    # A range (lo, hi, center node, radius, node) is node's subtree, rows [node's start, hi), plus rows
+    # [lo, node's start) of the pivots of ancestors it was split from (a subtree's rows are its pivot, then its
+    # left subtree, then its right subtree, so keeping each pivot with its left subtree keeps ranges contiguous
+    # and splits them in two). Its ball is centered on center node's pivot; node is -1 if it can't be split.
+    def __graphParts(self, part, coords, pivots):
+
+        lo, hi, center, radius, node = part
+        end = self.__nodeEnds[node]
+        left, right = self.__leftChildren[node], self.__rightChildren[node]
+        leftHi = self.__nodeStarts[right] if right != -1 else hi
+
+        parts = []
+
+        # pivots down to here, plus the left subtree (or nothing more, if there's no left child); the ball is
+        # the left child's, grown to hold the pivots above it
+        if left != -1:
+            leftStart = self.__nodeStarts[left]
+            pivotsRadius = self.__kernel.distances(np.asarray(pivots[left]), coords[lo:leftStart]).max()
+            parts.append((lo, leftHi, left, max(self.__radii[left], pivotsRadius), left))
+        else:
+            pivotsRadius = self.__kernel.distances(np.asarray(pivots[node]), coords[lo:end]).max()
+            parts.append((lo, end, node, pivotsRadius, -1))
+
+        if right != -1:
+            parts.append((self.__nodeStarts[right], hi, right, self.__radii[right], right))
+
+        return parts
+
+
+    # knn_graph base case: compares the rows of a query range with the rows of a reference range (other than
+    # themselves), merging the reference rows into the query rows' k nearest so far
+    # Only rows that can matter are compared: query rows whose k-th distance reaches the reference ball, and
+    # reference rows within bound (the query range's pruning bound, see knn_graph) of the query ball
+    def __graphBlock(self, coords, pivots, query, reference, bound, bestDists, bestRows, kthDists):
+
+        qlo, qhi, qCenter, qRadius, qNode = query
+        rlo, rhi, rCenter, rRadius, rNode = reference
+        k = bestDists.shape[1]
+
+        queryDists = self.__kernel.distances(np.asarray(pivots[rCenter]), coords[qlo:qhi])
+        queryRows = qlo + np.flatnonzero(queryDists - rRadius <= kthDists[qlo:qhi])
+
+        referenceDists = self.__kernel.distances(np.asarray(pivots[qCenter]), coords[rlo:rhi])
+        referenceRows = rlo + np.flatnonzero(referenceDists - qRadius <= bound)
+
+        if len(queryRows) == 0 or len(referenceRows) == 0:
+            return
+
+        dists = self.__kernel.pairwiseDistances(coords[queryRows], coords[referenceRows])
+
+        # a row isn't its own neighbor
+        if qlo < rhi and rlo < qhi:
+            dists[queryRows[:, np.newaxis] == referenceRows] = np.inf
+
+        # only query rows with a closer point than their k-th neighbor so far change
+        improved = np.flatnonzero(dists.min(axis=1) < kthDists[queryRows])
+
+        if len(improved) == 0:
+            return
+
+        queryRows = queryRows[improved]
+        allDists = np.concatenate([bestDists[queryRows], dists[improved]], axis=1)
+
+        # k nearest of the old k and the new ones (columns past k are the reference rows)
+        nearest = np.argpartition(allDists, k - 1, axis=1)[:, :k]
+        old = nearest < k
+
+        bestRows[queryRows] = np.where(old, bestRows[queryRows[:, np.newaxis], np.where(old, nearest, 0)],
+                                       referenceRows[np.where(old, 0, nearest - k)])
+        bestDists[queryRows] = allDists[np.arange(len(queryRows))[:, np.newaxis], nearest]
+        kthDists[queryRows] = bestDists[queryRows].max(axis=1)
+
+
+# Builds both kinds of tree over the same points and compares their memory use
+# Returns dict of bytes used by each tree, and bytes per point
+def memoryReport(points, dimensions, leaf_size=1):
+
+    nodeBytes = BallTree(points, dimensions).memoryUsage()
+    arrayBytes = ArrayBallTree(points, dimensions, leaf_size).memoryUsage()
+
+    numPoints = max(len(points), 1)
+
+    return {'points': len(points),
+            'dimensions': dimensions,
+            'nodeTreeBytes': nodeBytes,
+            'arrayTreeBytes': arrayBytes,
+            'nodeTreeBytesPerPoint': nodeBytes / numPoints,
+            'arrayTreeBytesPerPoint': arrayBytes / numPoints}
@@ -0,0 +1,99 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Vectorized brute-force knn search, for when the tree can't prune (see QueryPlanner)
+
+import numpy as np
+from .kernels import getKernel, EuclideanKernel
+
+
+# BruteForceEngine.query_batch computes distances for about this many (query, point) pairs at a time
+BRUTE_FORCE_CHUNK = 2 ** 22
+
+
+# Brute Force Engine class
+# Finds the k nearest neighbors of a query by computing its distance to every point: one NumPy computation per
+# chunk of queries, and argpartition for the k smallest (the same scan as FakeBallTree.knnSearch, vectorized)
+# With the euclidean metric, squared distances come from one matrix product, |q|^2 - 2 q.x + |x|^2; that form
+# loses precision to cancellation, so the k found are re-ranked by their directly computed distances
+# coords is an (n, d) matrix of points; ids is the id of each row (its row number, if None)
+class BruteForceEngine(object):
+
+    def __init__(self, coords, metric='euclidean', ids=None):
+
+        self.__coords = np.asarray(coords, dtype=np.float64)
+        self.__kernel = getKernel(metric, self.__coords.shape[1])
+        self.__ids = np.arange(len(self.__coords)) if ids is None else np.asarray(ids)
+
+        # squared norm of each row, for the matrix product form
+        self.__squaredNorms = None
+
+        if self.__kernel is EuclideanKernel:
+            self.__squaredNorms = np.einsum('ij,ij->i', self.__coords, self.__coords)
+
+
+    # Returns num of points
+    def __len__(self):
+        return len(self.__coords)
+
+
+    # Returns k nearest neighbors of the query, as BallTree.kNearestNeighborsSearch does: list of
+    # (distance, id) tuples, closest first
+    def kNearestNeighborsSearch(self, queryCoords, k):
+
+        dists, ids = self.query_batch(np.asarray(queryCoords, dtype=np.float64).reshape(1, -1), k)
+        found = ids[0] != -1
+
+        return [(float(d), int(i)) for d, i in zip(dists[0, found], ids[0, found])]
+
+
+    # Returns k nearest neighbors of each row of an (m, d) matrix of query points, as two (m, k) arrays:
+    # distances (closest first) and ids (as ArrayBallTree.query_batch, padded with inf and -1)
+    def query_batch(self, queries, k):
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.__coords.shape[1])
+        numPoints = len(self.__coords)
+        found = min(k, numPoints)
+
+        dists = np.full((len(queries), k), np.inf)
+        ids = np.full((len(queries), k), -1, dtype=np.intp)
+
+        if found == 0:
+            return dists, ids
+
+        chunkSize = max(1, BRUTE_FORCE_CHUNK // numPoints)
+
+        for chunk in range(0, len(queries), chunkSize):
+
+            q = queries[chunk:chunk + chunkSize]
+            reduced = self.__reducedDistances(q)
+
+            # k smallest of each row, then their exact reduced distances, closest first
+            nearest = np.argpartition(reduced, found - 1, axis=1)[:, :found] if found < numPoints else \
+                np.broadcast_to(np.arange(numPoints), (len(q), numPoints))
+
+            if self.__squaredNorms is not None:
+                diffs = self.__coords[nearest] - q[:, np.newaxis, :]
+                nearestReduced = np.einsum('ijk,ijk->ij', diffs, diffs)
+            else:
+                nearestReduced = np.take_along_axis(reduced, nearest, axis=1)
+
+            order = np.argsort(nearestReduced, axis=1, kind='stable')
+
+            dists[chunk:chunk + len(q), :found] = self.__kernel.toDistance(
+                np.take_along_axis(nearestReduced, order, axis=1))
+            ids[chunk:chunk + len(q), :found] = self.__ids[np.take_along_axis(nearest, order, axis=1)]
+
+        return dists, ids
+
+
+    # Returns (m, n) matrix of reduced distances between each query and each point
+    def __reducedDistances(self, queries):
+
+        if self.__squaredNorms is None:
+            return self.__kernel.pairwiseReducedDistances(queries, self.__coords)
+
+        reduced = np.einsum('ij,ij->i', queries, queries)[:, np.newaxis] - 2 * queries @ self.__coords.T
+        reduced += self.__squaredNorms
+
+        return np.maximum(reduced, 0, out=reduced)
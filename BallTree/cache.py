@@ -0,0 +1,127 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Cache of query results, for trees that see the same queries again and again
+
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+# Returned by QueryCache.get when there's no cached result (None is a result - findExact of a point not in tree)
+CACHE_MISS = object()
+
+
+# Query Cache class (see BallTree.setQueryCache)
+# Bounded cache of search results, keyed on the operation, the query coordinates and the search's options
+# With a tolerance, knn query coords are rounded to a multiple of it, so nearby queries share a result (whose
+# distances are to the query that was searched); findExact coords never are (a nearby query isn't the point)
+#   - least recently used results are evicted once it holds max_size of them
+#   - with a ttl, results expire that many seconds after they're cached
+#   - knn results are cached once per query, with the k they were searched with: a later search for fewer
+#     neighbors gets the first k of them (the k nearest of a longer list are its first k)
+# The tree it's attached to invalidates it (drops every result) whenever its point set changes, so one cache
+# is attached to one tree at a time
+# Counts hits, misses, evictions (to make room), expirations (past their ttl) and invalidations
+class QueryCache(object):
+
+    def __init__(self, max_size=1024, ttl=None, tolerance=None):
+
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+
+        if tolerance is not None and tolerance <= 0:
+            raise ValueError("tolerance must be greater than 0")
+
+        self.__maxSize = max_size
+        self.__ttl = ttl
+        self.__tolerance = tolerance
+        self.__entries = OrderedDict()  # key --> (result, k, expiry time or None), least recently used first
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+
+    # Returns num of results cached
+    def __len__(self):
+        return len(self.__entries)
+
+
+    # Returns dict of the counters
+    def counters(self):
+
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'invalidations': self.invalidations, 'size': len(self.__entries)}
+
+
+    # Returns key of a query: operation ('knn' or 'findExact'), its coords (as a tuple, rounded to tolerance for
+    # knn), and any other options the result depends on
+    def key(self, operation, coords, *options):
+
+        if isinstance(coords, np.ndarray):
+            coords = coords.tolist()
+
+        if self.__tolerance is not None and operation == 'knn':
+            coords = [round(c / self.__tolerance) for c in coords]
+
+        return (operation, tuple(coords)) + options
+
+
+    # Returns cached result for the key, or CACHE_MISS
+    # For knn results, k is the num of neighbors asked for: a result cached with at least k neighbors (or with
+    # fewer neighbors than it was searched for, i.e. every point in the tree) gives its first k
+    def get(self, key, k=None):
+
+        entry = self.__entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return CACHE_MISS
+
+        result, cachedK, expiry = entry
+
+        if expiry is not None and time.monotonic() > expiry:
+            del self.__entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return CACHE_MISS
+
+        if k is not None and k > cachedK and len(result) == cachedK:
+            self.misses += 1
+            return CACHE_MISS
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+
+        # (a copy, so the caller can't change the cached list)
+        return result[:k] if k is not None else result
+
+
+    # Caches the result for the key (k as in get)
+    def put(self, key, result, k=None):
+
+        if k is not None:
+            result = list(result)
+
+        expiry = None if self.__ttl is None else time.monotonic() + self.__ttl
+
+        self.__entries[key] = (result, k, expiry)
+        self.__entries.move_to_end(key)
+
+        # full --> evict least recently used
+        while len(self.__entries) > self.__maxSize:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+
+    # Drops every cached result (the tree's point set changed)
+    def invalidate(self):
+
+        self.__entries.clear()
+        self.invalidations += 1
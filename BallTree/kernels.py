@@ -0,0 +1,297 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Distance kernels - the metrics both trees are built and searched with
+
+import math
+import numpy as np
+
+
+# Returns euclidian distance between two sets of coordinates
+def distance(c1, c2): 
+
+    # math.dist does the sum of squared differences and the square root in C
+    return math.dist(c1, c2)
+
+
+# Euclidean distance kernel
+# Scalar, one-to-many and many-to-many distance functions. The "reduced" distance (squared distance) orders
+# points the same way as the distance itself, so comparisons use it and skip the square root.
+class EuclideanKernel(object):
+
+    name = 'euclidean'
+
+    # Returns distance between two sets of coordinates (scalar fast path)
+    @staticmethod
+    def distance(c1, c2):
+        return math.dist(c1, c2)
+
+    # Returns reduced distances between one set of coordinates and each row of an (n, d) matrix
+    @staticmethod
+    def reducedDistances(c, coords):
+
+        diffs = coords - c
+        return np.einsum('ij,ij->i', diffs, diffs)
+
+    # Returns distances between one set of coordinates and each row of an (n, d) matrix
+    @staticmethod
+    def distances(c, coords):
+        return np.sqrt(EuclideanKernel.reducedDistances(c, coords))
+
+    # Returns (m, n) matrix of reduced distances between each row of an (m, d) and an (n, d) matrix
+    @staticmethod
+    def pairwiseReducedDistances(coordsA, coordsB):
+
+        diffs = coordsA[:, np.newaxis, :] - coordsB[np.newaxis, :, :]
+        return np.einsum('ijk,ijk->ij', diffs, diffs)
+
+    # Returns (m, n) matrix of distances between each row of an (m, d) and an (n, d) matrix
+    @staticmethod
+    def pairwiseDistances(coordsA, coordsB):
+        return np.sqrt(EuclideanKernel.pairwiseReducedDistances(coordsA, coordsB))
+
+    # Converts reduced distance(s) to distance(s)
+    @staticmethod
+    def toDistance(reduced):
+        return np.sqrt(reduced)
+
+    # Converts distance(s) to reduced distance(s)
+    @staticmethod
+    def toReduced(dist):
+        return dist * dist
+
+
+# Manhattan (L1) distance kernel - sum of absolute differences
+# Same functions as EuclideanKernel; there's no cheaper form that orders points the same way,
+# so the reduced distance is the distance itself
+class ManhattanKernel(object):
+
+    name = 'manhattan'
+
+    @staticmethod
+    def distance(c1, c2):
+        return float(sum(abs(a - b) for a, b in zip(c1, c2)))
+
+    @staticmethod
+    def reducedDistances(c, coords):
+        return np.abs(coords - c).sum(axis=1)
+
+    @staticmethod
+    def distances(c, coords):
+        return ManhattanKernel.reducedDistances(c, coords)
+
+    @staticmethod
+    def pairwiseReducedDistances(coordsA, coordsB):
+        return np.abs(coordsA[:, np.newaxis, :] - coordsB[np.newaxis, :, :]).sum(axis=2)
+
+    @staticmethod
+    def pairwiseDistances(coordsA, coordsB):
+        return ManhattanKernel.pairwiseReducedDistances(coordsA, coordsB)
+
+    @staticmethod
+    def toDistance(reduced):
+        return np.asarray(reduced, dtype=np.float64)
+
+    @staticmethod
+    def toReduced(dist):
+        return np.asarray(dist, dtype=np.float64)
+
+
+# Chebyshev (L-infinity) distance kernel - largest absolute difference at any one dimension
+# Reduced distance is the distance itself
+class ChebyshevKernel(object):
+
+    name = 'chebyshev'
+
+    @staticmethod
+    def distance(c1, c2):
+        return float(max(abs(a - b) for a, b in zip(c1, c2)))
+
+    @staticmethod
+    def reducedDistances(c, coords):
+        return np.abs(coords - c).max(axis=1)
+
+    @staticmethod
+    def distances(c, coords):
+        return ChebyshevKernel.reducedDistances(c, coords)
+
+    @staticmethod
+    def pairwiseReducedDistances(coordsA, coordsB):
+        return np.abs(coordsA[:, np.newaxis, :] - coordsB[np.newaxis, :, :]).max(axis=2)
+
+    @staticmethod
+    def pairwiseDistances(coordsA, coordsB):
+        return ChebyshevKernel.pairwiseReducedDistances(coordsA, coordsB)
+
+    @staticmethod
+    def toDistance(reduced):
+        return np.asarray(reduced, dtype=np.float64)
+
+    @staticmethod
+    def toReduced(dist):
+        return np.asarray(dist, dtype=np.float64)
+
+
+# Minkowski (Lp) distance kernel, for any p >= 1 (below 1 it isn't a metric, so pruning would be wrong)
+# Made with the p to use, e.g. MinkowskiKernel(3); reduced distance is the sum of |differences| ** p
+class MinkowskiKernel(object):
+
+    name = 'minkowski'
+
+    def __init__(self, p):
+
+        if not 1 <= p < float('inf'):
+            raise ValueError("Minkowski p must be at least 1 and finite (use 'chebyshev' for p = infinity)")
+
+        self.p = float(p)
+
+    def distance(self, c1, c2):
+        return float(sum(abs(a - b) ** self.p for a, b in zip(c1, c2)) ** (1 / self.p))
+
+    def reducedDistances(self, c, coords):
+        return (np.abs(coords - c) ** self.p).sum(axis=1)
+
+    def distances(self, c, coords):
+        return self.toDistance(self.reducedDistances(c, coords))
+
+    def pairwiseReducedDistances(self, coordsA, coordsB):
+        return (np.abs(coordsA[:, np.newaxis, :] - coordsB[np.newaxis, :, :]) ** self.p).sum(axis=2)
+
+    def pairwiseDistances(self, coordsA, coordsB):
+        return self.toDistance(self.pairwiseReducedDistances(coordsA, coordsB))
+
+    def toDistance(self, reduced):
+        return np.asarray(reduced, dtype=np.float64) ** (1 / self.p)
+
+    def toReduced(self, dist):
+        return np.asarray(dist, dtype=np.float64) ** self.p
+
+
+# Haversine (great-circle) distance kernel, for 2-dimensional points of (latitude, longitude) in radians
+# Distances are angles (multiply by the sphere's radius, e.g. 6371 km for the Earth, for lengths)
+# Reduced distance is the haversine of the angle, sin^2(angle / 2), which is between 0 and 1
+class HaversineKernel(object):
+
+    name = 'haversine'
+    dimensions = 2
+
+    @staticmethod
+    def distance(c1, c2):
+
+        h = math.sin((c2[0] - c1[0]) / 2) ** 2 + \
+            math.cos(c1[0]) * math.cos(c2[0]) * math.sin((c2[1] - c1[1]) / 2) ** 2
+
+        return 2 * math.asin(math.sqrt(min(h, 1.0)))
+
+    @staticmethod
+    def reducedDistances(c, coords):
+
+        return np.sin((coords[:, 0] - c[0]) / 2) ** 2 + \
+            math.cos(c[0]) * np.cos(coords[:, 0]) * np.sin((coords[:, 1] - c[1]) / 2) ** 2
+
+    @staticmethod
+    def distances(c, coords):
+        return HaversineKernel.toDistance(HaversineKernel.reducedDistances(c, coords))
+
+    @staticmethod
+    def pairwiseReducedDistances(coordsA, coordsB):
+
+        latA, lonA = coordsA[:, 0, np.newaxis], coordsA[:, 1, np.newaxis]
+        latB, lonB = coordsB[np.newaxis, :, 0], coordsB[np.newaxis, :, 1]
+
+        return np.sin((latB - latA) / 2) ** 2 + np.cos(latA) * np.cos(latB) * np.sin((lonB - lonA) / 2) ** 2
+
+    @staticmethod
+    def pairwiseDistances(coordsA, coordsB):
+        return HaversineKernel.toDistance(HaversineKernel.pairwiseReducedDistances(coordsA, coordsB))
+
+    # (infinite reduced distance - no neighbor found yet - stays infinite)
+    @staticmethod
+    def toDistance(reduced):
+
+        reduced = np.asarray(reduced, dtype=np.float64)
+        return np.where(reduced == np.inf, np.inf, 2 * np.arcsin(np.sqrt(np.clip(reduced, 0, 1))))
+
+    # (no two points are more than pi apart, so larger distances are treated as pi)
+    @staticmethod
+    def toReduced(dist):
+        return np.sin(np.minimum(np.asarray(dist, dtype=np.float64), np.pi) / 2) ** 2
+
+
+# Cosine (angular) distance kernel - the angle between two vectors, in radians
+# (1 - cosine similarity breaks the triangle inequality, so the tree can't prune with it; the angle orders
+# points the same way and is a true metric)
+# Vectors are scaled to unit length, and the reduced distance is the squared (Euclidean) chord between them,
+# which is more accurate for small angles than going through the cosine. Zero vectors have no direction,
+# and are left as they are.
+class CosineKernel(object):
+
+    name = 'cosine'
+
+    @staticmethod
+    def distance(c1, c2):
+
+        n1, n2 = math.hypot(*c1) or 1.0, math.hypot(*c2) or 1.0
+        chord = math.dist([a / n1 for a in c1], [b / n2 for b in c2])
+
+        return 2 * math.asin(min(chord / 2, 1.0))
+
+    # Returns coords (one vector, or one per row) scaled to unit length
+    @staticmethod
+    def normalize(coords):
+
+        norms = np.linalg.norm(coords, axis=-1, keepdims=True)
+        return coords / np.where(norms == 0, 1.0, norms)
+
+    @staticmethod
+    def reducedDistances(c, coords):
+        return EuclideanKernel.reducedDistances(CosineKernel.normalize(c), CosineKernel.normalize(coords))
+
+    @staticmethod
+    def distances(c, coords):
+        return CosineKernel.toDistance(CosineKernel.reducedDistances(c, coords))
+
+    @staticmethod
+    def pairwiseReducedDistances(coordsA, coordsB):
+        return EuclideanKernel.pairwiseReducedDistances(CosineKernel.normalize(coordsA), CosineKernel.normalize(coordsB))
+
+    @staticmethod
+    def pairwiseDistances(coordsA, coordsB):
+        return CosineKernel.toDistance(CosineKernel.pairwiseReducedDistances(coordsA, coordsB))
+
+    # (infinite reduced distance - no neighbor found yet - stays infinite)
+    @staticmethod
+    def toDistance(reduced):
+
+        reduced = np.asarray(reduced, dtype=np.float64)
+        return np.where(reduced == np.inf, np.inf, 2 * np.arcsin(np.sqrt(np.clip(reduced, 0, 4)) / 2))
+
+    # (no two vectors are more than pi apart, so larger angles are treated as pi)
+    @staticmethod
+    def toReduced(dist):
+        return (2 * np.sin(np.minimum(np.asarray(dist, dtype=np.float64), np.pi) / 2)) ** 2
+
+
+# Kernels for the metric= names the trees accept (Minkowski needs its p, so it's passed as MinkowskiKernel(p))
+METRICS = {'euclidean': EuclideanKernel,
+           'manhattan': ManhattanKernel,
+           'chebyshev': ChebyshevKernel,
+           'haversine': HaversineKernel,
+           'cosine': CosineKernel}
+
+
+# Returns the kernel for a metric (one of the names in METRICS, or a kernel such as MinkowskiKernel(3))
+# for points of the given number of dimensions (if given)
+def getKernel(metric, dimensions=None):
+
+    if isinstance(metric, str):
+
+        if metric not in METRICS:
+            raise ValueError("unknown metric: " + metric)
+
+        metric = METRICS[metric]
+
+    if dimensions is not None and getattr(metric, 'dimensions', dimensions) != dimensions:
+        raise ValueError(metric.name + " metric needs " + str(metric.dimensions) + "-dimensional points")
+
+    return metric
@@ -0,0 +1,125 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Running batches of queries against an ArrayBallTree across worker processes or threads
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from .arrayTree import ArrayBallTree
+
+
+# Parallel Query Executor class
+# Runs batches of knn queries against an ArrayBallTree (which mustn't change while the executor is open),
+# split into chunks across a pool of workers. Results come back in the same order as the queries.
+#   backend='processes' - the tree's arrays are copied once into shared memory; each worker process attaches
+#                         to them read-only, so only query chunks and results are sent between processes
+#   backend='threads'   - worker threads share the tree directly (NumPy releases the GIL in its inner loops)
+# (worker processes have no full-precision coords, so with compact storage their results aren't re-ranked)
+class ParallelQueryExecutor(object):
+
+    def __init__(self, tree, n_jobs=-1, backend='processes'):
+
+        if backend not in ('processes', 'threads'):
+            raise ValueError("unknown backend: " + str(backend))
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        if n_jobs < 1:
+            raise ValueError("n_jobs must be at least 1, or -1")
+
+        self.__tree = tree
+        self.__dimensions = tree.exportArrays()['coords'].shape[1]
+        self.__numJobs = n_jobs
+        self.__sharedMemory = []
+
+        if backend == 'threads':
+            self.__pool = ThreadPoolExecutor(max_workers=n_jobs)
+            return
+
+        # copy each of the tree's arrays into a block of shared memory
+        layout = {}
+
+        for name, array in tree.exportArrays().items():
+
+            memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[:] = array
+
+            self.__sharedMemory.append(memory)
+            layout[name] = (memory.name, array.shape, array.dtype.str)
+
+        self.__pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=attachSharedTree,
+                                          initargs=(layout, tree.getMetric()))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+    # Shuts down the workers and releases the shared memory
+    def close(self):
+
+        self.__pool.shutdown()
+
+        for memory in self.__sharedMemory:
+            memory.close()
+            memory.unlink()
+
+        self.__sharedMemory = []
+
+
+    # Same as ArrayBallTree.query_batch: returns (m, k) arrays of distances and indices into the point list
+    def query_batch(self, queries, k, eps=0):
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.__dimensions)
+
+        # a few chunks per worker, so uneven chunks even out
+        chunks = [c for c in np.array_split(queries, self.__numJobs * 4) if len(c)]
+
+        if not chunks:
+            return self.__tree.query_batch(queries, k, eps)
+
+        if self.__sharedMemory:
+            results = list(self.__pool.map(querySharedTree, chunks, [k] * len(chunks), [eps] * len(chunks)))
+        else:
+            results = list(self.__pool.map(self.__tree.query_batch, chunks, [k] * len(chunks), [eps] * len(chunks)))
+
+        return (np.concatenate([dists for dists, indices in results]),
+                np.concatenate([indices for dists, indices in results]))
+
+
+# Tree each ParallelQueryExecutor worker process queries, and the shared memory it's attached to
+sharedTree = None
+sharedTreeMemory = []
+
+
+# ParallelQueryExecutor worker process initializer
+# Attaches to the shared memory blocks described by layout (array name --> (block name, shape, dtype)),
+# which hold a tree built with the given metric
+def attachSharedTree(layout, metric):
+
+    global sharedTree
+
+    arrays = {}
+
+    for name, (blockName, shape, dtype) in layout.items():
+
+        memory = shared_memory.SharedMemory(name=blockName)
+        sharedTreeMemory.append(memory)
+
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+        array.flags.writeable = False
+        arrays[name] = array
+
+    sharedTree = ArrayBallTree.fromArrays(arrays, metric=metric)
+
+
+# ParallelQueryExecutor worker process task: runs one chunk of queries
+def querySharedTree(queries, k, eps=0):
+    return sharedTree.query_batch(queries, k, eps)
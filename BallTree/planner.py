@@ -0,0 +1,326 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Choosing between tree traversal and brute force for each knn query, by their estimated costs
+
+import random
+import time
+import numpy as np
+from .bruteForce import BruteForceEngine
+from .search import QueryStats
+
+
+# Plans a QueryPlanner chooses between
+PLANS = ('tree', 'bruteForce')
+
+# Weight of each new observation in QueryPlanner's running averages
+PLANNER_SMOOTHING = 0.1
+
+# k the planner's calibration searches are for
+CALIBRATION_K = 10
+
+
+# Returns estimate of the intrinsic dimension of the rows of an (n, d) matrix of points (the TwoNN estimator):
+# for points spread over a manifold of dimension m, the ratio mu of a point's second to first nearest neighbor
+# distances is Pareto-distributed with shape m, so m is about (num of points sampled) / (sum of their log mu)
+# Sampled points with a duplicate (first neighbor distance 0) are skipped; with none left, returns d
+def intrinsicDimension(coords, sample_size=200, metric='euclidean', seed=None):
+
+    coords = np.asarray(coords, dtype=np.float64)
+    numPoints, dimensions = coords.shape
+
+    if numPoints < 3:
+        return float(dimensions)
+
+    rng = np.random.default_rng(seed)
+    sample = coords[rng.choice(numPoints, min(sample_size, numPoints), replace=False)]
+
+    # 3 nearest: the sampled point itself, then its first and second neighbors
+    dists = BruteForceEngine(coords, metric).query_batch(sample, 3)[0]
+    first, second = dists[:, 1], dists[:, 2]
+
+    valid = first > 0
+    logRatios = np.log(second[valid] / first[valid])
+
+    if logRatios.sum() <= 0:
+        return float(dimensions)
+
+    return min(float(valid.sum() / logRatios.sum()), float(dimensions))
+
+
+# Query Planner class
+# Answers knn queries against an ArrayBallTree (with float64 storage) by whichever plan it estimates is cheaper:
+#   'tree'       - the tree's own search (kNearestNeighborsSearch, or query_batch for a batch)
+#   'bruteForce' - a BruteForceEngine scan of every point
+# Estimated seconds per query:
+#   tree       - nodes a search visits * seconds per node visit. Nodes visited are the running average of
+#                searches for the same k, or, for a k not seen yet, the average for the closest k seen, scaled
+#                by how many leaves a ball holding k points is expected to cross: (1 + (k / b)^(1 / m))^m, for b
+#                rows per leaf and m the intrinsic dimension estimated when the planner is made
+#   bruteForce - running average of brute-force scans (about n * d work, whatever the data)
+# so a tree search wins in low intrinsic dimension, where its prune rate is high, and brute force wins for
+# high-dimensional data, small trees and large k. Batches have their own running averages (see query_batch).
+# The choice is made per query (or per batch), and per subtree: the planner's tree searches scan subtrees whole
+# once scanning one costs no more than visiting a node (scan_rows, see ArrayBallTree.kNearestNeighborsSearch).
+# A few queries (explore_rate of them) run the plan that wasn't chosen, so its estimate keeps up with the data.
+# Making the planner calibrates it, by timing both plans on a sample of the tree's points. Each of its tree
+# searches fills in a QueryStats of its own, so the tree itself isn't changed: its stats hook, and the searches
+# of its other users, are left as they are.
+# Each query's plan is in lastPlan (see explain), and the num of queries run by each plan in planCounts.
+class QueryPlanner(object):
+
+    def __init__(self, tree, sample_size=20, explore_rate=0.02, seed=None):
+
+        arrays = tree.exportArrays()
+        coords = arrays['coords']
+
+        if coords.dtype != np.float64:
+            raise ValueError("QueryPlanner needs a tree with float64 storage")
+
+        if not 0 <= explore_rate <= 1:
+            raise ValueError("explore_rate must be between 0 and 1")
+
+        self.__tree = tree
+        self.__engine = BruteForceEngine(coords, tree.getMetric(), arrays['indices'])
+        self.__numPoints, self.__dimensions = coords.shape
+        self.__numNodes = tree.numNodes()
+        self.__exploreRate = explore_rate
+        self.__random = random.Random(seed)
+
+        self.intrinsicDimension = intrinsicDimension(coords, 10 * sample_size, tree.getMetric(), seed)
+        self.planCounts = dict.fromkeys(PLANS, 0)
+        self.lastPlan = None
+
+        # running averages (None until observed)
+        self.__visits = {}               # k --> nodes visited by a tree search for k neighbors
+        self.__nodeSeconds = None        # seconds per node a tree search visits
+        self.__pruneRate = None          # fraction of the nodes a tree search visits that it prunes
+        self.__bruteSeconds = None       # seconds per brute-force query
+        self.__treeBatchRatio = None     # seconds per query of tree.query_batch, over a single search's estimate
+        self.__bruteBatchSeconds = None  # seconds per query of a brute-force batch
+
+        self.__scanRows = 0  # size of the subtrees the planner's tree searches scan whole
+        self.__calibrate(coords[np.random.default_rng(seed).integers(0, self.__numPoints, sample_size)]
+                         if self.__numPoints else np.empty((0, self.__dimensions)))
+
+
+    # Returns k nearest neighbors of the query as list of (distance, id) tuples, closest first, found by
+    # whichever plan is estimated to be cheaper
+    def kNearestNeighborsSearch(self, queryCoords, k):
+
+        plan = self.__choose(k, 1)
+
+        if plan['plan'] == 'tree':
+            result, stats, seconds = self.__treeSearch(queryCoords, k)
+            self.__observeTree(k, stats, seconds)
+        else:
+            start = time.perf_counter()
+            result = self.__engine.kNearestNeighborsSearch(queryCoords, k)
+            self.__bruteSeconds = self.__average(self.__bruteSeconds, time.perf_counter() - start)
+
+        return result
+
+
+    # Returns k nearest neighbors of each row of an (m, d) matrix of queries, as ArrayBallTree.query_batch does,
+    # with the whole batch run by one plan
+    # Batches are estimated per query, from running averages of each plan's batches: brute force by its seconds
+    # per query, the tree by the ratio of its seconds per query to what single searches are estimated to take
+    def query_batch(self, queries, k):
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.__dimensions)
+        plan = self.__choose(k, len(queries))
+
+        start = time.perf_counter()
+
+        if plan['plan'] == 'tree':
+            result = self.__tree.query_batch(queries, k)
+        else:
+            result = self.__engine.query_batch(queries, k)
+
+        self.__observeBatch(plan['plan'], k, len(queries), time.perf_counter() - start)
+
+        return result
+
+
+    # Returns the plan for queries for k neighbors (num_queries > 1 for a batch), without running it: dict of
+    #   plan          - 'tree' or 'bruteForce'
+    #   k, queries    - the k and num of queries planned for
+    #   treeCost      - estimated seconds per query of each plan
+    #   bruteForceCost
+    #   scanRows      - size of the subtrees tree searches scan whole
+    #   explored      - True if the plan isn't the cheaper one, but is run to keep its estimate up to date
+    #                   (only in lastPlan; explain never explores)
+    def explain(self, k, num_queries=1):
+
+        treeCost = self.__visitsFor(k) * self.__nodeSeconds
+
+        if num_queries > 1:
+            treeCost *= self.__treeBatchRatio
+            bruteCost = self.__bruteBatchSeconds
+        else:
+            bruteCost = self.__bruteSeconds
+
+        return {'plan': 'tree' if treeCost <= bruteCost else 'bruteForce',
+                'k': k,
+                'queries': num_queries,
+                'treeCost': treeCost,
+                'bruteForceCost': bruteCost,
+                'scanRows': self.__scanRows,
+                'explored': False}
+
+
+    # Returns dict of what the planner has measured and estimated
+    def summary(self):
+
+        return {'points': self.__numPoints,
+                'dimensions': self.__dimensions,
+                'intrinsicDimension': self.intrinsicDimension,
+                'scanRows': self.__scanRows,
+                'nodeSeconds': self.__nodeSeconds,
+                'pruneRate': self.__pruneRate,
+                'nodesVisited': dict(self.__visits),
+                'bruteForceSeconds': self.__bruteSeconds,
+                'bruteForceBatchSeconds': self.__bruteBatchSeconds,
+                'treeBatchRatio': self.__treeBatchRatio,
+                'planCounts': dict(self.planCounts)}
+
+
+    # Times both plans on the sample queries, and sets the size of the subtrees the tree scans whole
+    def __calibrate(self, queries):
+
+        if len(queries) == 0:
+            self.__nodeSeconds = self.__bruteSeconds = self.__bruteBatchSeconds = 0.0
+            self.__treeBatchRatio = 1.0
+            self.__visits[CALIBRATION_K] = 0
+            return
+
+        # brute force, one query at a time and as a batch (both start off from their medians, not averages)
+        times = []
+
+        for q in queries:
+            start = time.perf_counter()
+            self.__engine.kNearestNeighborsSearch(q, CALIBRATION_K)
+            times.append(time.perf_counter() - start)
+
+        self.__bruteSeconds = float(np.median(times))
+
+        start = time.perf_counter()
+        self.__engine.query_batch(queries, CALIBRATION_K)
+        self.__bruteBatchSeconds = (time.perf_counter() - start) / len(queries)
+
+        # tree, node by node: a subtree is worth scanning once scanning it costs no more than visiting a node
+        self.__calibrateTree(queries)
+
+        rowSeconds = self.__bruteSeconds / self.__numPoints
+        rowsPerNode = self.__numPoints / max(self.__numNodes, 1)
+
+        scanRows = int(self.__nodeSeconds / rowSeconds) if rowSeconds > 0 else 0
+        self.__scanRows = scanRows if scanRows >= 2 * rowsPerNode else 0
+
+        # tree again, scanning small subtrees
+        if self.__scanRows:
+            self.__calibrateTree(queries)
+
+        start = time.perf_counter()
+        self.__tree.query_batch(queries, CALIBRATION_K)
+        batchSeconds = (time.perf_counter() - start) / len(queries)
+
+        self.__treeBatchRatio = batchSeconds / max(self.__visitsFor(CALIBRATION_K) * self.__nodeSeconds, 1e-9)
+
+
+    # Times tree searches for CALIBRATION_K neighbors of the queries, starting the tree's running averages over
+    def __calibrateTree(self, queries):
+
+        seconds = visits = prunes = 0
+
+        for q in queries:
+
+            result, stats, searchSeconds = self.__treeSearch(q, CALIBRATION_K)
+
+            seconds += searchSeconds
+            visits += stats.nodesVisited
+            prunes += stats.prunes
+
+        self.__visits = {CALIBRATION_K: visits / len(queries)}
+        self.__nodeSeconds = seconds / max(visits, 1)
+        self.__pruneRate = prunes / max(visits, 1)
+
+
+    # Returns the plan for queries for k neighbors (num_queries > 1 for a batch), and counts it
+    def __choose(self, k, num_queries):
+
+        plan = self.explain(k, num_queries)
+
+        if self.__random.random() < self.__exploreRate:
+            plan['plan'] = 'bruteForce' if plan['plan'] == 'tree' else 'tree'
+            plan['explored'] = True
+
+        self.planCounts[plan['plan']] += num_queries
+        self.lastPlan = plan
+
+        return plan
+
+
+    # Returns estimated num of nodes a tree search for k neighbors visits (see QueryPlanner)
+    def __visitsFor(self, k):
+
+        if k in self.__visits:
+            return self.__visits[k]
+
+        seenK = min(self.__visits, key=lambda seen: abs(seen - k))
+        rowsPerLeaf = max(self.__numPoints / max(self.__numNodes, 1), self.__scanRows, 1)
+        m = max(self.intrinsicDimension, 1)
+
+        def leavesCrossed(numNeighbors):
+            return (1 + (max(numNeighbors, 1) / rowsPerLeaf) ** (1 / m)) ** m
+
+        return min(self.__visits[seenK] * leavesCrossed(k) / leavesCrossed(seenK), self.__numNodes)
+
+
+    # Runs a tree search for k neighbors, scanning subtrees of up to scanRows rows whole
+    # Returns (result, its QueryStats, seconds it took)
+    def __treeSearch(self, queryCoords, k):
+
+        stats = QueryStats('knn')
+
+        start = time.perf_counter()
+        result = self.__tree.kNearestNeighborsSearch(queryCoords, k, scan_rows=self.__scanRows, stats=stats)
+
+        return result, stats, time.perf_counter() - start
+
+
+    # Folds a tree search for k neighbors, with the given stats, that took the given seconds into the running
+    # averages
+    def __observeTree(self, k, stats, seconds):
+
+        # (a result from the tree's query cache visits no nodes)
+        if stats.nodesVisited == 0:
+            return
+
+        self.__visits[k] = self.__average(self.__visits.get(k), stats.nodesVisited)
+        self.__nodeSeconds = self.__average(self.__nodeSeconds, seconds / stats.nodesVisited)
+        self.__pruneRate = self.__average(self.__pruneRate, stats.prunes / stats.nodesVisited)
+
+
+    # Folds a batch of queries run by the given plan into the running averages
+    def __observeBatch(self, plan, k, numQueries, seconds):
+
+        # (a batch of one is estimated as a single query)
+        if numQueries < 2:
+            return
+
+        if plan == 'tree':
+            estimate = max(self.__visitsFor(k) * self.__nodeSeconds, 1e-9)
+            self.__treeBatchRatio = self.__average(self.__treeBatchRatio, seconds / numQueries / estimate)
+        else:
+            self.__bruteBatchSeconds = self.__average(self.__bruteBatchSeconds, seconds / numQueries)
+
+
+    # Returns running average updated with a new observation (the observation itself, if there's no average yet)
+    @staticmethod
+    def __average(average, observation):
+
+        if average is None:
+            return observation
+
+        return (1 - PLANNER_SMOOTHING) * average + PLANNER_SMOOTHING * observation
@@ -0,0 +1,57 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Brute-force reference implementation, used as ground truth by the tests and benchmarks
+
+from heapq import *
+from .kernels import getKernel
+
+
+# Fake BallTree Class 
+# Performs the same operations as does the real BallTree class, albeit via brute force
+
+class FakeBallTree(object):
+
+    def __init__(self, points, metric='euclidean'):     
+        
+        self.__points = points  # list of tuples in the form ([coords], data)
+        self.__kernel = getKernel(metric)
+        
+    # Accessor method - returns point list
+    def getPoints(self):
+        return self.__points
+        
+    # Returns data associated with query coordinates
+    def findExact(self, coords):
+        
+        for p in self.__points:
+        
+            if p[0] == coords:   # if this point's coords match query coords, 
+                return p[1]      # return point's data
+            
+        # return None otherwise    
+            
+    # Returns k nearest neighbors to query point
+    def knnSearch(self, coords, k):
+        
+        distHeap = []
+        
+        for p in self.__points:
+            
+            # compute distance from point to search point
+            dist = self.__kernel.distance(coords, p[0])  # p[0] = the current point's coords
+            
+            
+            # add point to heap with its distance
+            heappush(distHeap, (dist, p))
+            
+        # once all points have been added to heap, pop top k items 
+        # (those closest to search point) and return them as a list
+        
+        ansList = []
+        for i in range(k):
+            if len(distHeap) != 0:
+                p = heappop(distHeap)
+                ansList.append((p[0], p[1]))  # (distance, point)
+            
+        return ansList
@@ -0,0 +1,77 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Helpers shared by both trees' searches: hash indexes, approximate search limits, and stats
+
+import time
+import numpy as np
+
+
+# Returns hash index mapping each point's coordinates (as a tuple) to its id (its position in the list)
+# If several points share coordinates, the first one in the list wins
+def buildHashIndex(points):
+
+    hashIndex = {}
+
+    for i, p in enumerate(points):
+        hashIndex.setdefault(tuple(p[0]), i)
+
+    return hashIndex
+
+
+# Returns the limits of an approximate knn search (see BallTree.kNearestNeighborsSearch): the factor the query
+# radius is multiplied by when pruning, the max num of nodes to visit, and the time to stop at (or None)
+def searchLimits(eps, max_nodes, time_budget):
+
+    if eps < 0:
+        raise ValueError("eps must be at least 0")
+
+    if max_nodes is not None and max_nodes < 1:
+        raise ValueError("max_nodes must be at least 1")
+
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    return 1 / (1 + eps), float('inf') if max_nodes is None else max_nodes, deadline
+
+
+# Per-query stats, filled in by a tree's searches while it has a stats hook (see BallTree.setStatsHook)
+class QueryStats(object):
+
+    def __init__(self, operation):
+
+        self.operation = operation     # 'knn' or 'findExact'
+        self.nodesVisited = 0
+        self.distanceEvaluations = 0   # num of distances computed between the query point and points in the tree
+        self.prunes = 0                # num of nodes (with their subtrees) skipped by the ball bound
+        self.maxDepth = 0              # depth of the deepest node visited (root = 1)
+
+
+    def __str__(self):
+        return str(self.__dict__)
+
+
+# Returns dict of a tree's shape stats, from the depth and radius of each node, and num of points in each leaf:
+#   depthHistogram    - num of nodes at each depth (root = 1)
+#   radiusPercentiles - min, 25th, 50th, 75th, 90th percentile and max of node radii
+#   meanRadiusByDepth - mean radius of the nodes at each depth (balls that don't shrink on the way down
+#                       point to poor splits)
+#   leafOccupancy     - num of leaves holding each num of points
+def treeShapeStats(depths, radii, leafSizes):
+
+    depths = np.asarray(depths, dtype=np.intp)
+    radii = np.asarray(radii, dtype=np.float64)
+    levels, levelCounts = np.unique(depths, return_counts=True)
+    sizes, sizeCounts = np.unique(np.asarray(leafSizes, dtype=np.intp), return_counts=True)
+
+    if len(radii):
+        percentiles = np.percentile(radii, [0, 25, 50, 75, 90, 100])
+    else:
+        percentiles = [0.0] * 6
+
+    return {'numNodes': len(depths),
+            'numLeaves': len(leafSizes),
+            'depth': int(depths.max()) if len(depths) else 0,
+            'depthHistogram': {int(d): int(c) for d, c in zip(levels, levelCounts)},
+            'radiusPercentiles': dict(zip(['min', 'p25', 'p50', 'p75', 'p90', 'max'], map(float, percentiles))),
+            'meanRadiusByDepth': {int(d): float(radii[depths == d].mean()) for d in levels},
+            'leafOccupancy': {int(s): int(c) for s, c in zip(sizes, sizeCounts)}}
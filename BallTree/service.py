@@ -0,0 +1,324 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Asyncio front-end to a tree, batching concurrent queries
+
+import asyncio
+import bisect
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# AsyncBallTreeService runs a batch's knn queries for the same k as one block traversal only if there are at least
+# this many of them (fewer are searched one by one)
+BATCH_TRAVERSAL_MIN = 8
+
+# Default upper bounds (in seconds) of the latency histogram's buckets: 50 microseconds to about 3 seconds, doubling
+LATENCY_BUCKETS = tuple(0.00005 * 2 ** i for i in range(17))
+
+# Default upper bounds of the queue depth and batch size histograms' buckets
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+# Histogram class
+# Counts observations in buckets with the given (ascending) upper bounds, each bucket holding the values
+# greater than the previous bound and at most its own, plus an overflow bucket for values past the last bound
+class Histogram(object):
+
+    def __init__(self, bounds):
+
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+
+
+    def observe(self, value):
+
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+    # Returns upper bound of the bucket holding the given percentile (0-100) of the observations (inf if it's the
+    # overflow bucket), or None if nothing has been observed
+    def percentile(self, p):
+
+        if self.count == 0:
+            return None
+
+        rank = max(math.ceil(self.count * p / 100), 1)
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float('inf')
+
+
+    # Returns dict of the bucket bounds and counts, num of observations and their sum
+    def snapshot(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'count': self.count, 'sum': self.total}
+
+
+# Async Ball Tree Service class
+# Answers knn and findExact queries from coroutines without blocking the event loop: each request joins a queue,
+# and a background task takes requests off it in micro-batches that run on an executor (by default its own
+# single worker thread, so one batch runs at a time)
+# A batch closes once it has max_batch requests, or max_delay seconds after its first request was queued.
+# Batches adapt to the load: when requests queue up while a batch is running, their deadline has already passed
+# by the time it finishes, so all of them (up to max_batch) make up the next batch without any more waiting;
+# when they're few, a request waits at most max_delay for company.
+# With an ArrayBallTree, a batch's knn queries for the same k (at least BATCH_TRAVERSAL_MIN of them) run as one
+# query_batch block traversal (which doesn't go through the tree's query cache or stats hook); otherwise each
+# query is searched on its own.
+# Backpressure: at most max_queue requests wait in the queue; past that, when_full='wait' makes callers wait
+# for room, and when_full='reject' raises asyncio.QueueFull (counted in rejected).
+# Histograms: queueDepth (requests already waiting when each one is queued), latency (seconds from being queued
+# to being answered), and batchSizes.
+# The tree mustn't change while the service is open (batches run on another thread).
+class AsyncBallTreeService(object):
+
+    def __init__(self, tree, max_batch=64, max_delay=0.001, max_queue=1024, when_full='wait', executor=None,
+                 latency_buckets=LATENCY_BUCKETS):
+
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+
+        if max_delay < 0:
+            raise ValueError("max_delay must be at least 0")
+
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+
+        if when_full not in ('wait', 'reject'):
+            raise ValueError("unknown when_full: " + str(when_full))
+
+        self.__tree = tree
+        self.__batched = hasattr(tree, 'query_batch')
+        self.__maxBatch = max_batch
+        self.__maxDelay = max_delay
+        self.__maxQueue = max_queue
+        self.__whenFull = when_full
+
+        # executor is shut down on close only if it's the service's own
+        self.__ownsExecutor = executor is None
+        self.__executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+
+        self.__queue = None  # made on start, in the running event loop
+        self.__batcher = None
+        self.__closed = False
+
+        self.queueDepth = Histogram(COUNT_BUCKETS)
+        self.latency = Histogram(latency_buckets)
+        self.batchSizes = Histogram(COUNT_BUCKETS)
+        self.rejected = 0
+
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.close()
+
+
+    # Starts the background batching task (requests start it too, if it isn't running yet)
+    async def start(self):
+
+        if self.__closed:
+            raise RuntimeError("service is closed")
+
+        if self.__batcher is None:
+            self.__queue = asyncio.Queue(self.__maxQueue)
+            self.__batcher = asyncio.get_running_loop().create_task(self.__batchRequests())
+
+
+    # Answers the requests already queued, then stops the batching task (and the executor, if it's the service's)
+    async def close(self):
+
+        if self.__closed:
+            return
+
+        self.__closed = True
+
+        if self.__batcher is not None:
+            await self.__queue.put(None)  # stop marker, after the queued requests
+            await self.__batcher
+
+            # requests that were still waiting for room when the marker went in
+            while not self.__queue.empty():
+                request = self.__queue.get_nowait()
+
+                if request is not None and not request[3].done():
+                    request[3].set_exception(RuntimeError("service is closed"))
+
+        if self.__ownsExecutor:
+            self.__executor.shutdown()
+
+
+    # Returns k nearest neighbors of the query, as tree.kNearestNeighborsSearch(queryCoords, k) does:
+    # list of (distance, id) tuples, closest first
+    async def knn(self, queryCoords, k):
+        return await self.__submit('knn', queryCoords, k)
+
+
+    # Returns the data of the point with the query coordinates, or None if no such point in tree
+    async def find_exact(self, queryCoords):
+        return await self.__submit('findExact', queryCoords, None)
+
+
+    # Returns dict of the histograms' snapshots, latency percentiles and num of rejected requests
+    def stats(self):
+
+        return {'queueDepth': self.queueDepth.snapshot(),
+                'latency': self.latency.snapshot(),
+                'batchSizes': self.batchSizes.snapshot(),
+                'latencyP50': self.latency.percentile(50),
+                'latencyP99': self.latency.percentile(99),
+                'rejected': self.rejected}
+
+
+    # Queues a request and waits for its answer
+    async def __submit(self, operation, queryCoords, k):
+
+        await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        request = (operation, queryCoords, k, future, time.perf_counter())
+
+        self.queueDepth.observe(self.__queue.qsize())
+
+        if self.__whenFull == 'reject':
+            try:
+                self.__queue.put_nowait(request)
+            except asyncio.QueueFull:
+                self.rejected += 1
+                raise
+        else:
+            await self.__queue.put(request)
+
+        return await future
+
+
+    # Background task: takes requests off the queue in batches and runs them, until the stop marker (None)
+    async def __batchRequests(self):
+
+        while True:
+
+            request = await self.__queue.get()
+
+            if request is None:
+                return
+
+            batch = [request]
+            deadline = request[4] + self.__maxDelay
+            stopping = False
+
+            # requests already queued join right away; then more are waited for until the first one's deadline
+            while len(batch) < self.__maxBatch:
+
+                if self.__queue.empty():
+                    timeout = deadline - time.perf_counter()
+
+                    if timeout <= 0:
+                        break
+
+                    try:
+                        request = await asyncio.wait_for(self.__queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    request = self.__queue.get_nowait()
+
+                if request is None:
+                    stopping = True
+                    break
+
+                batch.append(request)
+
+            await self.__runBatch(batch)
+
+            if stopping:
+                return
+
+
+    # Runs a batch on the executor and answers each of its requests
+    async def __runBatch(self, batch):
+
+        self.batchSizes.observe(len(batch))
+
+        # callers who stopped waiting don't need answers
+        batch = [request for request in batch if not request[3].cancelled()]
+
+        if not batch:
+            return
+
+        answers = await asyncio.get_running_loop().run_in_executor(self.__executor, self.__answer, batch)
+        now = time.perf_counter()
+
+        for (operation, queryCoords, k, future, queued), (failed, answer) in zip(batch, answers):
+
+            self.latency.observe(now - queued)
+
+            if future.done():
+                continue
+
+            if failed:
+                future.set_exception(answer)
+            else:
+                future.set_result(answer)
+
+
+    # Returns list of (failed, answer or exception) for each request of a batch (runs on the executor)
+    def __answer(self, batch):
+
+        answers = [None] * len(batch)
+        groups = {}  # k --> positions in batch of its knn requests (when they can run as one query_batch)
+
+        for i, (operation, queryCoords, k, future, queued) in enumerate(batch):
+
+            if operation == 'knn' and self.__batched:
+                groups.setdefault(k, []).append(i)
+            else:
+                answers[i] = self.__answerOne(batch[i])
+
+        for k, group in groups.items():
+
+            # (a block traversal has a setup cost that a few queries don't make up for)
+            if len(group) < BATCH_TRAVERSAL_MIN:
+                for i in group:
+                    answers[i] = self.__answerOne(batch[i])
+                continue
+
+            try:
+                dists, indices = self.__tree.query_batch([batch[i][1] for i in group], k)
+            except Exception:
+                # e.g. a query with the wrong num of dimensions --> run them one by one, so only it fails
+                for i in group:
+                    answers[i] = self.__answerOne(batch[i])
+                continue
+
+            # rows are padded with index -1 when there are fewer than k points
+            for row, i in enumerate(group):
+                found = indices[row] != -1
+                answers[i] = (False, [(float(d), int(j)) for d, j in zip(dists[row, found], indices[row, found])])
+
+        return answers
+
+
+    # Returns (failed, answer or exception) for one request
+    def __answerOne(self, request):
+
+        operation, queryCoords, k = request[:3]
+
+        try:
+            if operation == 'knn':
+                return (False, self.__tree.kNearestNeighborsSearch(queryCoords, k))
+
+            return (False, self.__tree.findExact(queryCoords))
+
+        except Exception as e:
+            return (True, e)
@@ -0,0 +1,297 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Building an ArrayBallTree over more points than fit in memory
+
+import math
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
+from .arrayTree import ArrayBallTree
+
+
+# Streaming Tree Builder class (see ArrayBallTree.fromStream)
+# Builds an ArrayBallTree over points on disk, without ever holding all of them in memory:
+#   - points that don't fit in one partition are split like any other node (dimension of greatest spread,
+#     median pivot), but with the dimension and median taken from a random sample of them. One pass over the
+#     points, a chunk at a time, computes the node's radius and writes each point to its child's file on disk.
+#   - points that fit in one partition are read in and built into a subtree in memory
+# Nodes are written out in preorder as they're built (so the tree has the same layout as one built in memory),
+# to files that are joined into one tree file at the end
+class StreamingTreeBuilder(object):
+
+    # names and dtypes of the arrays the tree file is made of (see ArrayBallTree.exportArrays)
+    ARRAYS = [('coords', np.float64), ('indices', np.intp), ('nodeStarts', np.intp), ('nodeEnds', np.intp),
+              ('radii', np.float64), ('leftChildren', np.intp), ('rightChildren', np.intp)]
+
+    def __init__(self, dimensions, leafSize, pivot, kernel, chunkSize, sampleSize, partitionSize):
+
+        if leafSize < 1:
+            raise ValueError("leaf_size must be at least 1")
+
+        if pivot not in ('medianOfFive', 'exact'):
+            raise ValueError("unknown pivot: " + str(pivot))
+
+        if min(chunkSize, sampleSize, partitionSize) < 1:
+            raise ValueError("chunk_size, sample_size and partition_size must be at least 1")
+
+        self.__dimensions = dimensions
+        self.__leafSize = leafSize
+        self.__pivot = pivot
+        self.__kernel = kernel
+        self.__chunkSize = chunkSize
+        self.__sampleSize = sampleSize
+        self.__partitionSize = partitionSize
+
+
+    # Builds the tree over the points of source and writes it to path
+    def build(self, source, path, tempDir=None):
+
+        self.__tempDir = tempfile.mkdtemp(prefix='balltree-', dir=tempDir)
+        self.__numFiles = 0
+        self.__random = np.random.default_rng(random.getrandbits(64))  # for sampling
+
+        try:
+            # output arrays, appended to as nodes are built
+            self.__outputs = {name: open(os.path.join(self.__tempDir, name), 'wb') for name, dtype in self.ARRAYS}
+            self.__numRows = 0
+            self.__numNodes = 0
+            self.__links = []  # (parent, whether it's the left child, child) for each node with a parent
+
+            try:
+                coords, indices = self.__spillSource(source)
+                self.__buildSubtrees(coords, indices)
+            finally:
+                for f in self.__outputs.values():
+                    f.close()
+
+            self.__writeTree(path)
+
+        finally:
+            shutil.rmtree(self.__tempDir, ignore_errors=True)
+
+
+    # Returns source as an on-disk (n, d) float64 matrix, and None for its indices (0 to n - 1)
+    # An array is used as it is; an iterable is written to a file a chunk at a time
+    def __spillSource(self, source):
+
+        if isinstance(source, np.ndarray):
+            return source.reshape(-1, self.__dimensions), None
+
+        name = self.__newFile()
+        numRows = 0
+        chunk = []
+
+        with open(name, 'wb') as f:
+
+            for row in source:
+
+                chunk.append(row)
+
+                if len(chunk) == self.__chunkSize:
+                    np.asarray(chunk, dtype=np.float64).reshape(-1, self.__dimensions).tofile(f)
+                    numRows += len(chunk)
+                    chunk = []
+
+            np.asarray(chunk, dtype=np.float64).reshape(-1, self.__dimensions).tofile(f)
+            numRows += len(chunk)
+
+        return self.__openFile(name, np.float64, (numRows, self.__dimensions)), None
+
+
+    # Returns the path of a new file in the temporary directory
+    def __newFile(self):
+
+        self.__numFiles += 1
+        return os.path.join(self.__tempDir, 'part' + str(self.__numFiles))
+
+
+    # Returns a file in the temporary directory as a read-only memory-mapped array
+    def __openFile(self, name, dtype, shape):
+
+        if math.prod(shape) == 0:
+            return np.empty(shape, dtype=dtype)
+
+        return np.memmap(name, dtype=dtype, mode='r', shape=shape)
+
+
+    # Builds the tree over the given points, with an explicit stack of (coords, indices, parent node, whether
+    # it's the parent's left child, files to delete once read) subtrees still to be built
+    # (indices of None = the rows are points 0 to n - 1)
+    def __buildSubtrees(self, coords, indices):
+
+        stack = [(coords, indices, -1, False, [])]
+
+        while stack:
+
+            coords, indices, parent, isLeft, files = stack.pop()
+
+            if len(coords) == 0:
+                pass
+
+            elif len(coords) <= self.__partitionSize:
+                self.__buildInMemory(coords, indices, parent, isLeft)
+
+            else:
+                left, right = self.__split(coords, indices, parent, isLeft)
+
+                # left is pushed last, so it's built first (preorder)
+                stack.append(right)
+                stack.append(left)
+
+            # this subtree's points have been read --> its files (if it's a split of another subtree) can go
+            coords = indices = None
+
+            for name in files:
+                os.remove(name)
+
+
+    # Returns the given rows [lo, hi) of coords as float64, and their indices
+    def __readChunk(self, coords, indices, lo, hi):
+
+        chunkIndices = np.arange(lo, hi, dtype=np.intp) if indices is None else np.asarray(indices[lo:hi])
+
+        return np.asarray(coords[lo:hi], dtype=np.float64), chunkIndices
+
+
+    # Reads in the given points, builds them into a subtree in memory, and writes it out
+    def __buildInMemory(self, coords, indices, parent, isLeft):
+
+        coords, indices = self.__readChunk(coords, indices, 0, len(coords))
+
+        arrays = ArrayBallTree._fromCoords(coords, self.__leafSize, self.__pivot, self.__kernel).exportArrays()
+        nodeOffset = self.__numNodes
+
+        # subtree's rows and nodes come after those written so far
+        arrays['indices'] = indices[arrays['indices']]
+        arrays['nodeStarts'] = arrays['nodeStarts'] + self.__numRows
+        arrays['nodeEnds'] = arrays['nodeEnds'] + self.__numRows
+
+        for name in ('leftChildren', 'rightChildren'):
+            arrays[name] = np.where(arrays[name] == -1, -1, arrays[name] + nodeOffset)
+
+        for name, dtype in self.ARRAYS:
+            np.ascontiguousarray(arrays[name], dtype=dtype).tofile(self.__outputs[name])
+
+        self.__numRows += len(coords)
+        self.__numNodes += len(arrays['radii'])
+
+        if parent != -1:
+            self.__links.append((parent, isLeft, nodeOffset))
+
+
+    # Splits the given points (too many to hold in memory) at a new node, and writes the node out
+    # Returns its left and right subtrees to build, in the form used by __buildSubtrees
+    def __split(self, coords, indices, parent, isLeft):
+
+        numRows = len(coords)
+
+        ## 1.Find dimension of greatest spread, and
+        ## 2.The median at that dimension (the pivot), from a random sample of the points:
+        # (sampled with replacement, so it takes no more memory than the sample itself)
+        sampleRows = np.unique(self.__random.integers(0, numRows, self.__sampleSize))
+        sample = np.asarray(coords[sampleRows], dtype=np.float64)
+
+        dimensionOfGS = int(np.argmax(sample.max(axis=0) - sample.min(axis=0)))
+
+        mid = len(sample) // 2
+        median = np.argpartition(sample[:, dimensionOfGS], mid)[mid]
+
+        pivotRow = sampleRows[median]
+        pivotCoords = sample[median]
+        pivotVal = pivotCoords[dimensionOfGS]
+
+        ## 3.Split remaining points in two according to the pivot, one chunk at a time, into files on disk;
+        ## 4.Radius is the distance between pivot and farthest point:
+        halves = [(self.__newFile(), self.__newFile()) for side in ('left', 'right')]  # (coords, indices) files
+        outputs = [(open(coordsName, 'wb'), open(indicesName, 'wb')) for coordsName, indicesName in halves]
+        sizes = [0, 0]
+        maxReduced = 0.0
+        numTies = 0  # points tied with pivot alternate sides, so duplicate-heavy data still splits evenly
+
+        try:
+            for lo in range(0, numRows, self.__chunkSize):
+
+                hi = min(lo + self.__chunkSize, numRows)
+                chunkCoords, chunkIndices = self.__readChunk(coords, indices, lo, hi)
+
+                maxReduced = max(maxReduced, float(np.max(self.__kernel.reducedDistances(pivotCoords, chunkCoords))))
+
+                vals = chunkCoords[:, dimensionOfGS]
+                others = np.arange(lo, hi) != pivotRow
+
+                ties = np.flatnonzero(others & (vals == pivotVal))
+                goesLeft = vals < pivotVal
+                goesLeft[ties[(numTies % 2)::2]] = True
+                numTies += len(ties)
+
+                for i, mask in enumerate((others & goesLeft, others & ~goesLeft)):
+                    chunkCoords[mask].tofile(outputs[i][0])
+                    chunkIndices[mask].tofile(outputs[i][1])
+                    sizes[i] += int(mask.sum())
+
+            pivotIndex = pivotRow if indices is None else int(indices[pivotRow])
+
+        finally:
+            for coordsFile, indicesFile in outputs:
+                coordsFile.close()
+                indicesFile.close()
+
+        ## 5.Write out this node (a block of just its pivot); its children are built from the two halves
+        node = self.__numNodes
+
+        self.__writeNode(pivotCoords, pivotIndex, float(self.__kernel.toDistance(maxReduced)))
+
+        if parent != -1:
+            self.__links.append((parent, isLeft, node))
+
+        subtrees = []
+
+        for (coordsName, indicesName), size, childIsLeft in zip(halves, sizes, (True, False)):
+            subtrees.append((self.__openFile(coordsName, np.float64, (size, self.__dimensions)),
+                             self.__openFile(indicesName, np.intp, (size,)),
+                             node, childIsLeft, [coordsName, indicesName]))
+
+        return subtrees[0], subtrees[1]
+
+
+    # Writes out an internal node with the given pivot and radius (its children are linked in at the end)
+    def __writeNode(self, pivotCoords, pivotIndex, radius):
+
+        values = {'coords': pivotCoords, 'indices': pivotIndex, 'nodeStarts': self.__numRows,
+                  'nodeEnds': self.__numRows + 1, 'radii': radius, 'leftChildren': -1, 'rightChildren': -1}
+
+        for name, dtype in self.ARRAYS:
+            np.asarray(values[name], dtype=dtype).tofile(self.__outputs[name])
+
+        self.__numRows += 1
+        self.__numNodes += 1
+
+
+    # Links up each node to its parent, and writes the finished arrays out as one tree file
+    def __writeTree(self, path):
+
+        arrays = {}
+
+        for name, dtype in self.ARRAYS:
+
+            if name == 'coords':
+                shape = (self.__numRows, self.__dimensions)
+            elif name == 'indices':
+                shape = (self.__numRows,)
+            else:
+                shape = (self.__numNodes,)
+
+            fileName = os.path.join(self.__tempDir, name)
+
+            if math.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(fileName, dtype=dtype, mode='r+', shape=shape)
+
+        for parent, isLeft, child in self.__links:
+            arrays['leftChildren' if isLeft else 'rightChildren'][parent] = child
+
+        ArrayBallTree.fromArrays(arrays, leaf_size=self.__leafSize, metric=self.__kernel).save(path)
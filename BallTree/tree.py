@@ -0,0 +1,774 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Ball tree of linked Node objects
+
+import math
+import random
+import sys
+import time
+from heapq import *
+import numpy as np
+from .cache import CACHE_MISS
+from .kernels import getKernel
+from .search import buildHashIndex, searchLimits, QueryStats, treeShapeStats
+
+
+# BallTree.insert rebuilds a subtree once one of its children holds more than this fraction of its nodes
+# (and the new point's leaf is deeper than log base 1/SCAPEGOAT_BALANCE of the tree's size)
+SCAPEGOAT_BALANCE = 0.75
+
+# BallTree.delete rebuilds the tree once more than this fraction of its nodes are deleted
+TOMBSTONE_RATIO = 0.5
+
+
+# Node class - each node represents hypersphere of given dimensions
+class Node(object):
+    
+    def __init__(self, pivotCoords, pivotId, radius):
+        
+        self.pivotCoords = pivotCoords  # tuple of keys
+        self.pivotId     = pivotId      # point's id - its data is kept in the tree's payload table, not here
+        
+        self.radius = radius  # distance between pivot and farthest point in node
+        
+        self.leftChild = None
+        self.rightChild = None     
+        
+        self.size = 1          # num of nodes in subtree rooted here (including deleted ones)
+        self.deleted = False   # deleted pivots stay in the tree (as tombstones) until it's rebuilt
+         
+        
+        
+    def __str__(self):
+        return "(" + str(self.pivotCoords) + ", " + str(self.pivotId) + ")"
+
+
+# Ball Tree class
+class BallTree(object):
+    
+    # metric is the distance the tree is built and searched with: one of the names in METRICS
+    # ('euclidean', 'manhattan', 'chebyshev', 'haversine', 'cosine'), or a kernel such as MinkowskiKernel(3)
+    # hash_index=True also builds a hash index of coordinates --> id, so findExact takes constant time
+    # Nodes hold only each point's id (its position in points; inserted points get the next ids). The data of
+    # each point is kept in a payload table, looked up by id: the data from points, or payloads - a list or
+    # array indexed by id, or a function of id (e.g. a lookup in an external store) - in which case the data
+    # in points isn't used
+    def __init__(self, points, dimensions, hash_index=False, metric='euclidean', payloads=None):
+        
+        self.__points = points 
+        self.__dimensions = dimensions
+        self.__kernel = getKernel(metric, dimensions)
+        self.__ownsPayloads = payloads is None  # tree's own payload table grows with inserts
+        self.__payloads = [p[1] for p in points] if payloads is None else payloads
+        self.__nextId = len(points)
+        self.__root = self.build([(p[0], i) for i, p in enumerate(points)])
+        self.__nodesVisited = 0  # nodes visited by most recent knn search
+        self.__hashIndex = buildHashIndex(points) if hash_index else None
+        self.__numDeleted = 0    # num of tombstones in tree
+        self.__statsHook = None  # called with the QueryStats of each sampled search (None = stats off)
+        self.__cache = None      # QueryCache of search results (None = no cache)
+        self.__statsSampleRate = 1.0
+        
+    
+    # Returns list of points in tree
+    def getPoints(self):
+        
+        # after inserts or deletes, collect the points still in the tree
+        if self.__points is None:
+            self.__points = [(coords, self.getPayload(i)) for coords, i in self.__livePoints(self.__root)]
+        
+        return self.__points
+
+
+    # Returns data of the point with the given id, from the payload table
+    def getPayload(self, pointId):
+        
+        if callable(self.__payloads):
+            return self.__payloads(pointId)
+        
+        return self.__payloads[pointId]
+
+
+    # Returns number of bytes used by the tree's nodes (Node objects, their attributes, and pivot coordinates)
+    def memoryUsage(self):
+
+        total = 0
+        stack = [self.__root] if self.__root else []
+
+        while stack:
+            n = stack.pop()
+
+            total += sys.getsizeof(n) + sys.getsizeof(n.__dict__) + sys.getsizeof(n.radius)
+            total += sys.getsizeof(n.pivotCoords) + sum(sys.getsizeof(c) for c in n.pivotCoords)
+
+            if n.leftChild: stack.append(n.leftChild)
+            if n.rightChild: stack.append(n.rightChild)
+
+        return total
+       
+    
+    # Build Ball Tree with given points, as (coords, id) tuples
+    # Returns the root node, or None if tree is empty
+    # Builds with an explicit stack rather than recursion, so degenerate splits can't hit the recursion limit
+    def build(self, points):
+
+        root = None
+        
+        # stack of (points, parent node, whether node is parent's left child) still to be built;
+        # left is pushed last so it's built first, same order as building recursively
+        stack = [(points, None, False)]
+        
+        while stack:
+            
+            points, parent, isLeft = stack.pop()
+            
+            # zero points --> no node
+            if len(points) == 0:
+                continue
+            
+            node, leftPoints, rightPoints = self.__buildNode(points)
+            node.size = len(points)
+            
+            # hook new node up to its parent
+            if parent is None:
+                root = node
+            elif isLeft:
+                parent.leftChild = node
+            else:
+                parent.rightChild = node
+            
+            stack.append((rightPoints, node, False))
+            stack.append((leftPoints, node, True))
+        
+        return root
+
+
+    # Creates the node for the given (non-empty) points
+    # Returns the node, and the lists of points in its left and right children
+    def __buildNode(self, points):
+        
+        # base case: one point --> return leaf node
+        if len(points) == 1:  
+            return Node(points[0][0], points[0][1], 0), [], []  # leaf has radius of 0
+        
+        
+        # OTHERWISE (more than one point left)...
+        
+        ### Step 1: Find dimension of greatest spread on which to split the points at this level
+        ### Step 2: Find median at dimension of greatest spread to be this node's pivot
+        ### Steps 3 & 4: Split points in two according to pivot; determine this node's radius
+        ### Step 5: Create this node and recurse down its children
+        
+        
+        
+        ## 1.Find dimension of greatest spread:
+        
+        # matrix of the coords at this level (one row per point)
+        coords = np.array([p[0] for p in points], dtype=np.float64)
+        
+        # spread at each dimension is the difference between its highest and lowest values
+        dimensionOfGS = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+        
+        
+
+        ## 2.Find median at the dimension of greatest spread to be the pivot point:
+
+        # Median of five:
+        randomPointList = []
+        
+        for i in range(5):  # choose 5 random points
+            p = random.choice(points)  
+            
+            # append tuple of (coord at dimension of GS, point) to list
+            randomPointList.append((p[0][dimensionOfGS], p))
+            
+        # sort randomly chosen points on their coord value at the dimension of GS    
+        randomPointList.sort()
+        
+        # get median (i.e. POINT with the medium coord value at dimension of GS)
+        median = randomPointList[2][1]
+        
+        
+
+        ## 3.Split points in two according to the median (to be in its left and right children):
+        ## 4.Determine the to-be-node's radius (dist between median and farthest point at this level):
+        
+        leftPoints = [] 
+        rightPoints = []
+        
+        medianSkipped = False  # median itself is this node's pivot; any copies of it still go in a child
+        tieGoesLeft = True     # points tied with median alternate sides, so duplicate-heavy data still splits evenly
+        
+        # loop through points to determine whether they lie in left or right child
+        for p in points:
+            
+            if not medianSkipped and p == median:
+                medianSkipped = True
+                continue
+            
+            coordVal = p[0][dimensionOfGS]
+            
+            # if point's coord val at dimension of GS is less than that of the median (or tied, on its turn),
+            if coordVal < median[0][dimensionOfGS] or (coordVal == median[0][dimensionOfGS] and tieGoesLeft):
+                leftPoints.append(p)    # point lies in the left child
+            
+            # otherwise, if it's greater than median's coord val (or tied, on its turn),
+            else:       
+                rightPoints.append(p)   # point lies in the right child
+            
+            if coordVal == median[0][dimensionOfGS]:
+                tieGoesLeft = not tieGoesLeft
+                
+        # find farthest point from median/pivot with one vector operation over the whole level;
+        # radius is its distance, computed the same way as the distances it's compared against while searching
+        farthest = int(np.argmax(self.__kernel.reducedDistances(np.asarray(median[0], dtype=np.float64), coords)))
+        radius = self.__kernel.distance(median[0], points[farthest][0])
+    
+        
+        ## 5. Finally, create node (its children are built from the lists of left and right points):
+        
+        # create internal node with the determined median and radius
+        node = Node(median[0], median[1], radius)
+        
+        return node, leftPoints, rightPoints
+
+
+        
+    # Returns data associated with query coordinates, or None if no such point in tree
+    def findExact(self, queryCoords):
+        
+        pointId = self.findExactId(queryCoords)
+        
+        return None if pointId is None else self.getPayload(pointId)
+    
+    
+    # Returns id of the point with the query coordinates, or None if no such point in tree
+    def findExactId(self, queryCoords):
+        
+        # constant-time lookup if there's a hash index
+        if self.__hashIndex is not None:
+            return self.__hashIndex.get(tuple(queryCoords))
+        
+        if self.__cache is not None:
+            
+            cacheKey = self.__cache.key('findExact', queryCoords)
+            cached = self.__cache.get(cacheKey)
+            
+            if cached is not CACHE_MISS:
+                return cached
+        
+        stats = self.__newStats('findExact')
+        
+        n = self.__findExactInTree(queryCoords, stats)
+        
+        if stats is not None:
+            self.__statsHook(stats)
+        
+        pointId = n.pivotId if n else None
+        
+        if self.__cache is not None:
+            self.__cache.put(cacheKey, pointId)
+        
+        return pointId
+      
+    
+    # Returns list of the data associated with each of the query coordinates (None for any not in tree)
+    def find_exact_many(self, queries):
+        
+        if isinstance(queries, np.ndarray):
+            queries = queries.tolist()
+        
+        return [self.findExact(q) for q in queries]
+      
+    
+    # Adds a point to the tree
+    # Goes down the tree, toward the closer child at each node, growing the radius of every ball on the way,
+    # and adds the point as a new leaf. If that leaf is too deep, the subtree rooted at the lowest unbalanced
+    # node on the way down (the "scapegoat") is rebuilt, so the tree stays logarithmically deep.
+    # Returns the new point's id. data goes in the tree's payload table; with a payloads table passed to the
+    # constructor, data isn't used - the caller keeps the point's data under its id there
+    def insert(self, coords, data=None):
+        
+        # as a list of floats, like the constructor's point lists (so == compares it with query coords, even
+        # when it's passed as a NumPy row)
+        coords = [float(c) for c in coords]
+        
+        pointId = self.__nextId
+        self.__nextId += 1
+        
+        if self.__ownsPayloads:
+            self.__payloads.append(data)
+        
+        newNode = Node(coords, pointId, 0)
+        
+        self.__points = None  # point list is collected again when next asked for
+        
+        if self.__cache is not None:
+            self.__cache.invalidate()
+        
+        if self.__hashIndex is not None:
+            self.__hashIndex.setdefault(tuple(coords), pointId)
+        
+        if not self.__root:
+            self.__root = newNode
+            return pointId
+        
+        path = []  # nodes on the way down
+        n = self.__root
+        
+        while True:
+            
+            path.append(n)
+            
+            # the new point is in this node's subtree now
+            n.size += 1
+            n.radius = max(n.radius, self.__kernel.distance(n.pivotCoords, coords))
+            
+            # fill an empty child slot if there is one
+            if not n.leftChild:
+                n.leftChild = newNode
+                break
+            
+            if not n.rightChild:
+                n.rightChild = newNode
+                break
+            
+            # otherwise, go toward the closer child
+            leftDist = self.__kernel.distance(n.leftChild.pivotCoords, coords)
+            
+            if leftDist <= self.__kernel.distance(n.rightChild.pivotCoords, coords):
+                n = n.leftChild
+            else:
+                n = n.rightChild
+        
+        # new leaf too deep --> rebuild the subtree of the lowest ancestor with one child much bigger than the other
+        if len(path) > math.log(self.__root.size, 1 / SCAPEGOAT_BALANCE) + 1:
+            
+            for i in range(len(path) - 1, -1, -1):
+                
+                n = path[i]
+                biggestChild = max(c.size if c else 0 for c in (n.leftChild, n.rightChild))
+                
+                if biggestChild > SCAPEGOAT_BALANCE * n.size:
+                    self.__rebuildSubtree(n, path[:i])
+                    break
+        
+        return pointId
+    
+    
+    # Removes a point with the given coordinates from the tree
+    # Its node is marked deleted (a tombstone) rather than taken out, since it's still the center of its ball;
+    # once too much of the tree is tombstones, the tree is rebuilt without them
+    # Returns True if a point was removed, or False if there was no such point in tree
+    def delete(self, coords):
+        
+        found = self.__findExactInTree(coords)
+        
+        if not found:
+            return False
+        
+        found.deleted = True
+        self.__numDeleted += 1
+        self.__points = None
+        
+        if self.__cache is not None:
+            self.__cache.invalidate()
+        
+        # point may be gone from hash index too (unless another point has the same coords)
+        if self.__hashIndex is not None:
+            
+            del self.__hashIndex[tuple(coords)]
+            
+            stillThere = self.__findExactInTree(coords)
+            if stillThere:
+                self.__hashIndex[tuple(coords)] = stillThere.pivotId
+        
+        # too many tombstones --> rebuild whole tree
+        if self.__numDeleted > TOMBSTONE_RATIO * self.__root.size:
+            self.__rebuildSubtree(self.__root, [])
+        
+        return True
+    
+    
+    # Returns first live node with the given coords (searching the tree, not the hash index), or None
+    # Fills in stats, unless it's None
+    def __findExactInTree(self, queryCoords, stats=None):
+        
+        # stack of nodes still to be searched (left child pushed last, so it's searched first)
+        stack = [self.__root] if self.__root else []
+        depths = [1]  # depth of each node on the stack (only kept up while filling in stats)
+        
+        while stack:
+            
+            n = stack.pop()
+            
+            if stats is not None:
+                depth = depths.pop()
+                stats.nodesVisited += 1
+                stats.maxDepth = max(stats.maxDepth, depth)
+            
+            # is this the search point??
+            if n.pivotCoords == queryCoords and not n.deleted:        
+                return n
+            
+            if stats is not None:
+                stats.distanceEvaluations += 1
+            
+            # if not, is the search point within this node's radius??
+            if self.__kernel.distance(queryCoords, n.pivotCoords) > n.radius:
+                # if distance between search point and pivot is greater than node's radius, not in node
+                if stats is not None:
+                    stats.prunes += 1
+                continue
+            
+            # if possibly within this ball, search children
+            if n.rightChild: stack.append(n.rightChild)
+            if n.leftChild: stack.append(n.leftChild)
+            
+            if stats is not None:
+                depths.extend([depth + 1] * (len(stack) - len(depths)))  # one per child just pushed
+        
+        return None
+    
+    
+    # Replaces the subtree rooted at n with one freshly built from its live points
+    # ancestors is the list of nodes on the way down from the root to n (empty if n is the root)
+    def __rebuildSubtree(self, n, ancestors):
+        
+        points = self.__livePoints(n)
+        
+        # tombstones in this subtree are dropped, so it and its ancestors shrink by that many nodes
+        numDropped = n.size - len(points)
+        self.__numDeleted -= numDropped
+        
+        for a in ancestors:
+            a.size -= numDropped
+        
+        newSubtree = self.build(points)
+        
+        if not ancestors:
+            self.__root = newSubtree
+        elif ancestors[-1].leftChild is n:
+            ancestors[-1].leftChild = newSubtree
+        else:
+            ancestors[-1].rightChild = newSubtree
+    
+    
+    # Returns list of (coords, id) tuples of the live nodes in the subtree rooted at n
+    def __livePoints(self, n):
+        
+        points = []
+        stack = [n] if n else []
+        
+        while stack:
+            
+            n = stack.pop()
+            
+            if not n.deleted:
+                points.append((n.pivotCoords, n.pivotId))
+            
+            if n.rightChild: stack.append(n.rightChild)
+            if n.leftChild: stack.append(n.leftChild)
+        
+        return points
+    
+    
+    # Returns number of nodes visited by the most recent kNearestNeighborsSearch
+    def getNodesVisited(self):
+        return self.__nodesVisited
+
+
+    # Sets the function called with the QueryStats of each findExact and kNearestNeighborsSearch, or turns
+    # stats off if hook is None
+    # With sample_rate < 1, stats are only collected for that fraction of searches (chosen at random)
+    # While stats are off, searches don't collect them at all (they only check that stats are None)
+    def setStatsHook(self, hook, sample_rate=1.0):
+        
+        self.__statsHook = hook
+        self.__statsSampleRate = sample_rate
+    
+    
+    # Sets the QueryCache that findExact and exact knn searches (no eps, max_nodes or time_budget) look their
+    # results up in, or turns caching off if cache is None
+    # The cache is invalidated whenever a point is inserted or deleted
+    def setQueryCache(self, cache):
+        
+        if cache is not None:
+            cache.invalidate()  # (it may hold another tree's results)
+        
+        self.__cache = cache
+    
+    
+    # Returns a QueryStats to fill in for a search if stats are on and it's sampled, or None
+    def __newStats(self, operation):
+        
+        if self.__statsHook is None or (self.__statsSampleRate < 1 and random.random() >= self.__statsSampleRate):
+            return None
+        
+        return QueryStats(operation)
+    
+    
+    # Returns dict of the tree's shape stats (see treeShapeStats); leaves hold 1 point, or 0 if deleted
+    def shapeStats(self):
+        
+        depths, radii, leafSizes = [], [], []
+        stack = [(self.__root, 1)] if self.__root else []
+        
+        while stack:
+            
+            n, depth = stack.pop()
+            
+            depths.append(depth)
+            radii.append(n.radius)
+            
+            if not n.leftChild and not n.rightChild:
+                leafSizes.append(0 if n.deleted else 1)
+            
+            if n.rightChild: stack.append((n.rightChild, depth + 1))
+            if n.leftChild: stack.append((n.leftChild, depth + 1))
+        
+        return treeShapeStats(depths, radii, leafSizes)
+
+
+    # Wrapper method
+    # Returns k nearest neighbors of query point (or as many as could find in tree), as (distance, id) tuples
+    # in order of ascending distance - or as (distance, point) tuples with return_points=True, which fetches
+    # each neighbor's data from the payload table
+    # If query point itself is in tree, it's the closest neighbor
+    # traversal is the order in which nodes are visited:
+    #   'nearest'   - depth first, descending into the child ball closer to the query point first (default)
+    #   'leftFirst' - depth first, always left child before right child
+    #   'bestFirst' - priority queue of nodes, always expanding the node whose ball is closest to the query point
+    # Approximate search (exact by default):
+    #   eps > 0     - prunes nodes that can't hold a point closer than the query radius / (1 + eps), so every
+    #                 neighbor returned is within (1 + eps) times the distance of the true neighbor in its place
+    #   max_nodes   - stops after visiting that many nodes, returning the closest points found so far
+    #   time_budget - stops after that many seconds, returning the closest points found so far
+    # With a query cache (see setQueryCache), exact searches are answered from it when they can be (and then
+    # visit no nodes)
+    def kNearestNeighborsSearch(self, queryCoords, k, traversal='nearest', eps=0, max_nodes=None, time_budget=None,
+                                return_points=False):
+        
+        if traversal not in ('nearest', 'leftFirst', 'bestFirst'):
+            raise ValueError("unknown traversal: " + str(traversal))
+        
+        shrink, maxNodes, deadline = searchLimits(eps, max_nodes, time_budget)
+        
+        heap = []  # heapq to contain tuples of form (-distance, id, coords) - ids are unique, so coords are never compared
+        
+        # fill heapq with as many negative infinity tuples as num of neighbors requested
+        for i in range(k):  
+            heappush(heap, (-float('inf'), -1, None))
+        
+        self.__nodesVisited = 0
+        
+        # cached result of an exact search (its first k, if it was for more neighbors)
+        cacheKey = None
+        
+        if self.__cache is not None and eps == 0 and max_nodes is None and time_budget is None:
+            
+            cacheKey = self.__cache.key('knn', queryCoords, return_points)
+            cached = self.__cache.get(cacheKey, k)
+            
+            if cached is not CACHE_MISS:
+                return cached
+        
+        stats = self.__newStats('knn')
+   
+        # call search method (starting from root, whose distance to the query point is computed here once)
+        if self.__root and k > 0:
+            
+            rootDist = self.__kernel.distance(queryCoords, self.__root.pivotCoords)
+            
+            if traversal == 'bestFirst':
+                self.__bestFirstSearch(rootDist, queryCoords, heap, shrink, maxNodes, deadline, stats)
+            else:
+                self.__kNearestNeighborsSearch(rootDist, queryCoords, heap, traversal == 'nearest',
+                                               shrink, maxNodes, deadline, stats)
+            
+            if stats is not None:
+                stats.distanceEvaluations += 1  # root's distance
+        
+        if stats is not None:
+            stats.nodesVisited = self.__nodesVisited
+            self.__statsHook(stats)
+        
+    
+        # then, build up answer list of tuples in the form (positive distance, id or point)
+        # for each of the k nearest neighbors - but only as many as were found
+        ansList = []
+        
+        for i in range(k):
+            
+            negDist, pointId, coords = heappop(heap)  # pop farthest tuple from closest-points heap
+            if negDist != -float('inf'):  # if contains an actual point, add it to answer list
+                
+                if return_points:
+                    ansList.append((abs(negDist), (coords, self.getPayload(pointId))))
+                else:
+                    ansList.append((abs(negDist), pointId))
+                
+        
+        ansList.reverse()   # reverse list so that closer points are first
+        
+        if cacheKey is not None:
+            self.__cache.put(cacheKey, ansList, k)
+        
+        # return list of k nearest neighbors in order of ascending distance from query point
+        return ansList
+
+    # Depth-first search, with an explicit stack of (node, distance between query point and node's pivot)
+    # Each node's distance is computed once, when its parent is expanded
+    # Nodes are pruned against the query radius times shrink, and the search stops once it has visited
+    # maxNodes nodes or it's past the deadline (None = no deadline)
+    # Fills in stats (other than nodes visited, which are counted anyway), unless it's None
+    def __kNearestNeighborsSearch(self, rootDist, queryCoords, closestSoFar, nearestFirst, shrink, maxNodes, deadline,
+                                  stats):
+
+        stack = [(self.__root, rootDist)]
+        depths = [1]  # depth of each node on the stack (only kept up while filling in stats)
+        
+        while stack:
+            
+            # out of budget --> keep the closest points found so far
+            if self.__nodesVisited >= maxNodes or (deadline is not None and time.perf_counter() > deadline):
+                break
+            
+            n, dist = stack.pop()
+            self.__nodesVisited += 1
+            
+            if stats is not None:
+                depth = depths.pop()
+                stats.maxDepth = max(stats.maxDepth, depth)
+            
+            # query radius is distance between query point and farthest of closest neighbors so far
+            queryRadius = abs(closestSoFar[0][0])
+            
+            # if node can't possibly contain any points closer than those in the heapq, skip it
+            # (node can only potentially contain points closer than seen so far if it overlaps with the query circle)
+            if dist - n.radius > queryRadius * shrink:
+                if stats is not None:
+                    stats.prunes += 1
+                continue
+            
+            # if pivot itself is closer than farthest of nearest neighbors (and hasn't been deleted), 
+            if dist < queryRadius and not n.deleted:
+                
+                # pop farthest point, add current point
+                heapreplace(closestSoFar, (-dist, n.pivotId, n.pivotCoords))
+            
+            
+            # distance from query point to each child's pivot
+            children = [(c, self.__kernel.distance(queryCoords, c.pivotCoords)) for c in (n.leftChild, n.rightChild) if c]
+            
+            # visit the child whose ball is closer to the query point first, so the query radius shrinks sooner
+            if nearestFirst and len(children) == 2 and \
+                    children[1][1] - children[1][0].radius < children[0][1] - children[0][0].radius:
+                children.reverse()
+            
+            # push children so that the one to visit first is on top
+            children.reverse()
+            stack.extend(children)
+            
+            if stats is not None:
+                stats.distanceEvaluations += len(children)
+                depths.extend([depth + 1] * len(children))
+
+    
+    # Best-first search
+    # Expands nodes in order of how close their balls are to the query point (dist - radius);
+    # once the closest remaining ball is outside the query radius, no other node can contain a closer point
+    # (shrink, maxNodes, deadline and stats as in __kNearestNeighborsSearch)
+    def __bestFirstSearch(self, rootDist, queryCoords, closestSoFar, shrink, maxNodes, deadline, stats):
+        
+        # priority queue of tuples (dist - radius, tiebreaker, dist, node)
+        queue = [(rootDist - self.__root.radius, 0, rootDist, self.__root)]
+        numPushed = 1
+        depths = {0: 1}  # depth of each queued node, by tiebreaker (only kept up while filling in stats)
+        
+        while queue:
+            
+            # out of budget --> keep the closest points found so far
+            if self.__nodesVisited >= maxNodes or (deadline is not None and time.perf_counter() > deadline):
+                break
+            
+            bound, tiebreaker, dist, n = heappop(queue)
+            self.__nodesVisited += 1
+            
+            if stats is not None:
+                depth = depths.pop(tiebreaker)
+                stats.maxDepth = max(stats.maxDepth, depth)
+            
+            # closest remaining ball doesn't overlap query circle --> done
+            # (and so is every ball still in the queue)
+            if bound > abs(closestSoFar[0][0]) * shrink:
+                if stats is not None:
+                    stats.prunes += 1 + len(queue)
+                break
+            
+            # if pivot itself is closer than farthest of nearest neighbors (and hasn't been deleted), swap it in
+            if dist < abs(closestSoFar[0][0]) and not n.deleted:
+                heapreplace(closestSoFar, (-dist, n.pivotId, n.pivotCoords))
+            
+            # queue up children
+            for c in (n.leftChild, n.rightChild):
+                if c:
+                    childDist = self.__kernel.distance(queryCoords, c.pivotCoords)
+                    heappush(queue, (childDist - c.radius, numPushed, childDist, c))
+                    
+                    if stats is not None:
+                        stats.distanceEvaluations += 1
+                        depths[numPushed] = depth + 1
+                    
+                    numPushed += 1
+    
+    
+    # Returns list of ids of all points within distance r of the query point (in no particular order)
+    # (as ArrayBallTree.query_radius; deleted points aren't returned)
+    def query_radius(self, queryCoords, r):
+        return [n.pivotId for n in self.__radiusSearch(queryCoords, r)]
+    
+    
+    # Returns number of points within distance r of the query point
+    def count_radius(self, queryCoords, r):
+        return sum(1 for n in self.__radiusSearch(queryCoords, r))
+    
+    
+    # Depth-first radius search, with an explicit stack of nodes
+    # Yields each node (not deleted) whose pivot is within distance r of the query point
+    # Nodes whose balls don't overlap the query sphere are pruned (dist - radius > r); subtrees whose balls lie
+    # entirely inside it (dist + radius <= r) are taken whole, without computing any more distances
+    # (their nodes are still walked, to skip tombstones)
+    def __radiusSearch(self, queryCoords, r):
+        
+        stack = [self.__root] if self.__root else []
+        
+        while stack:
+            
+            n = stack.pop()
+            dist = self.__kernel.distance(queryCoords, n.pivotCoords)
+            
+            # ball doesn't overlap query sphere
+            if dist - n.radius > r:
+                continue
+            
+            # ball inside query sphere --> every point in the subtree
+            if dist + n.radius <= r:
+                
+                inside = [n]
+                
+                while inside:
+                    m = inside.pop()
+                    
+                    if not m.deleted:
+                        yield m
+                    
+                    inside.extend(c for c in (m.leftChild, m.rightChild) if c)
+                
+                continue
+            
+            if dist <= r and not n.deleted:
+                yield n
+            
+            stack.extend(c for c in (n.leftChild, n.rightChild) if c)
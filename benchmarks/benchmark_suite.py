@@ -0,0 +1,213 @@
+# Benchmark suite
+# Sweeps ArrayBallTree over numbers of points, dimensions, k and data distributions, measuring:
+#   - build time, peak memory allocated while building, and the finished tree's size
+#   - findExact latency percentiles and throughput (stored points as queries)
+#   - kNearestNeighborsSearch latency percentiles and throughput, and query_batch throughput, for each k
+#   - the same knn queries through a brute-force NumPy baseline (matrix product + argpartition), and the
+#     fraction of the tree's neighbor distances that match it
+# Results are written as JSON, so runs can be compared with each other and regressions tracked.
+#
+# Distributions:
+#   uniform    - uniform in [-1000, 1000] at every dimension
+#   clustered  - Gaussian clusters around 20 random centers
+#   lowdim     - points on a random 2-dimensional plane through the d-dimensional space, plus a little noise
+#   duplicates - only about 1 distinct point per 100 points
+#
+# Configurations with more than --max-cells coordinates (points * dimensions) are recorded as skipped.
+#
+# Usage: python benchmarks/benchmark_suite.py [--sizes 1000 ... 10000000] [--dimensions 2 8 32 128] [--k 1 10 100]
+#                                             [--distributions uniform clustered lowdim duplicates]
+#                                             [--queries 1000] [--leaf-size 32] [--output benchmark_results.json]
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree
+
+
+DISTRIBUTIONS = ['uniform', 'clustered', 'lowdim', 'duplicates']
+
+
+# Returns (n, d) matrix of points drawn from the given distribution
+def generate(rng, distribution, n, d):
+
+    if distribution == 'uniform':
+        return rng.uniform(-1000, 1000, (n, d))
+
+    if distribution == 'clustered':
+        centers = rng.uniform(-1000, 1000, (20, d))
+        return centers[rng.integers(0, len(centers), n)] + rng.normal(0, 20, (n, d))
+
+    if distribution == 'lowdim':
+        plane = rng.normal(0, 1, (2, d))
+        return rng.uniform(-1000, 1000, (n, 2)) @ plane + rng.normal(0, 1, (n, d))
+
+    if distribution == 'duplicates':
+        distinct = rng.uniform(-1000, 1000, (max(n // 100, 1), d))
+        return distinct[rng.integers(0, len(distinct), n)]
+
+    raise ValueError("unknown distribution: " + distribution)
+
+
+# Returns dict of latency percentiles (in microseconds) and throughput of the given per-call times (in seconds)
+def latencyStats(times):
+
+    times = np.asarray(times)
+    p50, p90, p99 = np.percentile(times, [50, 90, 99]) * 1e6
+
+    return {'p50Us': p50, 'p90Us': p90, 'p99Us': p99, 'meanUs': times.mean() * 1e6,
+            'queriesPerSecond': len(times) / times.sum()}
+
+
+# Returns list of the time (in seconds) each call of function takes, one call per query
+def timeEach(function, queries):
+
+    times = []
+
+    for q in queries:
+        start = time.perf_counter()
+        function(q)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+# Brute-force baseline: returns (m, k) matrix of distances to each query's k nearest neighbors (closest first)
+# Squared distances come from one matrix product per chunk of queries, the k smallest from argpartition
+def bruteForceKnn(coords, queries, k):
+
+    k = min(k, len(coords))
+    squaredNorms = np.einsum('ij,ij->i', coords, coords)
+    chunkSize = max(1, 2 ** 25 // max(len(coords), 1))  # about 256 MB of distances at a time
+
+    results = []
+
+    for chunk in range(0, len(queries), chunkSize):
+
+        q = queries[chunk:chunk + chunkSize]
+        reduced = np.einsum('ij,ij->i', q, q)[:, np.newaxis] - 2 * q @ coords.T + squaredNorms
+        np.maximum(reduced, 0, out=reduced)
+
+        nearest = np.argpartition(reduced, k - 1, axis=1)[:, :k]
+        results.append(np.sort(np.take_along_axis(reduced, nearest, axis=1), axis=1))
+
+    return np.sqrt(np.concatenate(results))
+
+
+# Runs every measurement for one distribution, number of points and number of dimensions
+# Returns dict of results
+def benchmark(rng, distribution, n, d, args):
+
+    coords = generate(rng, distribution, n, d)
+    points = [(row, i) for i, row in enumerate(coords.tolist())]
+    queries = generate(rng, distribution, args.queries, d)
+
+    result = {'distribution': distribution, 'points': n, 'dimensions': d}
+
+    # build
+    start = time.perf_counter()
+    tree = ArrayBallTree(points, d, leaf_size=args.leaf_size, pivot='exact')
+    buildSeconds = time.perf_counter() - start
+
+    result['build'] = {'seconds': buildSeconds, 'treeBytes': tree.memoryUsage(), 'depth': tree.depth()}
+
+    # peak memory is measured on a second build, since tracing allocations slows the build down
+    if not args.skip_memory:
+        tracemalloc.start()
+        ArrayBallTree(points, d, leaf_size=args.leaf_size, pivot='exact')
+        result['build']['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # findExact, on stored points
+    stored = [points[i][0] for i in rng.integers(0, n, args.queries)]
+    result['findExact'] = latencyStats(timeEach(tree.findExact, stored))
+
+    # knn, against the brute-force baseline
+    result['knn'] = []
+
+    for k in args.k:
+
+        single = latencyStats(timeEach(lambda q: tree.kNearestNeighborsSearch(q, k), queries))
+
+        # one untimed call of each batched path first, so one-off setup costs aren't counted
+        tree.query_batch(queries[:1], k)
+        bruteForceKnn(coords, queries[:1], k)
+
+        start = time.perf_counter()
+        treeDists = tree.query_batch(queries, k)[0]
+        batchSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        baselineDists = bruteForceKnn(coords, queries, k)
+        baselineSeconds = time.perf_counter() - start
+
+        found = treeDists[:, :baselineDists.shape[1]]
+
+        result['knn'].append({'k': k,
+                              'single': single,
+                              'batchQueriesPerSecond': len(queries) / batchSeconds,
+                              'baselineQueriesPerSecond': len(queries) / baselineSeconds,
+                              'matchesBaseline': float(np.isclose(found, baselineDists).mean())})
+
+    return result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="ArrayBallTree benchmark suite, with JSON output")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[2, 8, 32, 128])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--distributions", choices=DISTRIBUTIONS, nargs="+", default=DISTRIBUTIONS)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--max-cells", type=int, default=2 * 10 ** 8)
+    parser.add_argument("--skip-memory", action="store_true", help="don't measure peak build memory")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    report = {'meta': {'date': datetime.datetime.now().isoformat(),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'platform': platform.platform(),
+                       'cpus': os.cpu_count(),
+                       'arguments': vars(args)},
+              'results': []}
+
+    for distribution in args.distributions:
+        for n in args.sizes:
+            for d in args.dimensions:
+
+                if n * d > args.max_cells:
+                    report['results'].append({'distribution': distribution, 'points': n, 'dimensions': d,
+                                              'skipped': "more than --max-cells coordinates"})
+                    continue
+
+                print("%-10s  n=%-9d  d=%-4d" % (distribution, n, d), file=sys.stderr, flush=True)
+                report['results'].append(benchmark(rng, distribution, n, d, args))
+
+                # write after every configuration, so a long sweep that's stopped early still leaves results
+                with open(args.output, 'w') as f:
+                    json.dump(report, f, indent=2)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("wrote " + args.output, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
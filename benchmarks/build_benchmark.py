@@ -0,0 +1,50 @@
+# Build benchmark
+# Compares build time and tree depth of ArrayBallTree's median-of-five and exact-median pivots,
+# built serially and across worker processes
+#
+# Usage: python benchmarks/build_benchmark.py [--sizes 100000 1000000 10000000] [--dimensions 3] [--leaf-size 32]
+#                                             [--n-jobs 1 2 4 8 16]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="ArrayBallTree build time and depth by pivot selection")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--dimensions", type=int, default=3)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print("%10s  %-13s  %6s  %10s  %6s" % ("points", "pivot", "jobs", "build (s)", "depth"))
+
+    for size in args.sizes:
+
+        coords = rng.uniform(-1000, 1000, (size, args.dimensions))
+        points = [(row, i) for i, row in enumerate(coords.tolist())]
+
+        for pivot in ("medianOfFive", "exact"):
+            for numJobs in args.n_jobs:
+
+                start = time.perf_counter()
+                tree = ArrayBallTree(points, args.dimensions, leaf_size=args.leaf_size, pivot=pivot, n_jobs=numJobs)
+                elapsed = time.perf_counter() - start
+
+                print("%10d  %-13s  %6d  %10.3f  %6d" % (size, pivot, numJobs, elapsed, tree.depth()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Import time benchmark
+# Imports the package in fresh interpreters (python -X importtime) and measures how long it takes:
+#   - own   - the package's own import time: its modules and the standard library modules they pull in,
+#             but not NumPy (a dependency every user of the trees pays for anyway)
+#   - total - the whole import, NumPy included
+# Exits with status 1 if the median own import time is over --budget-ms, so it can gate changes that slow
+# down startup (e.g. worker processes, which import the package before serving any query).
+# The first import is a warm-up (it may compile the modules to bytecode), and isn't counted.
+#
+# Usage: python benchmarks/import_benchmark.py [--runs 10] [--budget-ms 30]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Returns dict of cumulative import time (in ms) of each top-level module imported by one fresh interpreter
+# running the given statement
+def importTimes(statement):
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+
+    times = {}
+
+    # lines look like "import time:  self [us] | cumulative | imported package", nested imports indented
+    for line in result.stderr.splitlines():
+
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+
+        selfTime, cumulative, name = line[len("import time:"):].split("|")
+
+        times.setdefault(name.strip(), int(cumulative) / 1000)
+
+    return times
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Import time of the BallTree package, against a budget")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    importTimes("import BallTree")  # warm-up
+
+    own, total = [], []
+
+    for i in range(args.runs):
+        times = importTimes("import BallTree")
+
+        total.append(times["BallTree"])
+        own.append(times["BallTree"] - times.get("numpy", 0))
+
+    ownMedian = statistics.median(own)
+
+    print("%-8s  %10s  %10s  %10s" % ("", "median ms", "min ms", "max ms"))
+    print("%-8s  %10.1f  %10.1f  %10.1f" % ("own", ownMedian, min(own), max(own)))
+    print("%-8s  %10.1f  %10.1f  %10.1f" % ("total", statistics.median(total), min(total), max(total)))
+
+    if ownMedian > args.budget_ms:
+        print("over budget: %.1f ms > %.1f ms" % (ownMedian, args.budget_ms))
+        sys.exit(1)
+
+    print("within budget of %.1f ms" % args.budget_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# kNN graph benchmark
+# Measures ArrayBallTree.knn_graph (dual-tree, every point at once) against the same graph built from one batched
+# knn query per point (query_batch with k + 1, the point itself included), and from one kNearestNeighborsSearch
+# call per point, timed on --sample points and scaled up to all of them
+#
+# Usage: python benchmarks/knn_graph_benchmark.py [--points 20000] [--dimensions 3 8] [--k 10] [--leaf-size 32]
+#                                                 [--sample 500]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="ArrayBallTree knn graph construction time")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[3, 8])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print("%4s  %10s  %12s  %16s" % ("d", "graph (s)", "batch (s)", "per point (s)"))
+
+    for d in args.dimensions:
+
+        coords = rng.uniform(-1000, 1000, (args.points, d))
+        points = [(row, i) for i, row in enumerate(coords.tolist())]
+        tree = ArrayBallTree(points, d, leaf_size=args.leaf_size, pivot='exact')
+
+        start = time.perf_counter()
+        tree.knn_graph(args.k)
+        graphSeconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tree.query_batch(coords, args.k + 1)
+        batchSeconds = time.perf_counter() - start
+
+        sample = coords[:args.sample]
+        start = time.perf_counter()
+        for q in sample:
+            tree.kNearestNeighborsSearch(q, args.k + 1)
+        perPointSeconds = (time.perf_counter() - start) * args.points / len(sample)
+
+        print("%4d  %10.2f  %12.2f  %16.1f" % (d, graphSeconds, batchSeconds, perPointSeconds))
+
+
+if __name__ == "__main__":
+    main()
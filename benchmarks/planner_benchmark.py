@@ -0,0 +1,83 @@
+# Query planner benchmark
+# For uniform points and points near a 2-dimensional plane, at each size and number of dimensions, measures
+# mean knn latency of:
+#   tree     - kNearestNeighborsSearch traversing every node it doesn't prune
+#   scan     - kNearestNeighborsSearch scanning small subtrees whole (the scan size QueryPlanner picks)
+#   brute    - BruteForceEngine
+#   planner  - QueryPlanner, and the plan it chose for most queries
+# with the planner's intrinsic dimension estimate.
+#
+# Usage: python benchmarks/planner_benchmark.py [--sizes 1000 100000] [--dimensions 2 8 32] [--k 10]
+#                                               [--queries 200] [--leaf-size 16]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree, BruteForceEngine, QueryPlanner
+
+
+# Returns mean seconds per call of function, one call per query
+def meanSeconds(function, queries):
+
+    start = time.perf_counter()
+
+    for q in queries:
+        function(q)
+
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Tree traversal, brute force and QueryPlanner knn latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 5])
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--leaf-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print("%-8s  %8s  %4s  %7s  %9s  %9s  %9s  %11s  %s" % ("data", "n", "d", "id est", "tree ms", "scan ms",
+                                                          "brute ms", "planner ms", "plan"))
+
+    for distribution in ['uniform', 'plane']:
+        for n in args.sizes:
+            for d in args.dimensions:
+
+                if distribution == 'uniform':
+                    coords = rng.uniform(-1000, 1000, (n, d))
+                else:
+                    coords = rng.uniform(-1000, 1000, (n, 2)) @ rng.normal(0, 1, (2, d)) + rng.normal(0, 1, (n, d))
+
+                points = [(row, i) for i, row in enumerate(coords.tolist())]
+                queries = coords[rng.integers(0, n, args.queries)] + rng.normal(0, 1, (args.queries, d))
+
+                tree = ArrayBallTree(points, d, leaf_size=args.leaf_size, pivot='exact')
+                treeSeconds = meanSeconds(lambda q: tree.kNearestNeighborsSearch(q, args.k), queries)
+
+                planner = QueryPlanner(tree, seed=args.seed)
+                scanRows = planner.summary()['scanRows']
+                scanSeconds = meanSeconds(lambda q: tree.kNearestNeighborsSearch(q, args.k, scan_rows=scanRows), queries)
+
+                engine = BruteForceEngine(coords)
+                bruteSeconds = meanSeconds(lambda q: engine.kNearestNeighborsSearch(q, args.k), queries)
+
+                plannerSeconds = meanSeconds(lambda q: planner.kNearestNeighborsSearch(q, args.k), queries)
+                plan = max(planner.planCounts, key=planner.planCounts.get)
+
+                print("%-8s  %8d  %4d  %7.1f  %9.3f  %9.3f  %9.3f  %11.3f  %s" % (
+                    distribution, n, d, planner.intrinsicDimension, treeSeconds * 1000, scanSeconds * 1000,
+                    bruteSeconds * 1000, plannerSeconds * 1000, plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Query throughput benchmark
+# Measures batched knn queries per second through ParallelQueryExecutor, by number of workers
+#
+# Usage: python benchmarks/query_benchmark.py [--points 1000000] [--queries 100000] [--dimensions 3] [--k 10]
+#                                             [--leaf-size 32] [--n-jobs 1 2 4 8 16] [--backend processes]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree, ParallelQueryExecutor
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="ArrayBallTree knn query throughput by number of workers")
+    parser.add_argument("--points", type=int, default=10 ** 6)
+    parser.add_argument("--queries", type=int, default=10 ** 5)
+    parser.add_argument("--dimensions", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--backend", choices=["processes", "threads"], default="processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    coords = rng.uniform(-1000, 1000, (args.points, args.dimensions))
+    points = [(row, i) for i, row in enumerate(coords.tolist())]
+    queries = rng.uniform(-1000, 1000, (args.queries, args.dimensions))
+
+    tree = ArrayBallTree(points, args.dimensions, leaf_size=args.leaf_size, pivot='exact')
+
+    print("%6s  %10s  %12s" % ("jobs", "time (s)", "queries/s"))
+
+    for numJobs in args.n_jobs:
+        with ParallelQueryExecutor(tree, n_jobs=numJobs, backend=args.backend) as executor:
+
+            start = time.perf_counter()
+            executor.query_batch(queries, args.k)
+            elapsed = time.perf_counter() - start
+
+        print("%6d  %10.3f  %12.0f" % (numJobs, elapsed, args.queries / elapsed))
+
+
+if __name__ == "__main__":
+    main()
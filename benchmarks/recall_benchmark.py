@@ -0,0 +1,76 @@
+# Recall versus latency benchmark
+# Measures how approximate knn searches (eps, max_nodes) trade recall for latency, with FakeBallTree.knnSearch
+# (brute force) as ground truth. Recall is the fraction of the true k nearest neighbors that a search returns.
+#
+# Usage: python benchmarks/recall_benchmark.py [--points 20000] [--queries 200] [--dimensions 8] [--k 10]
+#                                              [--leaf-size 32] [--eps 0 0.5 1 2 5] [--max-nodes 1000 300 100 30]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree, BallTree, FakeBallTree
+
+
+# Returns mean recall and mean latency (in ms) of search(query) over the queries
+def measure(search, queries, truth):
+
+    recalls = []
+    start = time.perf_counter()
+
+    for q, expected in zip(queries, truth):
+        found = set(i for d, i in search(q))
+        recalls.append(len(found & expected) / max(len(expected), 1))
+
+    elapsed = time.perf_counter() - start
+
+    return sum(recalls) / len(recalls), 1000 * elapsed / len(queries)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Approximate knn recall versus latency")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=8)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--eps", type=float, nargs="+", default=[0, 0.5, 1, 2, 5])
+    parser.add_argument("--max-nodes", type=int, nargs="+", default=[1000, 300, 100, 30])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    coords = rng.uniform(-1000, 1000, (args.points, args.dimensions))
+    points = [(row, i) for i, row in enumerate(coords.tolist())]
+    queries = rng.uniform(-1000, 1000, (args.queries, args.dimensions)).tolist()
+
+    # ground truth: ids of each query's true k nearest neighbors
+    fake = FakeBallTree(points)
+    truth = [set(p[1] for d, p in fake.knnSearch(q, args.k)) for q in queries]
+
+    trees = [("BallTree", BallTree(points, args.dimensions)),
+             ("ArrayBallTree", ArrayBallTree(points, args.dimensions, leaf_size=args.leaf_size, pivot='exact'))]
+
+    print("%-14s  %-16s  %8s  %12s" % ("tree", "setting", "recall", "ms/query"))
+
+    for name, tree in trees:
+
+        for eps in args.eps:
+            recall, latency = measure(lambda q: tree.kNearestNeighborsSearch(q, args.k, eps=eps), queries, truth)
+            print("%-14s  %-16s  %8.3f  %12.3f" % (name, "eps=%g" % eps, recall, latency))
+
+        for maxNodes in args.max_nodes:
+            recall, latency = measure(lambda q: tree.kNearestNeighborsSearch(q, args.k, max_nodes=maxNodes),
+                                      queries, truth)
+            print("%-14s  %-16s  %8.3f  %12.3f" % (name, "max_nodes=%d" % maxNodes, recall, latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Async service load benchmark
+# Offers knn queries to an AsyncBallTreeService at a fixed rate (open loop: Poisson arrivals, each request sent
+# at its time whether or not earlier ones have been answered) and measures the latency each caller sees.
+# For each offered rate and max batch size, prints the rate actually answered, latency p50/p99 and mean batch
+# size (--max-batch 1 is the service without batching).
+#
+# Usage: python benchmarks/service_benchmark.py [--points 100000] [--dimensions 3] [--k 10] [--leaf-size 32]
+#                                               [--qps 1000 2000 5000 10000 20000] [--max-batch 1 64]
+#                                               [--max-delay 0.001] [--seconds 2]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BallTree import ArrayBallTree, AsyncBallTreeService
+
+
+# Offers queries at the given rate for the given num of seconds
+# Returns (list of latencies in seconds, num of requests rejected, seconds until the last answer, service stats)
+async def offerLoad(tree, queries, k, qps, seconds, maxBatch, maxDelay, rng):
+
+    latencies = []
+    rejected = 0
+
+    async def request(q):
+        nonlocal rejected
+
+        start = time.perf_counter()
+
+        try:
+            await service.knn(q, k)
+        except asyncio.QueueFull:
+            rejected += 1
+            return
+
+        latencies.append(time.perf_counter() - start)
+
+    async with AsyncBallTreeService(tree, max_batch=maxBatch, max_delay=maxDelay, when_full='reject') as service:
+
+        tasks = []
+        start = time.perf_counter()
+        sendAt = start
+
+        while sendAt - start < seconds:
+
+            await asyncio.sleep(max(sendAt - time.perf_counter(), 0))
+
+            # everything due by now (sleep can't wake up as often as a high rate needs)
+            while sendAt <= time.perf_counter() and sendAt - start < seconds:
+                tasks.append(asyncio.ensure_future(request(queries[len(tasks) % len(queries)])))
+                sendAt += rng.exponential(1 / qps)
+
+        await asyncio.gather(*tasks)
+
+        return latencies, rejected, time.perf_counter() - start, service.stats()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="AsyncBallTreeService latency by offered load")
+    parser.add_argument("--points", type=int, default=10 ** 5)
+    parser.add_argument("--dimensions", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--leaf-size", type=int, default=32)
+    parser.add_argument("--qps", type=float, nargs="+", default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--max-delay", type=float, default=0.001)
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    coords = rng.uniform(-1000, 1000, (args.points, args.dimensions))
+    points = [(row, i) for i, row in enumerate(coords.tolist())]
+    queries = rng.uniform(-1000, 1000, (10 ** 4, args.dimensions))
+
+    tree = ArrayBallTree(points, args.dimensions, leaf_size=args.leaf_size, pivot='exact')
+
+    print("%9s  %9s  %11s  %8s  %8s  %9s  %10s" % ("batch", "offered", "answered/s", "p50 ms", "p99 ms",
+                                                   "rejected", "mean batch"))
+
+    for maxBatch in args.max_batch:
+        for qps in args.qps:
+
+            latencies, rejected, elapsed, stats = asyncio.run(
+                offerLoad(tree, queries, args.k, qps, args.seconds, maxBatch, args.max_delay, rng))
+
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (float('nan'), float('nan'))
+            batches = stats['batchSizes']
+
+            print("%9d  %9.0f  %11.0f  %8.2f  %8.2f  %9d  %10.1f" % (maxBatch, qps, len(latencies) / elapsed, p50, p99,
+                                                                     rejected, batches['sum'] / max(batches['count'], 1)))
+
+
+if __name__ == "__main__":
+    main()
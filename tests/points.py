@@ -0,0 +1,24 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Random test points
+
+import random
+
+
+# Returns list of specified num points (tuples), each of specified dimension
+def randomPoints(num, dimensions):
+    
+    points = []
+    
+    for i in range(num):
+        coords = []
+        for j in range(dimensions):
+            coords.append(random.uniform(-1000, 1000))    
+            
+        ## data
+        data = random.random()  
+    
+        points.append((coords, data))
+        
+    return points
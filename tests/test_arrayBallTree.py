@@ -0,0 +1,430 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of ArrayBallTree
+
+import math
+import os
+import tracemalloc
+import numpy as np
+import pytest
+from BallTree import (ArrayBallTree, BallTree, FakeBallTree, memoryReport, EuclideanKernel, ManhattanKernel,
+                      TREE_FILE_MAGIC, TREE_FILE_VERSION, TREE_FILE_PREFIX, QueryStats, distance)
+from tests.points import randomPoints
+
+
+# Test that the array-backed tree finds every point, and nothing that isn't there
+def test_arrayTreeFindExact():
+
+    points = randomPoints(500, 4)
+
+    a = ArrayBallTree(points, 4)
+    f = FakeBallTree(points)
+
+    for p in points:
+        assert a.findExact(p[0]) == f.findExact(p[0])
+
+    assert a.findExact([5000, 5000, 5000, 5000]) is None
+    assert ArrayBallTree([], 4).findExact([1, 2, 3, 4]) is None
+
+
+# Test that the array-backed tree's knn search matches the linked tree's
+def test_arrayTreeKnnSearch():
+
+    for j in range(50):
+        points = randomPoints(200, 5)
+
+        a = ArrayBallTree(points, 5)
+        b = BallTree(points, 5)
+
+        searchPoint = randomPoints(1, 5)[0][0]
+
+        aAns = a.kNearestNeighborsSearch(searchPoint, 7)
+        bAns = b.kNearestNeighborsSearch(searchPoint, 7)
+
+        assert len(aAns) == len(bAns)
+
+        for i in range(len(aAns)):
+            assert aAns[i][0] == pytest.approx(bAns[i][0])  # distances match
+            assert aAns[i][1] == bAns[i][1]                  # (coords, data) match
+
+    # fewer points than neighbors requested, and empty tree
+    points = randomPoints(2, 5)
+    assert len(ArrayBallTree(points, 5).kNearestNeighborsSearch([0, 0, 0, 0, 0], 5)) == 2
+    assert ArrayBallTree([], 5).kNearestNeighborsSearch([0, 0, 0, 0, 0], 3) == []
+
+
+# Test that trees with leaf buckets find the same points and neighbors as the brute-force tree
+def test_arrayTreeLeafSize():
+
+    points = randomPoints(1000, 4)
+    f = FakeBallTree(points)
+
+    for leafSize in [1, 16, 64, 2000]:
+        a = ArrayBallTree(points, 4, leaf_size=leafSize)
+
+        # larger buckets --> fewer nodes
+        assert a.numNodes() <= len(points)
+
+        for p in points[:100]:
+            assert a.findExact(p[0]) == f.findExact(p[0])
+
+        for j in range(20):
+            searchPoint = randomPoints(1, 4)[0][0]
+
+            aAns = a.kNearestNeighborsSearch(searchPoint, 5, return_points=True)
+            fAns = f.knnSearch(searchPoint, 5)
+
+            assert [ans[0] for ans in aAns] == pytest.approx([ans[0] for ans in fAns])
+            assert [ans[1] for ans in aAns] == [ans[1] for ans in fAns]
+
+    assert ArrayBallTree(points, 4, leaf_size=2000).numNodes() == 1
+
+    with pytest.raises(ValueError):
+        ArrayBallTree(points, 4, leaf_size=0)
+
+
+# Test that batched knn search matches one-at-a-time knn search
+def test_queryBatch():
+
+    points = randomPoints(800, 3)
+    queries = [p[0] for p in randomPoints(60, 3)]
+
+    for leafSize in [1, 32]:
+        a = ArrayBallTree(points, 3, leaf_size=leafSize)
+
+        dists, indices = a.query_batch(queries, 6)
+        assert dists.shape == indices.shape == (60, 6)
+
+        for i in range(len(queries)):
+            single = a.kNearestNeighborsSearch(queries[i], 6, return_points=True)
+
+            assert list(dists[i]) == pytest.approx([ans[0] for ans in single])
+            assert [points[j] for j in indices[i]] == [ans[1] for ans in single]
+
+    # fewer points than neighbors requested --> padded with inf and -1
+    dists, indices = ArrayBallTree(points[:2], 3).query_batch(queries, 4)
+    assert (dists[:, 2:] == np.inf).all() and (indices[:, 2:] == -1).all()
+    assert (indices[:, :2] != -1).all()
+
+    dists, indices = ArrayBallTree([], 3).query_batch(queries, 3)
+    assert (indices == -1).all()
+
+
+# Test that exact-median construction gives a balanced tree with the same search results
+def test_arrayTreeExactMedian():
+
+    points = randomPoints(3000, 3)
+    f = FakeBallTree(points)
+
+    for leafSize in [1, 20]:
+        a = ArrayBallTree(points, 3, leaf_size=leafSize, pivot='exact')
+
+        # every level at least halves the number of points, so depth is logarithmic
+        assert a.depth() <= math.ceil(math.log2(len(points) + 1))
+
+        for p in points[:200]:
+            assert a.findExact(p[0]) == f.findExact(p[0])
+
+        for j in range(20):
+            searchPoint = randomPoints(1, 3)[0][0]
+            assert [ans[1] for ans in a.kNearestNeighborsSearch(searchPoint, 4, return_points=True)] == \
+                   [ans[1] for ans in f.knnSearch(searchPoint, 4)]
+
+    # duplicates still split evenly
+    duplicates = [([1.0, 2.0, 3.0], i) for i in range(500)]
+    assert ArrayBallTree(duplicates, 3, pivot='exact').depth() <= 9
+
+    with pytest.raises(ValueError):
+        ArrayBallTree(points, 3, pivot='mean')
+
+
+# Test that building across worker processes gives a tree with the same search results
+def test_arrayTreeParallelBuild():
+
+    points = randomPoints(3000, 3)
+    f = FakeBallTree(points)
+
+    for pivot in ['medianOfFive', 'exact']:
+        a = ArrayBallTree(points, 3, leaf_size=8, pivot=pivot, n_jobs=3)
+
+        assert sorted(a.find_exact_many([p[0] for p in points])) == sorted(p[1] for p in points)
+
+        for j in range(20):
+            searchPoint = randomPoints(1, 3)[0][0]
+            assert [ans[1] for ans in a.kNearestNeighborsSearch(searchPoint, 4, return_points=True)] == \
+                   [ans[1] for ans in f.knnSearch(searchPoint, 4)]
+
+    # fewer points than workers
+    assert ArrayBallTree(points[:2], 3, n_jobs=4).findExact(points[1][0]) == points[1][1]
+    assert ArrayBallTree([], 3, n_jobs=4).findExact([0, 0, 0]) is None
+
+    with pytest.raises(ValueError):
+        ArrayBallTree(points, 3, n_jobs=0)
+
+
+# Test that a saved tree loads back (memory-mapped or read in) with the same search results
+def test_arrayTreeSaveLoad(tmp_path):
+
+    points = randomPoints(1500, 3)
+    queries = np.array([p[0] for p in randomPoints(40, 3)])
+
+    a = ArrayBallTree(points, 3, leaf_size=16)
+    dists, indices = a.query_batch(queries, 4)
+
+    path = tmp_path / 'tree.bt'
+    a.save(path)
+
+    # a Euclidean float64 tree is still written as version 1, which every reader can read
+    assert TREE_FILE_PREFIX.unpack(path.read_bytes()[:TREE_FILE_PREFIX.size])[1] == 1
+
+    for mmap in [True, False]:
+        b = ArrayBallTree.load(path, points, mmap=mmap)
+
+        assert isinstance(b.exportArrays()['coords'], np.memmap) == mmap
+        assert (b.query_batch(queries, 4)[1] == indices).all()
+        assert b.kNearestNeighborsSearch(queries[0], 4) == a.kNearestNeighborsSearch(queries[0], 4)
+        assert b.findExact(points[42][0]) == points[42][1]
+
+    # without the point list, batched queries (which return indices) still work
+    assert (ArrayBallTree.load(path).query_batch(queries, 4)[1] == indices).all()
+
+    # empty tree
+    ArrayBallTree([], 3).save(tmp_path / 'empty.bt')
+    assert ArrayBallTree.load(tmp_path / 'empty.bt', []).kNearestNeighborsSearch([0, 0, 0], 2) == []
+
+    # wrong file, and unsupported version
+    (tmp_path / 'other.bt').write_bytes(b'not a tree')
+    with pytest.raises(ValueError):
+        ArrayBallTree.load(tmp_path / 'other.bt')
+
+    (tmp_path / 'future.bt').write_bytes(TREE_FILE_PREFIX.pack(TREE_FILE_MAGIC, TREE_FILE_VERSION + 1, 0))
+    with pytest.raises(ValueError):
+        ArrayBallTree.load(tmp_path / 'future.bt')
+
+
+# Test radius queries and counts against brute force
+def test_queryRadius():
+
+    points = randomPoints(2000, 3)
+    coords = np.array([p[0] for p in points])
+    queries = np.array([p[0] for p in randomPoints(30, 3)])
+
+    for leafSize in [1, 16]:
+        a = ArrayBallTree(points, 3, leaf_size=leafSize)
+
+        for r in [0.0, 150.0, 600.0, 5000.0]:
+
+            offsets, indices = a.query_radius_batch(queries, r)
+            assert len(offsets) == len(queries) + 1
+
+            for i, q in enumerate(queries):
+                expected = sorted(np.flatnonzero(EuclideanKernel.distances(q, coords) <= r))
+
+                assert sorted(indices[offsets[i]:offsets[i + 1]]) == expected
+                assert sorted(a.query_radius(q, r)) == expected
+                assert a.count_radius(q, r) == len(expected)
+
+        # a radius per query
+        radii = np.linspace(0, 500, len(queries))
+        offsets, indices = a.query_radius_batch(queries, radii)
+
+        for i, q in enumerate(queries):
+            assert offsets[i + 1] - offsets[i] == a.count_radius(q, radii[i])
+
+    # stored points are within radius 0 of themselves; everything is within a big enough radius
+    assert points[3][1] in [points[i][1] for i in a.query_radius(points[3][0], 0)]
+    assert a.count_radius([0, 0, 0], 10 ** 6) == len(points)
+
+    assert ArrayBallTree([], 3).count_radius([0, 0, 0], 10) == 0
+    assert len(ArrayBallTree([], 3).query_radius([0, 0, 0], 10)) == 0
+
+
+# Test trees built from a memory-mapped array and from an iterator, a partition at a time
+def test_streamingBuild(tmp_path):
+
+    coords = np.array([p[0] for p in randomPoints(6000, 3)])
+    coords[:2000:2] = coords[1:2000:2]  # duplicates
+    queries = np.array([p[0] for p in randomPoints(30, 3)])
+
+    np.save(tmp_path / "coords.npy", coords)
+    mapped = np.load(tmp_path / "coords.npy", mmap_mode='r')
+
+    (tmp_path / "temp").mkdir()
+
+    # (memory-mapped build second, so one-off allocations like lazy imports aren't counted against it)
+    for source in [iter(coords.tolist()), mapped]:
+
+        tracemalloc.start()
+        tree = ArrayBallTree.fromStream(source, 3, tmp_path / "tree.bt", leaf_size=8, chunk_size=700,
+                                        sample_size=300, partition_size=500, temp_dir=tmp_path / "temp")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # the points are never all in memory at once, and the temporary files are gone
+        assert os.listdir(tmp_path / "temp") == []
+
+        if source is mapped:
+            assert peak < coords.nbytes
+
+        # each point's data is its position in the source
+        for i in range(0, len(coords), 97):
+            assert coords[tree.findExact(coords[i].tolist())].tolist() == coords[i].tolist()
+
+        dists, indices = tree.query_batch(queries, 5)
+        assert dists == pytest.approx(np.sort(EuclideanKernel.pairwiseDistances(queries, coords), axis=1)[:, :5])
+
+        # (ties between duplicates may be broken either way)
+        ans = tree.kNearestNeighborsSearch(queries[0], 3, return_points=True)
+        assert [d for d, p in ans] == pytest.approx(dists[0, :3])
+        assert all(p[0] == coords[p[1]].tolist() for d, p in ans)
+
+        for q in queries[:5]:
+            expected = np.flatnonzero(EuclideanKernel.distances(q, coords) <= 200)
+            assert sorted(tree.query_radius(q, 200)) == list(expected)
+
+    # other metrics, and nothing to build
+    tree = ArrayBallTree.fromStream(mapped, 3, tmp_path / "tree.bt", metric='manhattan', sample_size=100,
+                                    partition_size=1000)
+    assert tree.getMetric() is ManhattanKernel
+    assert tree.query_batch(queries, 4)[0] == pytest.approx(
+        np.sort(ManhattanKernel.pairwiseDistances(queries, coords), axis=1)[:, :4])
+
+    assert ArrayBallTree.fromStream(iter([]), 3, tmp_path / "tree.bt").numNodes() == 0
+
+
+# Test float32 and 8-bit coordinate storage, with re-ranking by full-precision coords
+def test_compactStorage(tmp_path):
+
+    points = randomPoints(2000, 16)
+    coords = np.array([p[0] for p in points])
+    queries = [p[0] for p in randomPoints(20, 16)]
+    f = FakeBallTree(points)
+
+    full = ArrayBallTree(points, 16, leaf_size=8)
+
+    for storage, minRecall in [('float32', 0.99), ('uint8', 0.9)]:
+
+        a = ArrayBallTree(points, 16, leaf_size=8, storage=storage)
+
+        assert a.exportArrays()['coords'].dtype == np.dtype(storage)
+        assert a.memoryUsage() < full.memoryUsage()
+
+        # every point is found by its exact coords (and not by coords that merely round the same way)
+        for p in points[::50]:
+            assert a.findExact(p[0]) == p[1]
+
+        assert a.findExact([c + 1e-9 for c in points[0][0]]) is None
+
+        # knn results are actual points, at their full-precision distances
+        batchDists, batchIndices = a.query_batch(queries, 10)
+        numFound = 0
+
+        for i, q in enumerate(queries):
+
+            ans = a.kNearestNeighborsSearch(q, 10, return_points=True)
+            expected = set(p[1] for d, p in f.knnSearch(q, 10))
+
+            assert len(ans) == 10
+            assert all(d == pytest.approx(distance(q, p[0])) for d, p in ans)
+            assert [d for d, p in ans] == sorted(d for d, p in ans)
+            assert batchDists[i] == pytest.approx(EuclideanKernel.distances(np.array(q), coords[batchIndices[i]]))
+
+            numFound += len(expected & set(p[1] for d, p in ans))
+
+        assert numFound / (10 * len(queries)) >= minRecall
+
+        # saved and loaded without the point list, re-ranking from full-precision coords by index
+        a.save(tmp_path / "tree.bt")
+        loaded = ArrayBallTree.load(tmp_path / "tree.bt", full_coords=coords)
+
+        assert loaded.query_batch(queries, 10)[0] == pytest.approx(batchDists)
+        assert loaded.findExact(points[5][0]) == 5
+
+        # compact files are version 2, which version 1 readers (float64 coords only) reject
+        assert TREE_FILE_PREFIX.unpack((tmp_path / "tree.bt").read_bytes()[:TREE_FILE_PREFIX.size])[1] == 2
+
+        # the re-rank factor is saved too: the loaded tree collects as many candidates as the saved one, so it
+        # prunes the same nodes
+        r = ArrayBallTree(points, 16, leaf_size=8, storage=storage, rerank_factor=8)
+        r.save(tmp_path / "rerank.bt")
+        loaded = ArrayBallTree.load(tmp_path / "rerank.bt", full_coords=coords)
+
+        for q in queries:
+
+            loadedStats, savedStats = QueryStats('knn'), QueryStats('knn')
+
+            assert loaded.kNearestNeighborsSearch(q, 10, stats=loadedStats) == \
+                r.kNearestNeighborsSearch(q, 10, stats=savedStats)
+            assert vars(loadedStats) == vars(savedStats)
+
+        assert (loaded.query_batch(queries, 10)[1] == r.query_batch(queries, 10)[1]).all()
+
+    with pytest.raises(ValueError):
+        ArrayBallTree(points, 16, storage='int4')
+
+
+# Test that the array-backed tree takes less memory than the linked tree
+def test_memoryReport():
+
+    report = memoryReport(randomPoints(1000, 3), 3)
+
+    assert report['points'] == 1000
+    assert report['arrayTreeBytes'] < report['nodeTreeBytes']
+
+    # memory used is all the arrays' data, and node arrays hold only the nodes used (not views of n-long ones)
+    for leafSize in [1, 32]:
+        tree = ArrayBallTree(randomPoints(3000, 3), 3, leaf_size=leafSize)
+        arrays = tree.exportArrays()
+
+        assert tree.memoryUsage() == sum(a.nbytes for a in arrays.values())
+
+        for name in ['nodeStarts', 'nodeEnds', 'radii', 'leftChildren', 'rightChildren']:
+            assert len(arrays[name]) == tree.numNodes()
+            assert arrays[name].base is None
+
+
+# Test the all-points knn graph against brute force
+def test_knnGraph():
+
+    for metric, kernel in [('euclidean', EuclideanKernel), ('manhattan', ManhattanKernel)]:
+
+        # random points, and points with many duplicates
+        for points in [randomPoints(800, 3), randomPoints(40, 2) * 20]:
+
+            coords = np.array([p[0] for p in points])
+            bruteDists = kernel.pairwiseDistances(coords, coords)
+            np.fill_diagonal(bruteDists, np.inf)  # a point isn't its own neighbor
+
+            for leafSize in [1, 16]:
+                a = ArrayBallTree(points, len(coords[0]), leaf_size=leafSize, metric=metric)
+
+                for k in [1, 7]:
+                    offsets, indices, dists = a.knn_graph(k)
+
+                    assert list(offsets) == [i * k for i in range(len(points) + 1)]
+                    assert len(indices) == len(dists) == len(points) * k
+
+                    expected = np.sort(bruteDists, axis=1)[:, :k]
+                    assert np.allclose(dists.reshape(-1, k), expected)
+
+                    # each neighbor is at the distance given, and isn't the point itself
+                    for i in range(len(points)):
+                        neighbors = indices[offsets[i]:offsets[i + 1]]
+
+                        assert i not in neighbors
+                        assert np.allclose(bruteDists[i, neighbors], dists[offsets[i]:offsets[i + 1]])
+
+    # k past the num of other points --> every other point
+    points = randomPoints(5, 2)
+    offsets, indices, dists = ArrayBallTree(points, 2).knn_graph(10)
+
+    assert list(offsets) == [0, 4, 8, 12, 16, 20]
+    assert sorted(indices[:4]) == [1, 2, 3, 4]
+
+    # nothing to connect
+    for points in [[], randomPoints(1, 2)]:
+        offsets, indices, dists = ArrayBallTree(points, 2).knn_graph(3)
+
+        assert list(offsets) == [0] * (len(points) + 1)
+        assert len(indices) == len(dists) == 0
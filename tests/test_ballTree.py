@@ -0,0 +1,625 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of BallTree (against the brute-force FakeBallTree)
+
+import random
+import numpy as np
+import pytest
+from BallTree import ArrayBallTree, BallTree, FakeBallTree
+from tests.points import randomPoints
+
+
+# Make sure that point lists in real and fake ball trees match
+def test_pointList():
+    
+    # create real and fake ball trees with same random points
+    points = randomPoints(100, 3)
+    
+    b = BallTree(points, 3)
+    f = FakeBallTree(points)    
+    
+    assert b.getPoints() == f.getPoints()
+    
+    # repeat with points of higher dimensions
+    points = randomPoints(100, 7)
+    
+    b = BallTree(points, 7)
+    f = FakeBallTree(points)    
+    
+    assert b.getPoints() == f.getPoints()    
+
+
+# Test that findExact successfully returns the data of the one point in the tree
+def test_superSimpleFind():
+    
+    b = BallTree([([3, 4], 'a')], 2)
+    f = FakeBallTree([([3, 4], 'a')])
+
+    assert b.findExact([3, 4]) == 'a'
+    assert f.findExact([3, 4]) == b.findExact([3, 4])
+
+
+# Test that findExact works correctly with coordinates of few dimensions  
+def test_findExactFewDimensions():
+    
+    # 3 dimensions:
+    points = randomPoints(100, 3)
+    
+    b = BallTree(points, 3)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found 
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        
+        # assert that correct data is returned
+        assert b.findExact(p[0]) == f.findExact(p[0])
+        
+        
+    # 5 dimensions:
+    points = randomPoints(80, 5)
+    
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        
+        # assert that correct data is returned
+        assert b.findExact(p[0]) == f.findExact(p[0])
+
+
+# Test that findExact works correctly with coordinates of many (up to 10) dimensions       
+def test_findExactHigherDimensions():
+    
+    # 7 dimensions
+    points = randomPoints(70, 7)
+    
+    b = BallTree(points, 7)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found 
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        assert b.findExact(p[0]) == f.findExact(p[0])  # and correct data is returned
+    
+    
+    # 9 dimensions
+    points = randomPoints(60, 9)
+    
+    b = BallTree(points, 9)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        assert b.findExact(p[0]) == f.findExact(p[0])  # and correct data is returned
+        
+    
+    # 10 dimensions
+    points = randomPoints(40, 10)
+    
+    b = BallTree(points, 10)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        assert b.findExact(p[0]) == f.findExact(p[0])  # and correct data is returned
+
+
+# Test exactFind when search point cannot be found in tree
+def test_findExactNotThere():
+    
+    # 100 points, 2 dimensions
+    points = randomPoints(100, 2)
+    
+    b = BallTree(points, 2)
+    f = FakeBallTree(points) 
+    
+    # search for 40 points that can't possibly be in tree
+    for i in range(40):
+        c1 = random.randint(2000, 3000)
+        c2 = random.randint(-3000, -2000)   
+        
+        # assert that they aren't mistakenly 'found'
+        assert b.findExact([c1, c2]) is None
+        assert b.findExact([c1, c2]) == f.findExact([c1, c2])
+        
+    
+    # 50 points, 6 dimensions    
+    points = randomPoints(50, 6)
+    
+    b = BallTree(points, 6)
+    f = FakeBallTree(points) 
+    
+    # search for 40 points that can't possibly be in tree
+    for i in range(40):
+        c1 = random.randint(2000, 3000)
+        c2 = random.randint(-3000, -2000)
+        c3 = random.randint(4000, 5000)    
+        c4 = random.randint(2000, 3000)
+        c5 = random.randint(-3000, -2000)
+        c6 = random.randint(4000, 5000)   
+        
+        # assert that they aren't mistakenly 'found'
+        assert b.findExact([c1, c2, c3, c4, c5, c6]) is None
+        assert b.findExact([c1, c2, c3, c4, c5, c6]) == f.findExact([c1, c2, c3, c4, c5, c6])    
+
+
+# Test findExact when tree is empty
+def test_findExactEmptyTree():
+   
+    points = []  # empty point list
+    
+    # 3 dimensions
+    b = BallTree(points, 3)
+    f = FakeBallTree(points)  
+    
+    for i in range(30): 
+        c1 = random.randint(-1000, 1000)
+        c2 = random.randint(-1000, 1000)
+        c3 = random.randint(-1000, 1000)
+        
+        assert b.findExact([c1, c2, c3]) is None
+        assert b.findExact([c1, c2, c3]) == f.findExact((c1, c2, c3))
+    
+    
+    # 6 dimensions
+    b = BallTree(points, 6)
+    f = FakeBallTree(points)          
+    
+    for i in range(10):
+        c1 = random.randint(-1000, 1000)
+        c2 = random.randint(-1000, 1000)
+        c3 = random.randint(-1000, 1000)
+        c4 = random.randint(-1000, 1000)
+        c5 = random.randint(-1000, 1000)
+        c6 = random.randint(-1000, 1000)
+        
+        assert b.findExact([c1, c2, c3, c4, c5, c6]) is None
+        assert b.findExact([c1, c2, c3, c4, c5, c6]) == f.findExact([c1, c2, c3, c4, c5, c6])
+
+
+# Test findExact when tree has 10000 points
+def test_findExactHighlyPopulatedTree():
+    
+    # 3 dimensions:
+    points = randomPoints(10000, 3)
+    
+    b = BallTree(points, 3)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found 
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        
+        # assert that correct data is returned
+        assert b.findExact(p[0]) == f.findExact(p[0])
+        
+        
+    # 5 dimensions:
+    points = randomPoints(1000, 5)
+    
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+    
+    # assert that each point that's supposed to be in Ball Tree is found
+    for p in points:  
+        assert b.findExact(p[0]) is not None
+        
+        # assert that correct data is returned
+        assert b.findExact(p[0]) == f.findExact(p[0])    
+
+
+# Test that k nearest neighbor search works properly
+def test_knnSearch():
+
+    for j in range(1000):
+        points = randomPoints(25, 5)
+
+        b = BallTree(points, 5)
+        f = FakeBallTree(points)
+
+        # random point to be query point
+        searchPoint = randomPoints(1, 5)
+
+        # find 3 nearest neighbors
+        bAns = b.kNearestNeighborsSearch(searchPoint[0][0], 3, return_points=True)
+        fAns = f.knnSearch(searchPoint[0][0], 3)
+
+        for i in range(len(bAns)):                # for each of the nearest points:
+            assert bAns[i][0]    == fAns[i][0]      # assert that distances match
+            assert bAns[i][1][0] == fAns[i][1][0]   # assert that coords match
+            assert bAns[i][1][1] == fAns[i][1][1]   # assert that data matches
+
+
+# Test knn search on empty tree
+def test_knnSearchEmptyTree():
+    
+    points = []  # empty point list
+    
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+    
+    for i in range(20):
+    
+        # random point to be query point
+        searchPoint = randomPoints(1, 5)
+        
+        assert b.kNearestNeighborsSearch(searchPoint[0][0], 3) == []
+        assert b.kNearestNeighborsSearch(searchPoint[0][0], 3) == f.knnSearch(searchPoint[0][0], 3)
+
+
+# Test that knn search behaves correctly when there are fewer points in tree than the k requested
+def test_knnSearchTooFewPoints():
+    
+    # only 2 points
+    points = randomPoints(2, 5)
+    
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+    
+    # random point to be query point
+    searchPoint = randomPoints(1, 5)    
+
+    assert len(b.kNearestNeighborsSearch(searchPoint[0][0], 5)) == 2
+    assert b.kNearestNeighborsSearch(searchPoint[0][0], 5, return_points=True) == f.knnSearch(searchPoint[0][0], 5)
+
+
+# Test knn search on highly populated tree
+def test_knnSearchPopulatedTree():
+
+    points = randomPoints(1000, 5)
+
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+
+    # random point to be query point
+    searchPoint = randomPoints(1, 5)
+
+    # find 3 nearest neighbors
+    bAns = b.kNearestNeighborsSearch(searchPoint[0][0], 3, return_points=True)
+    fAns = f.knnSearch(searchPoint[0][0], 3)
+
+    for i in range(len(bAns)):                # for each of the nearest points:
+        assert bAns[i][0]    == fAns[i][0]      # assert that distances match
+        assert bAns[i][1][0] == fAns[i][1][0]   # assert that coords match
+        assert bAns[i][1][1] == fAns[i][1][1]   # assert that data matches
+
+
+# Test knn search on points of 10 dimensions
+def test_knnSearchHigherDimensions():
+    points = randomPoints(25, 10)
+
+    b = BallTree(points, 10)
+    f = FakeBallTree(points)
+
+    # random point to be query point
+    searchPoint = randomPoints(1, 10)
+
+    # find 3 nearest neighbors
+    bAns = b.kNearestNeighborsSearch(searchPoint[0][0], 3, return_points=True)
+    fAns = f.knnSearch(searchPoint[0][0], 3)
+
+    for i in range(len(bAns)):              # for each of the nearest points:
+        assert bAns[i][0]    == fAns[i][0]     # assert that distances match
+        assert bAns[i][1][0] == fAns[i][1][0]  # assert that coords match
+        assert bAns[i][1][1] == fAns[i][1][1]  # assert that data matches
+
+
+# Test knn search when a greater number of neighbors are requested
+def test_knnSearchMoreNeighbors():
+
+    points = randomPoints(100, 5)
+
+    b = BallTree(points, 5)
+    f = FakeBallTree(points)
+
+    # random point to be query point
+    searchPoint = randomPoints(1, 5)
+
+    # find 6 nearest neighbors
+    bAns = b.kNearestNeighborsSearch(searchPoint[0][0], 6, return_points=True)
+    fAns = f.knnSearch(searchPoint[0][0], 6)
+
+    for i in range(len(bAns)):              # for each of the nearest points:
+        assert bAns[i][0]    == fAns[i][0]     # assert that distances match
+        assert bAns[i][1][0] == fAns[i][1][0]  # assert that coords match
+        assert bAns[i][1][1] == fAns[i][1][1]  # assert that data matches
+
+    #####
+
+    # NEW random query point
+    searchPoint = randomPoints(1, 5)
+
+    # find 20 nearest neighbors
+    bAns = b.kNearestNeighborsSearch(searchPoint[0][0], 20, return_points=True)
+    fAns = f.knnSearch(searchPoint[0][0], 20)
+
+    for i in range(len(bAns)):  # for each of the nearest points:
+        assert bAns[i][0] == fAns[i][0]  # assert that distances match
+        assert bAns[i][1][0] == fAns[i][1][0]  # assert that coords match
+        assert bAns[i][1][1] == fAns[i][1][1]  # assert that data matches
+
+
+# Test that every traversal order finds the same neighbors, and that nearest-first visits fewer nodes
+def test_knnSearchTraversals():
+
+    points = randomPoints(2000, 3)
+
+    b = BallTree(points, 3)
+    f = FakeBallTree(points)
+
+    visited = {'leftFirst': 0, 'nearest': 0, 'bestFirst': 0}
+
+    for j in range(50):
+        searchPoint = randomPoints(1, 3)[0][0]
+        fAns = f.knnSearch(searchPoint, 5)
+
+        for traversal in visited:
+            assert b.kNearestNeighborsSearch(searchPoint, 5, traversal, return_points=True) == fAns
+
+            visited[traversal] += b.getNodesVisited()
+            assert 0 < b.getNodesVisited() <= len(points)
+
+    assert visited['nearest'] < visited['leftFirst']
+    assert visited['bestFirst'] < visited['leftFirst']
+
+    assert b.kNearestNeighborsSearch(searchPoint, 0) == []
+
+    with pytest.raises(ValueError):
+        b.kNearestNeighborsSearch(searchPoint, 5, 'rightFirst')
+
+
+# Test trees over sorted, all-duplicate and collinear points, which used to build degenerate chains
+# deep enough to hit the recursion limit
+def test_adversarialInputs():
+
+    # sorted points
+    points = [([float(i), float(i) / 2], i) for i in range(5000)]
+
+    b = BallTree(points, 2)
+    f = FakeBallTree(points)
+
+    for p in points[::50]:
+        assert b.findExact(p[0]) == f.findExact(p[0])
+        searchPoint = [p[0][0] + 0.3, p[0][1] + 0.1]
+        assert b.kNearestNeighborsSearch(searchPoint, 3, return_points=True) == f.knnSearch(searchPoint, 3)
+
+    # all points share the same coordinates
+    points = [([7.0, 7.0, 7.0], i) for i in range(3000)]
+
+    for tree in [BallTree(points, 3), ArrayBallTree(points, 3)]:
+        assert tree.findExact([7.0, 7.0, 7.0]) is not None
+        assert tree.findExact([7.0, 7.0, 8.0]) is None
+
+        ans = tree.kNearestNeighborsSearch([7.0, 7.0, 6.0], 10, return_points=True)
+        assert len(ans) == 10 and all(a[0] == 1.0 for a in ans)
+
+    assert ArrayBallTree(points, 3).depth() < 50
+
+    # identical (coords, data) tuples are all kept
+    assert len(BallTree([([1, 1], 'x')] * 5, 2).kNearestNeighborsSearch([0, 0], 10)) == 5
+
+    # collinear points
+    points = [([float(i), 2.0 * i], i) for i in range(10 ** 5)]
+
+    b = BallTree(points, 2)
+    assert b.findExact([99999.0, 199998.0]) == 99999
+    assert [a[1] for a in b.kNearestNeighborsSearch([500.2, 1000.4], 3)] == [500, 501, 499]
+
+    points = [([float(i), 2.0 * i], i) for i in range(10 ** 6)]
+
+    a = ArrayBallTree(points, 2, leaf_size=64)
+    assert a.findExact([999999.0, 1999998.0]) == 999999
+    assert [ans[1] for ans in a.kNearestNeighborsSearch([500000.2, 1000000.4], 3)] == [500000, 500001, 499999]
+
+
+# Test findExact with a hash index, falsy data, and batched lookups
+def test_findExactHashIndex():
+
+    points = randomPoints(300, 4) + [([1, 2, 3, 4], 0), ([5, 6, 7, 8], ''), ([9, 9, 9, 9], False)]
+    f = FakeBallTree(points)
+
+    for tree in [BallTree(points, 4), BallTree(points, 4, hash_index=True),
+                 ArrayBallTree(points, 4), ArrayBallTree(points, 4, hash_index=True)]:
+
+        for p in points:
+            assert tree.findExact(p[0]) == f.findExact(p[0])
+
+        # falsy data is still found
+        assert tree.findExact([1, 2, 3, 4]) == 0 and tree.findExact([1.0, 2.0, 3.0, 4.0]) is not None
+        assert tree.findExact([5, 6, 7, 8]) == ''
+        assert tree.findExact([9, 9, 9, 9]) is False
+        assert tree.findExact([5000, 0, 0, 0]) is None
+
+        queries = [p[0] for p in points] + [[5000, 0, 0, 0]]
+        assert tree.find_exact_many(queries) == [f.findExact(q) for q in queries]
+        assert tree.find_exact_many(np.array(queries)) == [f.findExact(q) for q in queries]
+
+
+# Test inserting and deleting points, checking the tree against a brute-force tree of the same points
+def test_insertDelete():
+
+    points = randomPoints(300, 3)
+    b = BallTree(points, 3, hash_index=True)
+
+    # insert points one at a time (including into an empty tree)
+    inserted = randomPoints(700, 3)
+    e = BallTree([], 3)
+
+    for p in inserted:
+        b.insert(p[0], p[1])
+        e.insert(p[0], p[1])
+
+    # sorted inserts would build a chain without rebalancing
+    for i in range(2000):
+        e.insert([float(i), 0.0, 0.0], i)
+
+    assert e.findExact([1999.0, 0.0, 0.0]) == 1999
+
+    live = points + inserted
+    f = FakeBallTree(live)
+
+    assert sorted(b.getPoints()) == sorted(live)
+
+    for j in range(30):
+        searchPoint = randomPoints(1, 3)[0][0]
+        assert b.kNearestNeighborsSearch(searchPoint, 5, return_points=True) == f.knnSearch(searchPoint, 5)
+        assert e.kNearestNeighborsSearch(searchPoint, 1)[0][0] <= FakeBallTree(inserted).knnSearch(searchPoint, 1)[0][0]
+
+    # delete most points (which rebuilds the tree along the way)
+    random.shuffle(live)
+    deleted, live = live[:800], live[800:]
+
+    for p in deleted:
+        assert b.delete(p[0])
+        assert b.findExact(p[0]) is None
+
+    assert not b.delete(deleted[0][0])
+    assert not b.delete([5000, 5000, 5000])
+
+    f = FakeBallTree(live)
+
+    assert sorted(b.getPoints()) == sorted(live)
+
+    for p in live:
+        assert b.findExact(p[0]) == p[1]
+
+    for j in range(30):
+        searchPoint = randomPoints(1, 3)[0][0]
+        assert b.kNearestNeighborsSearch(searchPoint, 5, return_points=True) == f.knnSearch(searchPoint, 5)
+
+    # deleting one of two points with the same coords leaves the other
+    b.insert([1, 2, 3], 'first')
+    b.insert([1, 2, 3], 'second')
+    assert b.delete([1, 2, 3])
+    assert b.findExact([1, 2, 3]) in ('first', 'second')
+    assert b.delete([1, 2, 3])
+    assert b.findExact([1, 2, 3]) is None
+
+    # points inserted as NumPy rows can be found and deleted too
+    b.insert(np.array([5., 5., 5.]), 'row')
+    assert b.findExact([5., 5., 5.]) == 'row'
+    assert b.delete([5., 5., 5.])
+    assert b.findExact([5., 5., 5.]) is None
+
+    e.insert(np.array([5., 5., 5.]), 'row')
+    assert e.findExact([5., 5., 5.]) == 'row'
+    assert e.delete([5., 5., 5.])
+    assert e.findExact([5., 5., 5.]) is None
+
+
+# Test that searches return ids by default, and that data comes from the payload table (list or function)
+def test_payloads(tmp_path):
+
+    points = randomPoints(500, 4)
+    f = FakeBallTree(points)
+
+    b = BallTree(points, 4)
+    a = ArrayBallTree(points, 4, leaf_size=8)
+
+    for j in range(20):
+        searchPoint = randomPoints(1, 4)[0][0]
+        fAns = f.knnSearch(searchPoint, 5)
+
+        # ids are positions in the point list, in both trees
+        for tree in [b, a]:
+            ans = tree.kNearestNeighborsSearch(searchPoint, 5)
+            assert [d for d, i in ans] == pytest.approx([d for d, p in fAns])
+            assert [points[i] for d, i in ans] == [p for d, p in fAns]
+            assert [(points[i][0], tree.getPayload(i)) for d, i in ans] == [p for d, p in fAns]
+
+        assert a.query_batch([searchPoint], 5)[1][0].tolist() == [i for d, i in a.kNearestNeighborsSearch(searchPoint, 5)]
+
+    assert [b.findExactId(p[0]) for p in points[:50]] == list(range(50))
+    assert [a.findExactId(p[0]) for p in points[:50]] == list(range(50))
+    assert b.findExactId([5000.0] * 4) is None
+
+    # payloads in an external store, looked up by id - the data in the point list isn't used
+    store = {i: {'name': 'point' + str(i)} for i in range(len(points))}
+    lookups = []
+
+    def lookup(pointId):
+        lookups.append(pointId)
+        return store[pointId]
+
+    coordsOnly = [(p[0], None) for p in points]
+
+    for hashIndex in [False, True]:
+        e = BallTree(coordsOnly, 4, hash_index=hashIndex, payloads=lookup)
+
+        # nothing is looked up until data is asked for
+        ans = e.kNearestNeighborsSearch(points[9][0], 3)
+        assert ans[0] == (0.0, 9) and lookups == []
+
+        assert e.kNearestNeighborsSearch(points[9][0], 1, return_points=True) == [(0.0, (points[9][0], store[9]))]
+        assert e.findExact(points[12][0]) == store[12]
+        assert lookups == [9, 12]
+        lookups.clear()
+
+        # inserted points get the next ids; their data goes in the store under that id
+        newId = e.insert([2000.0] * 4)
+        assert newId == len(points)
+        store[newId] = {'name': 'new'}
+
+        assert e.findExact([2000.0] * 4) == {'name': 'new'}
+        assert e.kNearestNeighborsSearch([1999.0] * 4, 1) == [(2.0, newId)]
+
+        e.delete(points[12][0])
+        assert e.findExactId(points[12][0]) is None
+        assert len(e.getPoints()) == len(points)
+        lookups.clear()
+
+    # tree's own payload table grows with inserts
+    assert b.insert([2000.0] * 4, 'new') == len(points)
+    assert b.findExact([2000.0] * 4) == 'new'
+
+    # array tree: payloads as a list, or given to load
+    names = ['name' + str(i) for i in range(len(points))]
+    c = ArrayBallTree(points, 4, leaf_size=8, payloads=names)
+
+    assert c.findExact(points[3][0]) == 'name3'
+    assert c.kNearestNeighborsSearch(points[3][0], 1, return_points=True) == [(0.0, (points[3][0], 'name3'))]
+
+    c.save(tmp_path / "tree.bt")
+    assert ArrayBallTree.load(tmp_path / "tree.bt").findExact(points[3][0]) == 3
+    assert ArrayBallTree.load(tmp_path / "tree.bt", payloads=names).findExact(points[3][0]) == 'name3'
+
+
+# Test radius queries and counts against brute force, as points are inserted and deleted
+def test_queryRadius():
+
+    points = randomPoints(500, 3)
+    b = BallTree(points, 3)
+    live = {i: p[0] for i, p in enumerate(points)}  # id --> coords of every point in the tree
+
+    for p in randomPoints(200, 3):
+        live[b.insert(p[0], p[1])] = p[0]
+
+    # fewer than half deleted, so the tombstones stay in the tree
+    for i in random.sample(sorted(live), 150):
+        assert b.delete(live.pop(i))
+
+    queries = [p[0] for p in randomPoints(20, 3)]
+    ids = np.array(sorted(live))
+    coords = np.array([live[i] for i in ids])
+
+    for q in queries:
+        for r in [0.0, 150.0, 600.0, 5000.0]:
+
+            dists = np.sqrt(((coords - q) ** 2).sum(axis=1))
+            expected = sorted(ids[dists <= r])
+
+            assert sorted(b.query_radius(q, r)) == expected
+            assert b.count_radius(q, r) == len(expected)
+
+    # stored points are within radius 0 of themselves
+    someId = ids[0]
+    assert someId in b.query_radius(live[someId], 0)
+
+    assert BallTree([], 3).count_radius([0, 0, 0], 10) == 0
+    assert BallTree([], 3).query_radius([0, 0, 0], 10) == []
@@ -0,0 +1,149 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of the query cache
+
+import time
+import pytest
+from BallTree import ArrayBallTree, BallTree, QueryCache
+from tests.points import randomPoints
+
+
+# Test that cached results are the same as searching, k-prefixes of cached results are reused, and approximate
+# searches aren't cached
+def test_queryCache():
+
+    points = randomPoints(500, 3)
+    queries = [p[0] for p in randomPoints(20, 3)]
+
+    for tree in [BallTree(points, 3), ArrayBallTree(points, 3, leaf_size=8)]:
+
+        expected = [tree.kNearestNeighborsSearch(q, 20) for q in queries]
+        expectedPoints = [tree.kNearestNeighborsSearch(q, 5, return_points=True) for q in queries]
+
+        cache = QueryCache(max_size=100)
+        tree.setQueryCache(cache)
+
+        for i, q in enumerate(queries):
+
+            # miss, then hit
+            assert tree.kNearestNeighborsSearch(q, 20) == expected[i]
+            assert tree.kNearestNeighborsSearch(q, 20) == expected[i]
+
+            # fewer neighbors --> first k of the cached result
+            assert tree.kNearestNeighborsSearch(q, 5) == expected[i][:5]
+
+            # points are cached apart from ids
+            assert tree.kNearestNeighborsSearch(q, 5, return_points=True) == expectedPoints[i]
+
+        assert cache.counters() == {'hits': 40, 'misses': 40, 'evictions': 0, 'expirations': 0,
+                                    'invalidations': 1, 'size': 40}
+
+        # more neighbors than cached --> searched again (and cached with the new k)
+        assert len(tree.kNearestNeighborsSearch(queries[0], 30)) == 30
+        assert tree.kNearestNeighborsSearch(queries[0], 25) == tree.kNearestNeighborsSearch(queries[0], 30)[:25]
+        assert cache.misses == 41 and cache.hits == 42
+
+        # callers can't change cached results
+        tree.kNearestNeighborsSearch(queries[1], 20).clear()
+        assert tree.kNearestNeighborsSearch(queries[1], 20) == expected[1]
+
+        # approximate searches go around the cache
+        tree.kNearestNeighborsSearch(queries[2], 20, eps=1)
+        tree.kNearestNeighborsSearch(queries[2], 20, max_nodes=5)
+        assert cache.misses == 41
+
+        # findExact (found or not)
+        assert tree.findExact(points[7][0]) == points[7][1]
+        assert tree.findExact(points[7][0]) == points[7][1]
+        assert tree.findExact([5000.0] * 3) is None
+        assert tree.findExact([5000.0] * 3) is None
+        assert cache.misses == 43
+
+        tree.setQueryCache(None)
+        assert tree.kNearestNeighborsSearch(queries[0], 20) == expected[0]
+
+    # tree with fewer points than k --> cached result answers any k
+    small = BallTree(points[:3], 3)
+    small.setQueryCache(QueryCache())
+
+    assert len(small.kNearestNeighborsSearch(queries[0], 10)) == 3
+    assert len(small.kNearestNeighborsSearch(queries[0], 50)) == 3
+    assert small.kNearestNeighborsSearch(queries[0], 0) == []
+
+
+# Test that the cache is invalidated when points are inserted or deleted
+def test_queryCacheInvalidation():
+
+    points = randomPoints(200, 3)
+    b = BallTree(points, 3)
+
+    cache = QueryCache()
+    b.setQueryCache(cache)
+
+    query = [2000.0, 2000.0, 2000.0]
+    before = b.kNearestNeighborsSearch(query, 3)
+
+    newId = b.insert([1999.0, 2000.0, 2000.0], 'new')
+    assert b.kNearestNeighborsSearch(query, 3) == [(1.0, newId)] + before[:2]
+    assert b.findExact([1999.0, 2000.0, 2000.0]) == 'new'
+
+    b.delete([1999.0, 2000.0, 2000.0])
+    assert b.kNearestNeighborsSearch(query, 3) == before
+    assert b.findExact([1999.0, 2000.0, 2000.0]) is None
+
+    assert cache.invalidations == 3  # attached, inserted, deleted
+    assert cache.hits == 0
+
+
+# Test LRU eviction, ttl expiry and tolerance
+def test_queryCacheEviction():
+
+    points = randomPoints(200, 3)
+    b = BallTree(points, 3)
+
+    cache = QueryCache(max_size=2)
+    b.setQueryCache(cache)
+
+    q1, q2, q3 = [p[0] for p in randomPoints(3, 3)]
+
+    b.kNearestNeighborsSearch(q1, 3)
+    b.kNearestNeighborsSearch(q2, 3)
+    b.kNearestNeighborsSearch(q1, 3)  # q1 most recently used
+    b.kNearestNeighborsSearch(q3, 3)  # evicts q2
+
+    assert cache.evictions == 1 and len(cache) == 2
+
+    b.kNearestNeighborsSearch(q1, 3)
+    assert cache.hits == 2
+    b.kNearestNeighborsSearch(q2, 3)
+    assert cache.hits == 2 and cache.evictions == 2
+
+    # ttl
+    cache = QueryCache(ttl=0.05)
+    b.setQueryCache(cache)
+
+    b.kNearestNeighborsSearch(q1, 3)
+    b.kNearestNeighborsSearch(q1, 3)
+    time.sleep(0.1)
+    b.kNearestNeighborsSearch(q1, 3)
+
+    assert (cache.hits, cache.misses, cache.expirations) == (1, 2, 1)
+
+    # tolerance: nearby knn queries share a result, nearby findExact queries don't
+    cache = QueryCache(tolerance=0.01)
+    b.setQueryCache(cache)
+
+    q1 = [round(c, 2) for c in q1]  # (so it and a query 0.001 away round the same way)
+    nearby = [c + 0.001 for c in q1]
+    assert b.kNearestNeighborsSearch(nearby, 3) == b.kNearestNeighborsSearch(q1, 3)
+    assert cache.hits == 1
+
+    assert b.findExact(points[0][0]) == points[0][1]
+    assert b.findExact([c + 0.001 for c in points[0][0]]) is None
+
+    with pytest.raises(ValueError):
+        QueryCache(max_size=0)
+
+    with pytest.raises(ValueError):
+        QueryCache(ttl=0)
@@ -0,0 +1,57 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of importing the package
+
+import inspect
+import json
+import os
+import subprocess
+import sys
+import pytest
+import BallTree
+
+
+# Test that importing the package has no side effects: nothing printed, no pytest, and the multiprocessing,
+# streaming and asyncio service submodules only imported once they're used
+def test_importHasNoSideEffects():
+
+    statement = ("import json, sys; import BallTree; "
+                 "print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in ('BallTree', 'pytest'))))")
+
+    result = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    modules = json.loads(result.stdout)
+
+    assert result.stderr == ""
+    assert 'pytest' not in modules
+    assert 'BallTree.parallel' not in modules and 'BallTree.streaming' not in modules
+    assert 'BallTree.service' not in modules
+
+    # lazily imported names still come from the package
+    assert BallTree.ParallelQueryExecutor.__module__ == 'BallTree.parallel'
+    assert BallTree.StreamingTreeBuilder.__module__ == 'BallTree.streaming'
+    assert BallTree.AsyncBallTreeService.__module__ == 'BallTree.service'
+
+    with pytest.raises(AttributeError):
+        BallTree.notAName
+
+
+# Test that from BallTree import * gives every public name, the lazily imported ones included
+def test_importStar():
+
+    statement = ("import json; from BallTree import *; "
+                 "print(json.dumps(sorted(n for n in dir() if not n.startswith('_') and n != 'json')))")
+
+    result = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    names = json.loads(result.stdout)
+
+    assert names == sorted(BallTree.__all__)
+    assert set(BallTree.LAZY_NAMES) <= set(names)
+
+    # everything the package imports eagerly (other than submodules) is listed too
+    public = [n for n, v in vars(BallTree).items() if not n.startswith('_') and not inspect.ismodule(v)]
+    assert set(public) - {'LAZY_NAMES'} <= set(BallTree.__all__)
@@ -0,0 +1,111 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of the distance kernels
+
+import math
+import random
+import numpy as np
+import pytest
+from BallTree import (ArrayBallTree, BallTree, FakeBallTree, getKernel, EuclideanKernel, ManhattanKernel,
+                      ChebyshevKernel, MinkowskiKernel, HaversineKernel, CosineKernel, distance, TREE_FILE_PREFIX)
+from tests.points import randomPoints
+
+
+# Test that the one-to-many and many-to-many kernels agree with the scalar distance
+def test_euclideanKernel():
+
+    coords = np.array([p[0] for p in randomPoints(30, 6)])
+    queries = np.array([p[0] for p in randomPoints(4, 6)])
+
+    pairwise = EuclideanKernel.pairwiseDistances(queries, coords)
+    assert pairwise.shape == (4, 30)
+
+    for i in range(len(queries)):
+        assert EuclideanKernel.distances(queries[i], coords) == pytest.approx(pairwise[i])
+
+        for j in range(len(coords)):
+            assert pairwise[i, j] == pytest.approx(distance(queries[i], coords[j]))
+            assert EuclideanKernel.reducedDistances(queries[i], coords)[j] == pytest.approx(pairwise[i, j] ** 2)
+
+    assert EuclideanKernel.toReduced(EuclideanKernel.toDistance(16.0)) == 16.0
+    assert distance([0, 0], [3, 4]) == 5.0
+
+
+# Test both trees with each of the other metrics against brute force
+def test_metrics(tmp_path):
+
+    # points on the sphere, as (latitude, longitude) in radians
+    geoPoints = [([random.uniform(-math.pi / 2, math.pi / 2), random.uniform(-math.pi, math.pi)], i)
+                 for i in range(400)]
+
+    for metric in ['manhattan', 'chebyshev', MinkowskiKernel(3), 'cosine', 'haversine']:
+
+        points = geoPoints if metric == 'haversine' else randomPoints(400, 3)
+        dimensions = len(points[0][0])
+        kernel = getKernel(metric, dimensions)
+
+        coords = np.array([p[0] for p in points])
+        queries = np.array([p[0] for p in points[:10]]) + 0.01
+
+        b = BallTree(points, dimensions, metric=metric)
+        a = ArrayBallTree(points, dimensions, leaf_size=8, metric=metric)
+        f = FakeBallTree(points, metric)
+
+        # kernels agree with the scalar distance, and reduced distances convert back and forth
+        pairwise = kernel.pairwiseDistances(queries, coords)
+
+        for i in range(len(queries)):
+            assert kernel.distances(queries[i], coords) == pytest.approx(pairwise[i])
+            assert kernel.toDistance(kernel.reducedDistances(queries[i], coords)) == pytest.approx(pairwise[i])
+            assert kernel.toReduced(pairwise[i]) == pytest.approx(kernel.reducedDistances(queries[i], coords))
+            assert pairwise[i, 5] == pytest.approx(kernel.distance(queries[i], coords[5]))
+
+        # every point is found
+        for p in points:
+            assert b.findExact(p[0]) == f.findExact(p[0])
+            assert a.findExact(p[0]) == f.findExact(p[0])
+
+        # knn distances match brute force (trees may break ties differently)
+        batchDists, batchIndices = a.query_batch(queries, 6)
+
+        for i, q in enumerate(queries.tolist()):
+
+            expected = [d for d, p in f.knnSearch(q, 6)]
+
+            assert [d for d, p in b.kNearestNeighborsSearch(q, 6)] == pytest.approx(expected)
+            assert [d for d, p in b.kNearestNeighborsSearch(q, 6, traversal='bestFirst')] == pytest.approx(expected)
+            assert [d for d, p in a.kNearestNeighborsSearch(q, 6)] == pytest.approx(expected)
+            assert list(batchDists[i]) == pytest.approx(expected)
+
+            # radius queries find everything within the distance to the 4th neighbor
+            r = (expected[3] + expected[4]) / 2
+            assert sorted(a.query_radius(q, r)) == list(np.flatnonzero(kernel.distances(np.array(q), coords) <= r))
+
+        # saved tree keeps its metric
+        a.save(tmp_path / "tree.bt")
+        loaded = ArrayBallTree.load(tmp_path / "tree.bt", points)
+
+        assert loaded.getMetric().name == kernel.name
+        assert loaded.query_batch(queries, 6)[0] == pytest.approx(batchDists)
+
+        # non-Euclidean files are version 2, which version 1 readers (Euclidean only) reject
+        version = TREE_FILE_PREFIX.unpack((tmp_path / "tree.bt").read_bytes()[:TREE_FILE_PREFIX.size])[1]
+        assert version == 2
+
+    # known distances
+    assert HaversineKernel.distance([0, 0], [0, math.pi / 2]) == pytest.approx(math.pi / 2)
+    assert CosineKernel.distance([1, 0], [0, 5]) == pytest.approx(math.pi / 2)
+    assert ManhattanKernel.distance([0, 0], [3, -4]) == 7.0
+    assert ChebyshevKernel.distance([0, 0], [3, -4]) == 4.0
+    assert MinkowskiKernel(2).distance([0, 0], [3, 4]) == pytest.approx(5.0)
+
+    # padding of a query with too few neighbors stays infinite
+    assert np.isinf(ArrayBallTree(geoPoints[:2], 2, metric='haversine').query_batch([[0, 0]], 3)[0][0, 2])
+
+    with pytest.raises(ValueError):
+        BallTree([], 3, metric='hamming')
+    with pytest.raises(ValueError):
+        ArrayBallTree([], 3, metric='haversine')
+    with pytest.raises(ValueError):
+        MinkowskiKernel(0.5)
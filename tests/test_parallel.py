@@ -0,0 +1,38 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of ParallelQueryExecutor
+
+import numpy as np
+import pytest
+from BallTree import ArrayBallTree, ParallelQueryExecutor
+from tests.points import randomPoints
+
+
+# Test that parallel batched queries come back in order and match serial batched queries
+def test_parallelQueryExecutor():
+
+    points = randomPoints(2000, 4)
+    queries = np.array([p[0] for p in randomPoints(150, 4)])
+
+    a = ArrayBallTree(points, 4, leaf_size=16)
+    dists, indices = a.query_batch(queries, 5)
+
+    for backend in ['processes', 'threads']:
+        with ParallelQueryExecutor(a, n_jobs=2, backend=backend) as executor:
+
+            pDists, pIndices = executor.query_batch(queries, 5)
+
+            assert (pIndices == indices).all()
+            assert pDists == pytest.approx(dists)
+
+            # empty batch
+            assert executor.query_batch(np.empty((0, 4)), 5)[0].shape == (0, 5)
+
+    # a tree rebuilt from its own arrays answers the same way
+    b = ArrayBallTree.fromArrays(a.exportArrays(), points, leaf_size=16)
+    assert (b.query_batch(queries, 5)[1] == indices).all()
+    assert b.findExact(points[7][0]) == points[7][1]
+
+    with pytest.raises(ValueError):
+        ParallelQueryExecutor(a, backend='gpu')
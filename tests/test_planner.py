@@ -0,0 +1,127 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of BruteForceEngine, subtree scans and QueryPlanner
+
+import numpy as np
+import pytest
+from BallTree import (ArrayBallTree, FakeBallTree, BruteForceEngine, QueryPlanner, intrinsicDimension, PLANS,
+                      ManhattanKernel, QueryStats)
+from tests.points import randomPoints
+
+
+# Test brute-force knn against the reference tree
+def test_bruteForceEngine():
+
+    points = randomPoints(300, 4)
+    coords = np.array([p[0] for p in points])
+    queries = [p[0] for p in randomPoints(20, 4)]
+
+    engine = BruteForceEngine(coords)
+    f = FakeBallTree(points)
+
+    for q in queries:
+        for k in [1, 5, 300]:
+            expected = f.knnSearch(q, k)
+            found = engine.kNearestNeighborsSearch(q, k)
+
+            assert [points[i] for d, i in found] == [p for d, p in expected]
+            assert [d for d, i in found] == pytest.approx([d for d, p in expected])
+
+    # other metrics, and ids other than row numbers
+    dists, ids = BruteForceEngine(coords, 'manhattan', ids=np.arange(300) + 1000).query_batch(queries, 3)
+    expected = np.sort(ManhattanKernel.pairwiseDistances(np.array(queries), coords), axis=1)[:, :3]
+
+    assert np.allclose(dists, expected)
+    assert ids.min() >= 1000
+
+    # fewer points than k --> padded
+    dists, ids = BruteForceEngine(coords[:2]).query_batch(queries[:1], 4)
+    assert list(ids[0, 2:]) == [-1, -1] and np.isinf(dists[0, 2:]).all()
+    assert BruteForceEngine(np.empty((0, 4))).kNearestNeighborsSearch(queries[0], 3) == []
+
+
+# Test intrinsic dimension estimates of points on a plane and of points filling their space
+def test_intrinsicDimension():
+
+    rng = np.random.default_rng(0)
+
+    plane = rng.uniform(-1000, 1000, (3000, 2)) @ rng.normal(0, 1, (2, 10))
+    assert 1.5 < intrinsicDimension(plane, seed=0) < 2.5
+
+    cube = rng.uniform(-1000, 1000, (3000, 4))
+    assert 3 < intrinsicDimension(cube, seed=0) <= 4
+
+    assert intrinsicDimension(np.zeros((100, 3))) == 3  # nothing but duplicates
+
+
+# Test that scanning small subtrees whole finds the same neighbors as traversing them
+def test_subtreeScan():
+
+    points = randomPoints(2000, 3) + randomPoints(50, 3) * 4
+    queries = [p[0] for p in randomPoints(30, 3)]
+
+    tree = ArrayBallTree(points, 3, leaf_size=4)
+    expected = [tree.kNearestNeighborsSearch(q, 7) for q in queries]
+
+    for rows in [8, 100, 10 ** 6]:
+        for q, e in zip(queries, expected):
+
+            stats = QueryStats('knn')
+            found = tree.kNearestNeighborsSearch(q, 7, scan_rows=rows, stats=stats)
+
+            assert [d for d, i in found] == pytest.approx([d for d, i in e])
+            assert stats.nodesVisited > 0
+
+    with pytest.raises(ValueError):
+        tree.kNearestNeighborsSearch(queries[0], 7, scan_rows=-1)
+
+
+# Test that the planner's answers are right whichever plan it picks, and that it reports its plans
+def test_queryPlanner():
+
+    points = randomPoints(1000, 3)
+    queries = np.array([p[0] for p in randomPoints(40, 3)])
+    expected = ArrayBallTree(points, 3).query_batch(queries, 5)
+
+    # explore_rate 1 always runs the plan that wasn't chosen
+    for exploreRate in [0, 1]:
+
+        planner = QueryPlanner(ArrayBallTree(points, 3, leaf_size=8), explore_rate=exploreRate, seed=0)
+
+        for i, q in enumerate(queries):
+            found = planner.kNearestNeighborsSearch(q, 5)
+
+            assert [i for d, i in found] == list(expected[1][i])
+            assert planner.lastPlan['plan'] in PLANS
+            assert planner.lastPlan['explored'] == (exploreRate == 1)
+
+        dists, indices = planner.query_batch(queries, 5)
+
+        assert np.allclose(dists, expected[0]) and (indices == expected[1]).all()
+        assert planner.lastPlan['queries'] == len(queries)
+        assert sum(planner.planCounts.values()) == 2 * len(queries)
+
+    # explain estimates without running anything; unseen k are scaled from the seen ones
+    plan = planner.explain(50)
+
+    assert plan['plan'] == ('tree' if plan['treeCost'] <= plan['bruteForceCost'] else 'bruteForce')
+    assert planner.explain(50)['treeCost'] >= planner.explain(5)['treeCost'] > 0
+    assert 1 <= planner.summary()['intrinsicDimension'] <= 3
+
+    # the tree's own stats hook stays attached through making a planner (which calibrates on the tree)
+    tree = ArrayBallTree(points, 3, leaf_size=8)
+    collected = []
+    tree.setStatsHook(collected.append)
+
+    planner = QueryPlanner(tree, explore_rate=0, seed=0)
+    collected.clear()
+
+    tree.kNearestNeighborsSearch(queries[0], 5)
+    assert len(collected) == 1
+
+    # nothing to search
+    assert QueryPlanner(ArrayBallTree([], 3)).kNearestNeighborsSearch([0, 0, 0], 3) == []
+
+    with pytest.raises(ValueError):
+        QueryPlanner(ArrayBallTree(points, 3, storage='float32'))
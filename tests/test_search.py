@@ -0,0 +1,146 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of approximate knn search and search stats
+
+import pytest
+from BallTree import ArrayBallTree, BallTree, FakeBallTree, distance
+from tests.points import randomPoints
+
+
+# Test that approximate knn searches stay within their error bound and budgets
+def test_approximateKnn():
+
+    points = randomPoints(3000, 4)
+    queries = [p[0] for p in randomPoints(20, 4)]
+
+    b = BallTree(points, 4)
+    a = ArrayBallTree(points, 4, leaf_size=8)
+    f = FakeBallTree(points)
+
+    for eps in [0.5, 2]:
+
+        batchDists = a.query_batch(queries, 10, eps=eps)[0]
+
+        for i, q in enumerate(queries):
+
+            exact = [d for d, p in f.knnSearch(q, 10)]
+
+            b.kNearestNeighborsSearch(q, 10)
+            exactVisited = b.getNodesVisited()
+
+            # every neighbor is within (1 + eps) times the distance of the true neighbor in its place
+            for traversal in ['nearest', 'leftFirst', 'bestFirst']:
+
+                approx = b.kNearestNeighborsSearch(q, 10, traversal=traversal, eps=eps, return_points=True)
+
+                assert len(approx) == 10
+                assert all(d <= (1 + eps) * e + 1e-9 for (d, p), e in zip(approx, exact))
+
+            b.kNearestNeighborsSearch(q, 10, eps=eps)
+            assert b.getNodesVisited() <= exactVisited
+
+            approx = [d for d, p in a.kNearestNeighborsSearch(q, 10, eps=eps)]
+            assert all(d <= (1 + eps) * e + 1e-9 for d, e in zip(approx, exact))
+            assert all(d <= (1 + eps) * e + 1e-9 for d, e in zip(batchDists[i], exact))
+
+    # node budget: stops after that many nodes, with the closest of the points seen so far, closest first
+    for traversal in ['nearest', 'bestFirst']:
+
+        ans = b.kNearestNeighborsSearch(queries[0], 3, traversal=traversal, max_nodes=10, return_points=True)
+
+        assert b.getNodesVisited() == 10
+        assert len(ans) == 3
+        assert [d for d, p in ans] == sorted(d for d, p in ans)
+        assert all(d == pytest.approx(distance(queries[0], p[0])) for d, p in ans)
+
+    assert len(a.kNearestNeighborsSearch(queries[0], 3, max_nodes=1)) <= 3
+    assert a.kNearestNeighborsSearch(queries[0], 3, max_nodes=10 ** 9) == a.kNearestNeighborsSearch(queries[0], 3)
+
+    # time budget: nothing left --> nothing visited
+    assert b.kNearestNeighborsSearch(queries[0], 3, time_budget=0) == []
+    assert a.kNearestNeighborsSearch(queries[0], 3, time_budget=0) == []
+    assert len(b.kNearestNeighborsSearch(queries[0], 3, time_budget=10)) == 3
+
+    with pytest.raises(ValueError):
+        b.kNearestNeighborsSearch(queries[0], 3, eps=-1)
+    with pytest.raises(ValueError):
+        a.kNearestNeighborsSearch(queries[0], 3, max_nodes=0)
+
+
+# Test per-query stats hooks and tree shape stats
+def test_stats():
+
+    points = randomPoints(1000, 3)
+    query = randomPoints(1, 3)[0][0]
+
+    b = BallTree(points, 3)
+    a = ArrayBallTree(points, 3, leaf_size=16)
+
+    # shape stats
+    for tree, numNodes in [(b, len(points)), (a, a.numNodes())]:
+
+        shape = tree.shapeStats()
+
+        assert shape['numNodes'] == numNodes
+        assert sum(shape['depthHistogram'].values()) == numNodes
+        assert shape['depthHistogram'][1] == 1
+        assert shape['radiusPercentiles']['min'] <= shape['radiusPercentiles']['p50'] <= shape['radiusPercentiles']['max']
+        assert sum(shape['leafOccupancy'].values()) == shape['numLeaves']
+
+    assert a.shapeStats()['depth'] == a.depth()
+    assert max(a.shapeStats()['leafOccupancy']) <= 16
+
+    # internal nodes hold one point each, leaves the rest
+    shape = a.shapeStats()
+    leafPoints = sum(size * count for size, count in shape['leafOccupancy'].items())
+    assert leafPoints + shape['numNodes'] - shape['numLeaves'] == len(points)
+
+    assert BallTree([], 3).shapeStats()['numNodes'] == 0
+    assert ArrayBallTree([], 3).shapeStats()['depth'] == 0
+
+    # per-query stats
+    collected = []
+
+    for tree in [b, a]:
+
+        tree.setStatsHook(collected.append)
+        depth = tree.shapeStats()['depth']
+
+        tree.kNearestNeighborsSearch(query, 5)
+        stats = collected.pop()
+
+        assert stats.operation == 'knn'
+        assert 0 < stats.maxDepth <= depth
+        assert stats.prunes < stats.nodesVisited <= stats.distanceEvaluations
+
+        tree.findExact(points[7][0])
+        stats = collected.pop()
+
+        assert stats.operation == 'findExact'
+        assert 0 < stats.maxDepth <= depth
+        assert stats.nodesVisited >= 1
+
+        # point far outside the root's ball --> pruned at the root
+        tree.findExact([10 ** 6] * 3)
+        stats = collected.pop()
+
+        assert (stats.nodesVisited, stats.distanceEvaluations, stats.prunes, stats.maxDepth) == (1, 1, 1, 1)
+
+        # sampled out, or turned off --> hook isn't called
+        tree.setStatsHook(collected.append, sample_rate=0)
+        tree.kNearestNeighborsSearch(query, 5)
+        tree.setStatsHook(None)
+        tree.findExact(points[7][0])
+
+        assert collected == []
+
+    # the linked tree counts the same nodes as getNodesVisited, with any traversal
+    b.setStatsHook(collected.append)
+
+    for traversal in ['nearest', 'leftFirst', 'bestFirst']:
+        b.kNearestNeighborsSearch(query, 5, traversal=traversal)
+        assert collected.pop().nodesVisited == b.getNodesVisited()
+
+    b.kNearestNeighborsSearch(query, 5, traversal='bestFirst')
+    assert 0 < collected.pop().prunes
@@ -0,0 +1,97 @@
+# Chana Werblowsky
+# Ball Tree Data Structure
+#
+# Tests of AsyncBallTreeService
+
+import asyncio
+import pytest
+from BallTree import ArrayBallTree, BallTree, AsyncBallTreeService, Histogram
+from tests.points import randomPoints
+
+
+# Test that the service answers concurrent queries as the tree does, batching them
+def test_serviceMatchesTree():
+
+    points = randomPoints(500, 3)
+    queries = [p[0] for p in randomPoints(200, 3)]
+
+    for tree in [ArrayBallTree(points, 3, leaf_size=8), BallTree(points, 3)]:
+
+        async def run():
+            async with AsyncBallTreeService(tree, max_batch=32, max_delay=0.01) as service:
+
+                knn = await asyncio.gather(*[service.knn(q, 1 + i % 3) for i, q in enumerate(queries)])
+                found = await asyncio.gather(*[service.find_exact(p[0]) for p in points[:50]] +
+                                             [service.find_exact([5000, 5000, 5000])])
+
+                return knn, found, service.stats()
+
+        knn, found, stats = asyncio.run(run())
+
+        for i, q in enumerate(queries):
+            expected = tree.kNearestNeighborsSearch(q, 1 + i % 3)
+
+            assert [i for d, i in knn[i]] == [i for d, i in expected]
+            assert [d for d, i in knn[i]] == pytest.approx([d for d, i in expected])
+
+        assert found == [p[1] for p in points[:50]] + [None]
+
+        # all queued at once --> batches of up to 32, every request timed
+        assert stats['batchSizes']['count'] < len(queries)
+        assert max(b for b, c in zip(stats['batchSizes']['bounds'], stats['batchSizes']['counts']) if c) <= 32
+        assert stats['latency']['count'] == len(queries) + 51
+        assert stats['queueDepth']['count'] == len(queries) + 51
+        assert stats['latencyP50'] <= stats['latencyP99']
+
+
+# Test backpressure, failed queries and closing
+def test_serviceBackpressure():
+
+    tree = ArrayBallTree(randomPoints(100, 2), 2)
+
+    async def run():
+
+        # queue of 4, so the rest of the requests queued at once are rejected
+        service = AsyncBallTreeService(tree, max_queue=4, when_full='reject')
+        answers = await asyncio.gather(*[service.knn([0, 0], 2) for i in range(10)], return_exceptions=True)
+
+        assert sum(isinstance(a, asyncio.QueueFull) for a in answers) == 6 == service.rejected
+        assert all(len(a) == 2 for a in answers if not isinstance(a, Exception))
+
+        # the same requests wait for room instead
+        waiting = AsyncBallTreeService(tree, max_queue=4)
+        answers = await asyncio.gather(*[waiting.knn([0, 0], 2) for i in range(10)])
+        assert all(len(a) == 2 for a in answers) and waiting.rejected == 0
+
+        # a bad query fails on its own, not with the rest of its batch
+        answers = await asyncio.gather(waiting.knn([0, 0], 1), waiting.knn([0, 0, 0], 1), waiting.knn([1, 1], 1),
+                                       return_exceptions=True)
+        assert isinstance(answers[1], Exception)
+        assert len(answers[0]) == len(answers[2]) == 1
+
+        await service.close()
+        await waiting.close()
+
+        with pytest.raises(RuntimeError):
+            await waiting.knn([0, 0], 1)
+
+    asyncio.run(run())
+
+    with pytest.raises(ValueError):
+        AsyncBallTreeService(tree, when_full='drop')
+
+
+# Test histogram buckets and percentiles
+def test_histogram():
+
+    h = Histogram([1, 2, 4])
+    assert h.percentile(50) is None
+
+    for value in [0.5, 1, 1.5, 3, 3, 10]:
+        h.observe(value)
+
+    assert h.counts == [2, 1, 2, 1]
+    assert h.percentile(50) == 2
+    assert h.percentile(80) == 4
+    assert h.percentile(100) == float('inf')
+    assert h.snapshot()['count'] == 6